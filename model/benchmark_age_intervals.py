@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Age-Interval Canonicalization Report for MediConnect
+Extracts each gender forest's split thresholds on the age feature, checks that
+every age inside an interval gives bit-identical probabilities, and replays a
+stream of presentations sampled from medical_training_dataset_clean.csv
+through a result cache keyed on raw age versus age interval.
+Writes age_interval_report.json
+"""
+import argparse
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from forest_engine import CompiledForest, feature_thresholds, sidecar_dir, threshold_interval
+from gender_ai_service_embedding import ResultCache
+from symptom_text import canonical_symptom_text
+
+REPORT_FILE = 'age_interval_report.json'
+DATASET_FILE = 'medical_training_dataset_clean.csv'
+
+MODEL_FILES = {
+    'male': 'male_medical_model_embedding.pkl',
+    'female': 'female_medical_model_embedding.pkl'
+}
+
+# Ages checked for bit-identical outputs within each interval
+AGE_RANGE = range(0, 121)
+
+def load_forest(model_file: str):
+    """Memory-map the forest sidecars when present, otherwise unpickle the model"""
+    arrays_dir = sidecar_dir(model_file)
+    if os.path.isdir(arrays_dir):
+        return CompiledForest.load(arrays_dir, mmap_mode='r')
+    return CompiledForest.from_sklearn(joblib.load(model_file))
+
+def check_intervals(engine: CompiledForest, thresholds: np.ndarray, rows: int = 64):
+    """Every age in an interval must give the same probabilities as the interval's first age"""
+    rng = np.random.RandomState(0)
+    X = rng.uniform(-0.2, 0.2, size=(rows, 387)).astype(np.float32)
+    X[:, 385] = rng.randint(0, 3, rows)
+    X[:, 386] = 0
+
+    ages = np.array(AGE_RANGE)
+    intervals = threshold_interval(thresholds, ages)
+    reference = {}
+    for age, interval in zip(ages, intervals):
+        X[:, 0] = age
+        probabilities = engine.predict_proba(X)
+        if interval not in reference:
+            reference[interval] = probabilities
+        elif not np.array_equal(probabilities, reference[interval]):
+            raise AssertionError(f"Age {age} differs from the rest of interval {interval}")
+    return len(reference)
+
+def sample_requests(n_requests: int, seed: int):
+    """Presentations sampled from the clean dataset: (gender, canonical symptoms, severity, age)"""
+    df = pd.read_csv(DATASET_FILE)
+    rng = np.random.RandomState(seed)
+    rows = df.iloc[rng.randint(0, len(df), n_requests)]
+
+    symptom_cols = [f'symptom{i}' for i in range(1, 7)]
+    requests = []
+    for _, row in rows.iterrows():
+        gender = str(row['gender_specific']).lower()
+        if gender not in MODEL_FILES:
+            gender = rng.choice(list(MODEL_FILES))
+        requests.append((gender, canonical_symptom_text(row[col] for col in symptom_cols),
+                         str(row['severity']).lower(), int(row['age'])))
+    return requests
+
+def replay(requests, age_key, max_entries: int):
+    """Hit rate of a result cache keyed with age_key(gender, age)"""
+    cache = ResultCache(max_entries=max_entries, max_bytes=1 << 40, ttl_seconds=1e9)
+    for gender, symptoms, severity, age in requests:
+        key = (symptoms, severity, gender, age_key(gender, age))
+        if cache.get(key) is None:
+            cache.put(key, {'success': True})
+    return cache.stats()['hit_rate']
+
+def main():
+    parser = argparse.ArgumentParser(description='Age-interval result cache report')
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--cache-entries', type=int, nargs='+', default=[1024, 4096, 16384])
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+
+    print("="*70)
+    print("AGE-INTERVAL CANONICALIZATION REPORT")
+    print("="*70)
+
+    thresholds = {}
+    report = {'models': {}, 'cache': []}
+    for gender, model_file in MODEL_FILES.items():
+        engine = load_forest(model_file)
+        thresholds[gender] = feature_thresholds(engine, 0)
+        intervals_seen = check_intervals(engine, thresholds[gender])
+        report['models'][gender] = {
+            'age_thresholds': thresholds[gender].tolist(),
+            'intervals': len(thresholds[gender]) + 1,
+            f'intervals_covering_ages_{AGE_RANGE.start}_{AGE_RANGE.stop - 1}': intervals_seen,
+            'bit_identical': True
+        }
+        print(f"OK - {gender.capitalize()} forest: {len(thresholds[gender])} age thresholds, "
+              f"outputs identical within each of {intervals_seen} intervals")
+
+    requests = sample_requests(options.requests, options.seed)
+    for max_entries in options.cache_entries:
+        raw = replay(requests, lambda gender, age: age, max_entries)
+        interval = replay(requests, lambda gender, age: int(threshold_interval(thresholds[gender], [age])[0]),
+                          max_entries)
+        report['cache'].append({'max_entries': max_entries, 'raw_age_hit_rate': raw, 'interval_hit_rate': interval})
+        print(f"Cache {max_entries:>6} entries: raw age {raw:.1%} hits, age interval {interval:.1%} hits")
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
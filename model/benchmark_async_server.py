@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Async vs Flask Front End Report for the MediConnect Diagnosis API
+Starts the threaded Flask server (serve_prefork.py --workers 0) and the
+asyncio server (serve_async.py) in turn and drives each with a closed loop of
+N concurrent connections sending /ai/diagnose requests built from
+medical_training_dataset_clean.csv. A separate prober polls /ai/health
+throughout to show whether health checks queue behind diagnoses.
+Writes async_server_report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+REPORT_FILE = 'async_server_report.json'
+DATASET_FILE = 'medical_training_dataset_clean.csv'
+BASE_PORT = 5202
+READY_TIMEOUT_SECONDS = 600
+
+SERVERS = {
+    'flask': ['serve_prefork.py', '--workers', '0'],
+    'async': ['serve_async.py']
+}
+
+# Seconds between /ai/health probes during a run
+HEALTH_PROBE_INTERVAL_SECONDS = 0.05
+
+def build_requests(n_requests: int, seed: int):
+    """Diagnosis request bodies sampled from the clean dataset"""
+    df = pd.read_csv(DATASET_FILE)
+    rng = np.random.RandomState(seed)
+    rows = df.iloc[rng.randint(0, len(df), n_requests)]
+
+    symptom_cols = [f'symptom{i}' for i in range(1, 7)]
+    requests = []
+    for _, row in rows.iterrows():
+        gender = str(row['gender_specific'])
+        requests.append({
+            'age': int(row['age']),
+            'symptoms': ', '.join(str(row[col]) for col in symptom_cols if pd.notna(row[col])),
+            'severity': str(row['severity']),
+            'gender': gender if gender in ('Male', 'Female') else str(rng.choice(['Male', 'Female']))
+        })
+    return requests
+
+def start_server(name: str, port: int, env):
+    return subprocess.Popen([sys.executable] + SERVERS[name] + ['--port', str(port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_until_ready(session: aiohttp.ClientSession, base_url: str):
+    deadline = time.time() + READY_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        try:
+            async with session.get(f'{base_url}/ai/health/ready') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(1)
+    raise TimeoutError(f"Server at {base_url} did not become ready")
+
+def percentiles(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+async def run_level(session: aiohttp.ClientSession, base_url: str, requests, concurrency: int, seconds: float):
+    """Closed loop: each connection sends its next request as soon as the last one returns"""
+    latencies, health_latencies = [], []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    cursor = iter(range(10 ** 12))
+
+    async def connection():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            body = requests[next(cursor) % len(requests)]
+            start = time.perf_counter()
+            try:
+                async with session.post(f'{base_url}/ai/diagnose', json=body) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    async def health_prober():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.get(f'{base_url}/ai/health') as response:
+                    await response.read()
+                health_latencies.append(time.perf_counter() - start)
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+
+    started = time.perf_counter()
+    await asyncio.gather(health_prober(), *[connection() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+        'health': percentiles(health_latencies)
+    }
+
+async def benchmark(name: str, port: int, requests, levels, seconds: float, env):
+    print(f"\nBenchmarking {name} server...")
+    process = start_server(name, port, env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_until_ready(session, base_url)
+            # Warm the server before measuring
+            await run_level(session, base_url, requests, 4, 1.0)
+
+            results = []
+            for concurrency in levels:
+                result = await run_level(session, base_url, requests, concurrency, seconds)
+                results.append(result)
+                print(f"  {concurrency:>4} connections: {result['throughput_rps']:>8.1f} req/s, "
+                      f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                      f"health p99 {result['health']['p99_ms']} ms, {result['errors']} errors")
+            return results
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+def main():
+    parser = argparse.ArgumentParser(description='Async vs Flask front end throughput and tail latency')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64, 256])
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each concurrency level')
+    parser.add_argument('--requests', type=int, default=5000, help='Distinct request bodies to cycle through')
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--result-cache', action='store_true',
+                        help='Keep the diagnosis result cache enabled (default: disabled to measure inference)')
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+
+    print("="*70)
+    print("ASYNC VS FLASK FRONT END REPORT")
+    print("="*70)
+
+    env = dict(os.environ)
+    if not options.result_cache:
+        env['RESULT_CACHE_MAX_ENTRIES'] = '0'
+
+    requests = build_requests(options.requests, options.seed)
+    report = {'seconds_per_level': options.seconds, 'result_cache': options.result_cache, 'servers': {}}
+    for i, name in enumerate(options.servers):
+        report['servers'][name] = asyncio.run(
+            benchmark(name, BASE_PORT + i, requests, options.concurrency, options.seconds, env))
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
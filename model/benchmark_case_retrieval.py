@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Case Retrieval Scaling Benchmark for MediConnect
+Builds synthetic case indexes of increasing size (random unit embeddings),
+saves each to disk and memory-maps it back the way the service does, then
+times the blocked top-k search for single queries and batches. Shows that
+latency grows linearly with the number of stored cases while the search's
+working memory stays at BLOCK_ROWS x batch size similarities.
+Writes case_retrieval_scaling_report.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from case_retrieval import BLOCK_ROWS, VOTE_K, CaseIndex
+
+REPORT_FILE = 'case_retrieval_scaling_report.json'
+N_CLASSES = 57
+BUILD_CHUNK = 250000
+
+def build_index(n_cases: int, directory: str, seed: int) -> CaseIndex:
+    """Save an n_cases index to directory and memory-map it back
+
+    Embeddings are generated in chunks into a scratch memmap, so building
+    never holds the whole matrix (or a float64 copy of it) in memory.
+    """
+    rng = np.random.RandomState(seed)
+    embeddings = np.lib.format.open_memmap(f'{directory}/scratch.npy', mode='w+', dtype=np.float32,
+                                           shape=(n_cases, 384))
+    for start in range(0, n_cases, BUILD_CHUNK):
+        chunk = rng.standard_normal((min(BUILD_CHUNK, n_cases - start), 384)).astype(np.float32)
+        embeddings[start:start + len(chunk)] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    embeddings.flush()
+
+    index = CaseIndex(
+        embeddings=embeddings,
+        labels=rng.randint(0, N_CLASSES, n_cases).astype(np.int32),
+        ages=rng.randint(1, 90, n_cases).astype(np.int16),
+        severities=rng.randint(0, 3, n_cases).astype(np.int8),
+        symptoms=np.array(['synthetic case'] * n_cases),
+        classes=np.arange(N_CLASSES),
+        severity_names=['high', 'low', 'medium']
+    )
+    index.save(f'{directory}/index')
+    del index, embeddings
+    os.remove(f'{directory}/scratch.npy')
+    return CaseIndex.load(f'{directory}/index', mmap_mode='r')
+
+def time_search(index: CaseIndex, queries: np.ndarray, repeats: int) -> float:
+    """Median milliseconds of one search over the whole index"""
+    index.search(queries, VOTE_K)  # page the index in
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        index.search(queries, VOTE_K)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description='Blocked top-k case retrieval latency by index size')
+    parser.add_argument('--cases', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+
+    print("="*70)
+    print("CASE RETRIEVAL SCALING BENCHMARK")
+    print("="*70)
+    print(f"Block size {BLOCK_ROWS} cases, k={VOTE_K}")
+
+    rng = np.random.RandomState(options.seed + 1)
+    results = []
+    for n_cases in options.cases:
+        with tempfile.TemporaryDirectory() as directory:
+            index = build_index(n_cases, directory, options.seed)
+            for batch_size in options.batch_sizes:
+                queries = rng.standard_normal((batch_size, 384))
+                median_ms = time_search(index, queries, options.repeats)
+                row = {
+                    'cases': n_cases,
+                    'index_mb': round(index.embeddings.nbytes / 1024 / 1024, 1),
+                    'batch_size': batch_size,
+                    'median_ms': round(median_ms, 3),
+                    'ms_per_query': round(median_ms / batch_size, 4),
+                    'search_buffer_mb': round(min(BLOCK_ROWS, n_cases) * batch_size * 4 / 1024 / 1024, 1)
+                }
+                results.append(row)
+                print(f"{n_cases:>10} cases ({row['index_mb']:>7.1f} MB), batch {batch_size:>4}: "
+                      f"{row['median_ms']:>9.2f} ms ({row['ms_per_query']:.3f} ms/query), "
+                      f"buffer {row['search_buffer_mb']} MB")
+            del index
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump({'block_rows': BLOCK_ROWS, 'vote_k': VOTE_K, 'results': results}, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Dataset Cache Benchmark for MediConnect
+Compares pd.read_csv on the training CSVs with loading the same data from
+the typed columnar cache (dataset_cache.read_dataset). Reports the one-time
+conversion, the median load time of each path and the memory of each
+DataFrame as pandas counts it (memory_usage(deep=True)). Cached columns are
+memory-mapped, so their pages are shared with the OS page cache rather than
+copied into the process.
+Writes dataset_cache_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import time
+
+import pandas as pd
+
+from dataset_cache import DATASET_CACHE_DIR, cache_entry_dir, read_dataset
+
+REPORT_FILE = 'dataset_cache_report.json'
+
+DATASETS = [
+    'medical_train_dataset.csv',
+    'medical_training_dataset_male_augmented.csv',
+    'medical_training_dataset_female_augmented.csv'
+]
+
+def median_seconds(load, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def compare_dataset(path, cache_dir, repeats):
+    shutil.rmtree(cache_entry_dir(path, cache_dir), ignore_errors=True)
+    start = time.perf_counter()
+    read_dataset(path, cache_dir=cache_dir)
+    conversion_seconds = time.perf_counter() - start
+
+    csv_seconds = median_seconds(lambda: pd.read_csv(path, delimiter=';', encoding='utf-8-sig'), repeats)
+    cached_seconds = median_seconds(lambda: read_dataset(path, cache_dir=cache_dir), repeats)
+    csv_mb = pd.read_csv(path, delimiter=';', encoding='utf-8-sig').memory_usage(deep=True).sum() / 1024 / 1024
+    df = read_dataset(path, cache_dir=cache_dir)
+    cached_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+
+    result = {
+        'rows': int(len(df)),
+        'conversion_seconds': round(conversion_seconds, 3),
+        'read_csv_ms': round(csv_seconds * 1000, 1),
+        'cached_ms': round(cached_seconds * 1000, 1),
+        'speedup': round(csv_seconds / cached_seconds, 1),
+        'read_csv_mb': round(csv_mb, 2),
+        'cached_mb': round(cached_mb, 2),
+        'memory_reduction': round(csv_mb / cached_mb, 1)
+    }
+    print(f"{path}: {result['rows']} rows | read_csv {result['read_csv_ms']:.1f} ms, {result['read_csv_mb']:.1f} MB | "
+          f"cached {result['cached_ms']:.1f} ms, {result['cached_mb']:.2f} MB "
+          f"({result['speedup']}x faster, {result['memory_reduction']}x less memory)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='pd.read_csv vs the typed columnar dataset cache')
+    parser.add_argument('--repeats', type=int, default=5, help='Loads timed per path')
+    parser.add_argument('--cache-dir', default=DATASET_CACHE_DIR or 'dataset_cache')
+    options = parser.parse_args()
+
+    print("="*70)
+    print("DATASET CACHE BENCHMARK")
+    print("="*70)
+
+    report = {}
+    for path in DATASETS:
+        if not os.path.exists(path):
+            print(f"WARNING - {path} not found, skipped")
+            continue
+        report[path] = compare_dataset(path, options.cache_dir, options.repeats)
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
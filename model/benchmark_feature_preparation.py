@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Feature Preparation Benchmark for MediConnect
+Compares train_embedding_models.prepare_embedding_features (column-wise
+canonical text, each distinct text encoded once, one float32 matrix) with the
+previous row-wise implementation kept below as legacy_prepare_features
+(df.apply per row, every row encoded, a float64 DataFrame built from 384
+embedding columns) on the augmented training datasets.
+
+Each path is timed twice: with the real encoder, and with a pre-encoded
+lookup standing in for it so the remaining pipeline overhead is visible.
+Peak memory is traced with tracemalloc (NumPy and pandas buffers; encoder
+torch buffers are not traced). Both paths are checked to give the same
+features. The embedding store is bypassed so every run really encodes.
+Writes feature_preparation_report.json
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+import train_embedding_models
+from train_embedding_models import create_symptom_text, embedding_model, load_gender_datasets, prepare_embedding_features
+
+REPORT_FILE = 'feature_preparation_report.json'
+
+def legacy_prepare_features(df, encoder):
+    """prepare_embedding_features as it was before the column-wise rewrite"""
+    symptom_cols = ['symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6']
+    for col in symptom_cols:
+        df[col] = df[col].fillna('').str.lower().str.strip()
+
+    df['severity'] = df['severity'].str.lower().str.strip()
+    df['gender_specific'] = df['gender_specific'].str.lower().str.strip()
+    df['symptom_text'] = df.apply(create_symptom_text, axis=1)
+
+    symptom_embeddings = encoder.encode(df['symptom_text'].tolist(), show_progress_bar=False, batch_size=32)
+    embedding_cols = [f'emb_{i}' for i in range(symptom_embeddings.shape[1])]
+    df_embeddings = pd.DataFrame(symptom_embeddings, columns=embedding_cols, index=df.index)
+
+    X = pd.DataFrame({
+        'age': df['age'].values,
+        **{col: df_embeddings[col].values for col in embedding_cols},
+        'severity': LabelEncoder().fit_transform(df['severity']),
+        'gender': LabelEncoder().fit_transform(df['gender_specific'])
+    })
+    return X, df['disease'].copy()
+
+class PreEncoded:
+    """Encoder stand-in answering from embeddings computed up front"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def encode(self, texts, **kwargs):
+        return np.stack([self.embeddings[text] for text in texts])
+
+def measure(prepare):
+    """(seconds, peak traced MB, features) of one call"""
+    start = time.perf_counter()
+    X = prepare()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    prepare()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024, X
+
+def compare_gender(df, gender_name):
+    print(f"\n{gender_name}: {len(df)} rows")
+    distinct = sorted(set(df.apply(create_symptom_text, axis=1)))
+    pre_encoded = PreEncoded(dict(zip(distinct, embedding_model.encode(distinct, batch_size=32))))
+
+    results = {'rows': int(len(df)), 'distinct_texts': len(distinct)}
+    for mode, encoder in [('encoder', embedding_model), ('pre_encoded', pre_encoded)]:
+        legacy_seconds, legacy_peak, (X_legacy, _) = measure(lambda: legacy_prepare_features(df.copy(), encoder))
+        new_seconds, new_peak, (X_new, _, _, _) = measure(
+            lambda: prepare_embedding_features(df.copy(), gender_name, encoder=encoder))
+        assert np.array_equal(X_legacy.to_numpy(dtype=np.float32), X_new), "Feature matrices differ"
+
+        results[mode] = {
+            'legacy_seconds': round(legacy_seconds, 3),
+            'vectorized_seconds': round(new_seconds, 3),
+            'speedup': round(legacy_seconds / new_seconds, 2),
+            'legacy_peak_mb': round(legacy_peak, 1),
+            'vectorized_peak_mb': round(new_peak, 1),
+            'legacy_features_mb': round(X_legacy.memory_usage(index=False).sum() / 1024 / 1024, 1),
+            'vectorized_features_mb': round(X_new.nbytes / 1024 / 1024, 1)
+        }
+        row = results[mode]
+        print(f"  {mode:<12} legacy {row['legacy_seconds']:>8.2f}s, peak {row['legacy_peak_mb']:>8.1f} MB | "
+              f"vectorized {row['vectorized_seconds']:>8.2f}s, peak {row['vectorized_peak_mb']:>8.1f} MB "
+              f"({row['speedup']}x faster)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Row-wise vs vectorized feature preparation')
+    parser.add_argument('--rows', type=int, help='Only use the first N rows of each dataset')
+    options = parser.parse_args()
+
+    print("="*70)
+    print("FEATURE PREPARATION BENCHMARK")
+    print("="*70)
+
+    # Encode everything on every run
+    train_embedding_models.EMBEDDING_STORE_DIR = ''
+
+    df_male, df_female = load_gender_datasets()
+    report = {}
+    for gender_name, df in [('Male', df_male), ('Female', df_female)]:
+        report[gender_name.lower()] = compare_gender(df.head(options.rows) if options.rows else df, gender_name)
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
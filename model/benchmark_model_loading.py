@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Model Loading Report for MediConnect
+Measures cold-start load time and resident memory of each gender forest when
+unpickled with joblib versus memory-mapped from its .npy sidecar directory.
+Every measurement runs in a fresh subprocess. Resident memory is split into
+private (per-process heap) and shared (file-backed page cache) growth.
+Writes model_loading_report.json
+"""
+import json
+import os
+import subprocess
+import sys
+
+from forest_engine import sidecar_dir
+
+REPORT_FILE = 'model_loading_report.json'
+
+# 1 (age) + 384 (embeddings) + 1 (severity) + 1 (gender)
+N_FEATURES = 387
+
+MODEL_FILES = {
+    'male': 'male_medical_model_embedding.pkl',
+    'female': 'female_medical_model_embedding.pkl'
+}
+
+# Runs in the child process; prints one JSON line
+LOAD_SCRIPT = '''
+import json, os, sys, time
+import numpy as np
+
+def rss_bytes():
+    """(anonymous, file-backed) resident bytes; file pages are shared page cache"""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                name, value = line.split()[:2]
+                fields[name] = int(value) * 1024
+    return fields['RssAnon:'], fields['RssFile:']
+
+method, path = sys.argv[1], sys.argv[2]
+before = rss_bytes()
+start = time.perf_counter()
+if method == 'joblib':
+    import joblib
+    from forest_engine import CompiledForest
+    engine = CompiledForest.from_sklearn(joblib.load(path))
+else:
+    from forest_engine import CompiledForest
+    engine = CompiledForest.load(path, mmap_mode='r')
+load_seconds = time.perf_counter() - start
+
+engine.predict_proba(np.zeros((1, int(sys.argv[3])), dtype=np.float32))
+after = rss_bytes()
+print(json.dumps({
+    'load_seconds': load_seconds,
+    'private_rss_increase_mb': (after[0] - before[0]) / (1024 * 1024),
+    'shared_rss_increase_mb': (after[1] - before[1]) / (1024 * 1024)
+}))
+'''
+
+def measure(method: str, path: str):
+    """Load one model in a fresh interpreter and return its timings"""
+    output = subprocess.run([sys.executable, '-c', LOAD_SCRIPT, method, path, str(N_FEATURES)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    print("="*70)
+    print("MODEL LOADING REPORT")
+    print("="*70)
+
+    report = {}
+    for gender, model_file in MODEL_FILES.items():
+        arrays_dir = sidecar_dir(model_file)
+        if not os.path.exists(model_file) or not os.path.isdir(arrays_dir):
+            print(f"WARNING - Skipping {gender}: run train_embedding_models.py to create "
+                  f"{model_file} and {arrays_dir}/")
+            continue
+
+        pickled = measure('joblib', model_file)
+        mapped = measure('mmap', arrays_dir)
+        report[gender] = {
+            'pickle_mb': round(os.path.getsize(model_file) / (1024 * 1024), 1),
+            'joblib': pickled,
+            'mmap': mapped,
+            'speedup': round(pickled['load_seconds'] / max(mapped['load_seconds'], 1e-9), 1)
+        }
+        print(f"\n{gender.capitalize()} model:")
+        for label, result in [('joblib.load + compile', pickled), ('mmap sidecars', mapped)]:
+            print(f"  {label:<22} {result['load_seconds']:.4f}s, "
+                  f"+{result['private_rss_increase_mb']:.0f} MB private, "
+                  f"+{result['shared_rss_increase_mb']:.0f} MB shared page cache")
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Inference Pipeline Stage Benchmarks for MediConnect
+Times each stage of the diagnosis pipeline in isolation at batch sizes 1, 8,
+64, 512 and 4096, using symptom strings sampled from
+medical_training_dataset_clean.csv:
+
+  normalize_fixed     GenderMediConnectAI.parse_symptoms (normalize_symptom per symptom)
+  normalize_embedding canonical_symptom_text (EmbeddingMediConnectAI)
+  embed               create_symptom_embeddings with an empty embedding cache
+  features            _assemble_features (the 387-column matrix)
+  predict_proba       _forest_predict (sklearn, compiled, student or retrieval backend)
+  top_k               top_k_indices (top 5 per row)
+  response            _build_diagnosis_results
+  serialize           json.dumps of the responses
+
+For every (stage, batch size) it reports median and min wall time, time per
+row, and from a separate tracemalloc run the peak traced memory and the
+number and size of allocations still held when the stage returns. Encoder
+(torch) buffers are not traced by tracemalloc. Results are written as JSON
+keyed by git commit so runs can be diffed with --compare.
+Writes stage_benchmark_report.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from gender_ai_service_embedding import INFERENCE_BACKEND, INFERENCE_BACKENDS, EmbeddingMediConnectAI, embedding_cache, top_k_indices
+from gender_ai_service_fixed import GenderMediConnectAI
+from symptom_text import canonical_symptom_text
+
+REPORT_FILE = 'stage_benchmark_report.json'
+DATASET_FILE = 'medical_training_dataset_clean.csv'
+BATCH_SIZES = [1, 8, 64, 512, 4096]
+GENDER = 'male'
+
+# Each measurement repeats until it has run this long (at least MIN_REPEATS times)
+MIN_SECONDS = 0.5
+MIN_REPEATS = 3
+MAX_REPEATS = 1000
+
+def sample_cases(n: int, seed: int):
+    """(ages, symptom strings, severities) sampled from the clean dataset"""
+    df = pd.read_csv(DATASET_FILE)
+    rows = df.iloc[np.random.RandomState(seed).randint(0, len(df), n)]
+    symptom_cols = [f'symptom{i}' for i in range(1, 7)]
+    symptoms = [', '.join(str(value) for value in row if pd.notna(value))
+                for row in rows[symptom_cols].itertuples(index=False)]
+    return rows['age'].astype(int).tolist(), symptoms, rows['severity'].str.lower().tolist()
+
+def measure(run, setup=None):
+    """Median/min seconds of run() over repeated calls, then one traced call for memory"""
+    timings = []
+    while len(timings) < MAX_REPEATS and (len(timings) < MIN_REPEATS or sum(timings) < MIN_SECONDS):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = run()
+    _, peak = tracemalloc.get_traced_memory()
+    retained = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    tracemalloc.stop()
+    del result
+
+    return {
+        'repeats': len(timings),
+        'median_ms': statistics.median(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+        'peak_kb': peak / 1024,
+        'retained_allocations': sum(stat.count_diff for stat in retained),
+        'retained_kb': sum(stat.size_diff for stat in retained) / 1024
+    }
+
+def stage_runs(service: EmbeddingMediConnectAI, ages, symptoms, severities):
+    """{stage: (run, setup)} for one batch; each stage's inputs are the previous stage's outputs"""
+    model, encoders, disease_classes, model_info = service._get_gender_components(GENDER)
+    metadata = service.disease_metadata[GENDER]
+    genders = [GENDER] * len(ages)
+
+    # Parsing needs no models, so the fixed service is used without loading any
+    fixed_parser = GenderMediConnectAI.__new__(GenderMediConnectAI)
+
+    embedding_cache.clear()
+    embeddings = service.create_symptom_embeddings(symptoms)
+    features = service._assemble_features(encoders, GENDER, ages, embeddings, severities)
+    predictions, probabilities = service._forest_predict(GENDER, model, features)
+    results = service._build_diagnosis_results(predictions, probabilities, disease_classes, model_info,
+                                               metadata, genders)
+
+    return {
+        'normalize_fixed': (lambda: [fixed_parser.parse_symptoms(text) for text in symptoms], None),
+        'normalize_embedding': (lambda: [canonical_symptom_text(text) for text in symptoms], None),
+        'embed': (lambda: service.create_symptom_embeddings(symptoms), embedding_cache.clear),
+        'features': (lambda: service._assemble_features(encoders, GENDER, ages, embeddings, severities), None),
+        'predict_proba': (lambda: service._forest_predict(GENDER, model, features), None),
+        'top_k': (lambda: top_k_indices(probabilities, 5), None),
+        'response': (lambda: service._build_diagnosis_results(predictions, probabilities, disease_classes,
+                                                              model_info, metadata, genders), None),
+        'serialize': (lambda: [json.dumps(result) for result in results], None)
+    }
+
+def compare(report, previous):
+    """Print median time ratios against a previous report"""
+    before = {(row['stage'], row['batch_size']): row for row in previous['results']}
+    print(f"\nCompared with {previous.get('git_commit')} (ratio < 1 is faster):")
+    for row in report['results']:
+        old = before.get((row['stage'], row['batch_size']))
+        if old:
+            ratio = row['median_ms'] / old['median_ms'] if old['median_ms'] else float('nan')
+            print(f"  {row['stage']:<20} batch {row['batch_size']:>5}: "
+                  f"{old['median_ms']:>10.3f} -> {row['median_ms']:>10.3f} ms  ({ratio:.2f}x)")
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage inference pipeline benchmarks')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--stages', nargs='+', help='Only run these stages')
+    parser.add_argument('--inference-backend', choices=INFERENCE_BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=REPORT_FILE)
+    parser.add_argument('--compare', help='Previous report to compare against')
+    options = parser.parse_args()
+
+    print("="*70)
+    print("INFERENCE PIPELINE STAGE BENCHMARKS")
+    print("="*70)
+
+    service = EmbeddingMediConnectAI(inference_backend=options.inference_backend)
+    ages, symptoms, severities = sample_cases(max(options.batch_sizes), options.seed)
+
+    results = []
+    for batch_size in options.batch_sizes:
+        runs = stage_runs(service, ages[:batch_size], symptoms[:batch_size], severities[:batch_size])
+        for stage, (run, setup) in runs.items():
+            if options.stages and stage not in options.stages:
+                continue
+            row = {'stage': stage, 'batch_size': batch_size, **measure(run, setup)}
+            row['per_row_us'] = row['median_ms'] * 1000 / batch_size
+            results.append(row)
+            print(f"{stage:<20} batch {batch_size:>5}: {row['median_ms']:>10.3f} ms "
+                  f"({row['per_row_us']:>9.2f} us/row), peak {row['peak_kb']:>9.1f} KB, "
+                  f"{row['retained_allocations']:>6} allocations retained")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'model_version': service.model_version,
+        'inference_backend': service.inference_backend,
+        'encoder_backend': service.encoder_backend,
+        'gender': GENDER,
+        'results': results
+    }
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {options.output}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
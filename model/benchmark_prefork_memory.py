@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Prefork Memory Report for the MediConnect Diagnosis API
+Starts serve_prefork.py with N workers and, for comparison, N independent
+single-process servers, then records total RSS and PSS (proportional set
+size, which counts copy-on-write shared pages once) for each worker count.
+Writes prefork_memory_report.json
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPORT_FILE = 'prefork_memory_report.json'
+BASE_PORT = 5102
+READY_TIMEOUT_SECONDS = 600
+
+SAMPLE_REQUEST = json.dumps({
+    'age': 30,
+    'symptoms': 'fever, cough, headache',
+    'severity': 'medium',
+    'gender': 'male'
+}).encode()
+
+def process_memory(pid: int):
+    """Return (rss_bytes, pss_bytes) for one process from /proc"""
+    rss = pss = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1]) * 1024
+            elif line.startswith('Pss:'):
+                pss = int(line.split()[1]) * 1024
+    return rss, pss
+
+def process_tree(pid: int):
+    """pid plus all of its descendants"""
+    pids = [pid]
+    for child in _children(pid):
+        pids.extend(process_tree(child))
+    return pids
+
+def _children(pid: int):
+    children = []
+    task_dir = f'/proc/{pid}/task'
+    for tid in os.listdir(task_dir):
+        try:
+            with open(f'{task_dir}/{tid}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return children
+
+def wait_until_ready(port: int):
+    """Poll the readiness probe, then send a few diagnosis requests to touch the models"""
+    deadline = time.time() + READY_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/ai/health/ready', timeout=2):
+                break
+        except Exception:
+            time.sleep(1)
+    else:
+        raise TimeoutError(f"Server on port {port} did not become ready")
+
+    for _ in range(20):
+        request = urllib.request.Request(f'http://127.0.0.1:{port}/ai/diagnose', data=SAMPLE_REQUEST,
+                                         headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request, timeout=30).read()
+
+def start_server(workers: int, port: int):
+    return subprocess.Popen(
+        [sys.executable, 'serve_prefork.py', '--workers', str(workers), '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def measure(processes):
+    """Sum RSS and PSS over the process trees"""
+    total_rss = total_pss = 0
+    pids = [pid for process in processes for pid in process_tree(process.pid)]
+    for pid in pids:
+        rss, pss = process_memory(pid)
+        total_rss += rss
+        total_pss += pss
+    return {
+        'processes': len(pids),
+        'total_rss_mb': round(total_rss / (1024 * 1024), 1),
+        'total_pss_mb': round(total_pss / (1024 * 1024), 1)
+    }
+
+def stop(processes):
+    for process in processes:
+        process.send_signal(signal.SIGTERM)
+    for process in processes:
+        process.wait(timeout=60)
+
+def benchmark(workers: int):
+    """Measure prefork with N workers against N independent servers"""
+    print(f"\nMeasuring {workers} worker(s)...")
+
+    prefork = [start_server(workers, BASE_PORT)]
+    try:
+        wait_until_ready(BASE_PORT)
+        prefork_memory = measure(prefork)
+    finally:
+        stop(prefork)
+
+    independent = [start_server(0, BASE_PORT + 1 + i) for i in range(workers)]
+    try:
+        for i in range(workers):
+            wait_until_ready(BASE_PORT + 1 + i)
+        independent_memory = measure(independent)
+    finally:
+        stop(independent)
+
+    print(f"Prefork:     RSS {prefork_memory['total_rss_mb']} MB, PSS {prefork_memory['total_pss_mb']} MB")
+    print(f"Independent: RSS {independent_memory['total_rss_mb']} MB, PSS {independent_memory['total_pss_mb']} MB")
+    return {
+        'workers': workers,
+        'prefork': prefork_memory,
+        'independent': independent_memory,
+        'pss_saving_mb': round(independent_memory['total_pss_mb'] - prefork_memory['total_pss_mb'], 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Prefork vs independent-process memory report')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    options = parser.parse_args()
+
+    print("="*70)
+    print("PREFORK MEMORY REPORT")
+    print("="*70)
+
+    report = {'results': [benchmark(workers) for workers in options.workers]}
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
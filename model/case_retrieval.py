@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Nearest-Neighbour Case Retrieval Engine for MediConnect
+Stores the L2-normalized symptom embeddings of every training case in a
+memory-mapped float32 matrix. A query is classified by cosine similarity
+against all stored cases (one matrix product) and similarity-weighted voting
+over its k nearest cases, which are also returned so clinicians can see the
+historical cases behind a diagnosis. The matrix is scanned in fixed-size
+blocks with a running top-k, so memory stays bounded for millions of cases.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+_INDEX_FORMAT_VERSION = 1
+
+# Arrays written as uncompressed .npy files (see CaseIndex.save)
+_ARRAY_FIELDS = ['embeddings', 'labels', 'ages', 'severities', 'symptoms', 'classes_']
+
+# Neighbours that vote on each query
+VOTE_K = int(os.environ.get('RETRIEVAL_VOTE_K', 25))
+
+# Stored cases scored per block; bounds the similarity buffer at
+# BLOCK_ROWS x batch size float32 values
+BLOCK_ROWS = 65536
+
+# Feature layout shared with the forests: [age, embedding_384, severity, gender]
+EMBEDDING_COLUMNS = slice(1, 385)
+
+def case_index_dir(model_path: str) -> str:
+    """Directory holding the case index for a pickled model file"""
+    return os.path.splitext(model_path)[0] + '_cases'
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """float32 copy of the rows scaled to unit L2 norm (zero rows stay zero)"""
+    embeddings = np.array(embeddings, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    embeddings /= norms
+    return embeddings
+
+class CaseIndex:
+    """Training cases as flat arrays, one row per case
+
+      embeddings - (n_cases, dim) float32 unit-norm symptom embeddings
+      labels     - class index of each case's diagnosis into classes_
+      ages       - age of each case
+      severities - index of each case's severity into severity_names
+      symptoms   - canonical symptom text of each case
+    """
+
+    def __init__(self, embeddings, labels, ages, severities, symptoms, classes, severity_names: List[str],
+                 vote_k: int = VOTE_K):
+        self.embeddings = embeddings
+        self.labels = labels
+        self.ages = ages
+        self.severities = severities
+        self.symptoms = symptoms
+        self.classes_ = classes
+        self.severity_names = list(severity_names)
+        self.vote_k = vote_k
+        self.n_cases, self.dim = embeddings.shape
+        self.n_classes = len(classes)
+        self.model_type = f"Nearest-neighbour retrieval (k={vote_k}, {self.n_cases} cases)"
+
+    @classmethod
+    def build(cls, embeddings, labels, ages, severities, symptoms, classes, vote_k: int = VOTE_K) -> 'CaseIndex':
+        """Index training cases; labels index into classes, severities are strings"""
+        severity_names, severity_codes = np.unique(np.asarray(severities, dtype=str), return_inverse=True)
+        return cls(
+            embeddings=normalize_rows(embeddings),
+            labels=np.asarray(labels, dtype=np.int32),
+            ages=np.asarray(ages, dtype=np.int16),
+            severities=severity_codes.astype(np.int8),
+            symptoms=np.asarray(symptoms, dtype=str),
+            classes=np.asarray(classes),
+            severity_names=severity_names.tolist(),
+            vote_k=vote_k
+        )
+
+    def save(self, directory: str):
+        """Write the arrays as uncompressed .npy files plus a small JSON header
+
+        The header is replaced last, so the directory's modification time
+        (part of the model version fingerprint) changes on every save.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAY_FIELDS:
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)),
+                    allow_pickle=False)
+        header_path = os.path.join(directory, 'cases.json')
+        with open(header_path + '.tmp', 'w') as f:
+            json.dump({
+                'format_version': _INDEX_FORMAT_VERSION,
+                'n_cases': int(self.n_cases),
+                'dim': int(self.dim),
+                'n_classes': int(self.n_classes),
+                'vote_k': int(self.vote_k),
+                'severity_names': self.severity_names
+            }, f, indent=2)
+        os.replace(header_path + '.tmp', header_path)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = 'r') -> 'CaseIndex':
+        """Open a saved index; with mmap_mode='r' the case arrays stay on disk until touched"""
+        with open(os.path.join(directory, 'cases.json'), 'r') as f:
+            header = json.load(f)
+        if header.get('format_version') != _INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported case index format in {directory}: {header.get('format_version')}")
+
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in _ARRAY_FIELDS
+        }
+        return cls(
+            embeddings=arrays['embeddings'],
+            labels=arrays['labels'],
+            ages=arrays['ages'],
+            severities=arrays['severities'],
+            symptoms=arrays['symptoms'],
+            classes=np.asarray(arrays['classes_']),
+            severity_names=header['severity_names'],
+            vote_k=header['vote_k']
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (case indices, cosine similarities) of each query's k nearest cases, most similar first
+
+        Queries are (n_queries, dim) embeddings and need not be normalized.
+        """
+        queries = normalize_rows(queries)
+        k = min(k, self.n_cases)
+        best_indices = np.empty((len(queries), 0), dtype=np.intp)
+        best_similarities = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, self.n_cases, BLOCK_ROWS):
+            block = np.asarray(self.embeddings[start:start + BLOCK_ROWS])
+            similarities = queries @ block.T
+
+            # Top k within the block, merged with the running top k
+            if similarities.shape[1] > k:
+                top = np.argpartition(similarities, -k, axis=1)[:, -k:]
+                similarities = np.take_along_axis(similarities, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(similarities.shape[1]), similarities.shape)
+            candidates = np.concatenate([best_indices, top + start], axis=1)
+            candidate_similarities = np.concatenate([best_similarities, similarities], axis=1)
+            if candidates.shape[1] > k:
+                keep = np.argpartition(candidate_similarities, -k, axis=1)[:, -k:]
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+                candidate_similarities = np.take_along_axis(candidate_similarities, keep, axis=1)
+            best_indices, best_similarities = candidates, candidate_similarities
+
+        order = np.argsort(-best_similarities, axis=1, kind='stable')
+        return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_similarities, order, axis=1)
+
+    def vote(self, neighbours: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+        """Class probabilities from similarity-weighted neighbour votes, shape (n_queries, n_classes)
+
+        Negative similarities carry no weight; a query with no positively
+        similar neighbour gets an equal vote from each of them.
+        """
+        weights = np.maximum(similarities, 0.0).astype(np.float64)
+        weights[weights.sum(axis=1) == 0.0] = 1.0
+        probabilities = np.zeros((len(neighbours), self.n_classes))
+        rows = np.repeat(np.arange(len(neighbours)), neighbours.shape[1])
+        np.add.at(probabilities, (rows, np.asarray(self.labels[neighbours.ravel()])), weights.ravel())
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+    def classify(self, X: np.ndarray):
+        """Return (predictions, probabilities, neighbours, similarities) for 387-feature rows"""
+        X = np.array(X, ndmin=2)
+        neighbours, similarities = self.search(X[:, EMBEDDING_COLUMNS], self.vote_k)
+        probabilities = self.vote(neighbours, similarities)
+        predictions = self.classes_.take(np.argmax(probabilities, axis=1), axis=0)
+        return predictions, probabilities, neighbours, similarities
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.classify(X)[1]
+
+    def predict_with_proba(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (predictions, probabilities), the same interface as the forest engines"""
+        predictions, probabilities, _, _ = self.classify(X)
+        return predictions, probabilities
+
+    def describe_cases(self, neighbours: np.ndarray, similarities: np.ndarray, disease_classes) -> List[List[Dict[str, Any]]]:
+        """JSON-ready stored cases for each row of neighbour indices"""
+        disease_names = np.asarray(disease_classes)
+        return [[{
+            'condition': str(disease_names[self.classes_[self.labels[case]]]),
+            'similarity': round(float(similarity), 4),
+            'age': int(self.ages[case]),
+            'severity': self.severity_names[self.severities[case]],
+            'symptoms': str(self.symptoms[case])
+        } for case, similarity in zip(row_cases, row_similarities)]
+            for row_cases, row_similarities in zip(neighbours, similarities)]
+
+def _median_ms(predict, X, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def compare_with_forest(index: CaseIndex, forest, X_test, y_test, gender_name: str) -> Dict[str, Any]:
+    """Accuracy, agreement and latency of the retrieval engine next to the forest on held-out rows"""
+    X_test = np.asarray(X_test, dtype=np.float64)
+    y_test = np.asarray(y_test)
+    forest_predictions = forest.predict(X_test)
+    retrieval_predictions, retrieval_probabilities = index.predict_with_proba(X_test)
+    retrieval_top5 = np.argsort(retrieval_probabilities, axis=1)[:, -5:]
+
+    report = {
+        'gender': gender_name,
+        'model_type': index.model_type,
+        'stored_cases': int(index.n_cases),
+        'index_mb': round(index.embeddings.nbytes / 1024 / 1024, 2),
+        'test_rows': int(len(X_test)),
+        'forest_accuracy': float(np.mean(forest_predictions == y_test)),
+        'retrieval_accuracy': float(np.mean(retrieval_predictions == y_test)),
+        'retrieval_top5_accuracy': float(np.mean([label in index.classes_[top] for label, top in
+                                                  zip(y_test, retrieval_top5)])),
+        'top1_agreement': float(np.mean(forest_predictions == retrieval_predictions)),
+        'latency': []
+    }
+    for name, predict in [('RandomForest (sklearn)', forest.predict_proba), (index.model_type, index.predict_proba)]:
+        report['latency'].append({
+            'model': name,
+            'single_row_ms': round(_median_ms(predict, X_test[:1], 50), 4),
+            'batch_ms_per_row': round(_median_ms(predict, X_test, 3) / len(X_test), 4)
+        })
+
+    print(f"{gender_name} retrieval: accuracy {report['retrieval_accuracy']:.1%} "
+          f"(forest {report['forest_accuracy']:.1%}), top-1 agreement {report['top1_agreement']:.1%}")
+    for row in report['latency']:
+        print(f"  {row['model']:<45} single row {row['single_row_ms']:.3f} ms, "
+              f"batch {row['batch_ms_per_row']:.4f} ms/row")
+    return report
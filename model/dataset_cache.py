@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Typed Columnar Dataset Cache for MediConnect
+Converts a semicolon CSV once into typed binary columns and memory-maps them
+back on later loads instead of re-parsing the text. Text columns become
+categorical integer codes: the symptom1..symptom6 columns share one
+vocabulary, and every other text column (severity, gender_specific, disease)
+has its own. Integer columns such as age get the smallest integer type that
+holds them (int8 for ages). Codes are stored as uncompressed .npy files and
+loaded with mmap_mode='r', so a load reads only the header and the
+vocabularies.
+
+Values are stored exactly as parsed, so callers normalize as before; on a
+categorical column pandas' string methods run once per category rather than
+per row. Every vocabulary includes '', so fillna('') keeps working.
+
+Each cache entry records the SHA-1 of its source file and is rebuilt
+automatically when the file changes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+_CACHE_FORMAT_VERSION = 1
+
+# Cache root; set to '' to always parse the CSV
+DATASET_CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', 'dataset_cache')
+
+# Columns sharing the 'symptoms' vocabulary
+SYMPTOM_COLUMNS = ['symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6']
+
+def file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_entry_dir(path: str, cache_dir: str) -> str:
+    """Cache directory of one source file"""
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0])
+
+def _code_dtype(n_categories: int):
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _integer_dtype(values: np.ndarray):
+    """Smallest integer type holding every value"""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _vocabulary_name(column: str) -> str:
+    return 'symptoms' if column in SYMPTOM_COLUMNS else column
+
+def write_cache(df: pd.DataFrame, directory: str, source_sha1: str, read_options: Dict[str, Any]):
+    """Save df as typed columns plus a JSON header of dtypes and vocabularies
+
+    Text columns are any object or string columns; numeric columns keep
+    their values (integers narrowed, floats as parsed).
+    """
+    text_columns = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+    vocabularies: Dict[str, List[str]] = {}
+    for column in text_columns:
+        vocabulary = vocabularies.setdefault(_vocabulary_name(column), [''])
+        vocabulary.extend(df[column].dropna().astype(str).unique().tolist())
+    vocabularies = {name: sorted(set(values)) for name, values in vocabularies.items()}
+
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    for column in df.columns:
+        if column in text_columns:
+            vocabulary = _vocabulary_name(column)
+            dtype = _code_dtype(len(vocabularies[vocabulary]))
+            codes = pd.Categorical(df[column].astype(object), categories=vocabularies[vocabulary]).codes.astype(dtype)
+            np.save(os.path.join(directory, f'{column}.npy'), codes, allow_pickle=False)
+            columns.append({'name': column, 'kind': 'category', 'vocabulary': vocabulary, 'dtype': np.dtype(dtype).name})
+        else:
+            values = df[column].to_numpy()
+            if np.issubdtype(values.dtype, np.integer):
+                values = values.astype(_integer_dtype(values))
+            np.save(os.path.join(directory, f'{column}.npy'), values, allow_pickle=False)
+            columns.append({'name': column, 'kind': 'numeric', 'dtype': values.dtype.name})
+
+    with open(os.path.join(directory, 'dataset.json'), 'w') as f:
+        json.dump({
+            'format_version': _CACHE_FORMAT_VERSION,
+            'source_sha1': source_sha1,
+            'read_options': read_options,
+            'rows': int(len(df)),
+            'columns': columns,
+            'vocabularies': vocabularies
+        }, f, indent=2)
+
+def load_cache(directory: str) -> pd.DataFrame:
+    """DataFrame over the memory-mapped columns of a cache entry"""
+    with open(os.path.join(directory, 'dataset.json'), 'r') as f:
+        header = json.load(f)
+    dtypes = {name: pd.CategoricalDtype(vocabulary) for name, vocabulary in header['vocabularies'].items()}
+
+    data = {}
+    for column in header['columns']:
+        values = np.load(os.path.join(directory, f"{column['name']}.npy"), mmap_mode='r', allow_pickle=False)
+        if column['kind'] == 'category':
+            data[column['name']] = pd.Categorical.from_codes(values, dtype=dtypes[column['vocabulary']])
+        else:
+            data[column['name']] = pd.Series(values, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+def _read_header(directory: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(directory, 'dataset.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def read_dataset(path: str, delimiter: str = ';', encoding: str = 'utf-8-sig',
+                 cache_dir: str = None) -> pd.DataFrame:
+    """pd.read_csv(path, delimiter=delimiter, encoding=encoding) through the columnar cache
+
+    Text columns come back categorical and integer columns narrowed. The
+    first load after the file changes parses it and rebuilds the entry.
+    """
+    cache_dir = DATASET_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return pd.read_csv(path, delimiter=delimiter, encoding=encoding)
+
+    directory = cache_entry_dir(path, cache_dir)
+    read_options = {'delimiter': delimiter, 'encoding': encoding}
+    source_sha1 = file_sha1(path)
+    header = _read_header(directory)
+    if (header.get('format_version') == _CACHE_FORMAT_VERSION and header.get('source_sha1') == source_sha1
+            and header.get('read_options') == read_options):
+        return load_cache(directory)
+
+    start = time.perf_counter()
+    df = pd.read_csv(path, delimiter=delimiter, encoding=encoding)
+    staging = f'{directory}.tmp-{os.getpid()}'
+    try:
+        write_cache(df, staging, source_sha1, read_options)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+    except OSError as e:
+        # Another process may have just published the same entry; its copy is as good as ours
+        shutil.rmtree(staging, ignore_errors=True)
+        if _read_header(directory).get('source_sha1') != source_sha1:
+            print(f"WARNING - Could not cache {path}: {e}")
+            return df
+    print(f"OK - Cached {path} as typed columns in {directory}/ ({time.perf_counter() - start:.1f}s)")
+    return load_cache(directory)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Per-Class Disease Metadata for MediConnect
+Severity tier, urgency tier and recommendation block for every disease class
+of a model, computed once (at training or load time) and saved next to the
+model info as *_disease_metadata_embedding.json, so serving does index
+lookups instead of keyword scans
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+METADATA_FORMAT_VERSION = 1
+
+# Severity keywords (checked in this order; first match wins)
+HIGH_SEVERITY_KEYWORDS = [
+    'stroke', 'heart attack', 'sepsis', 'meningitis', 'pneumonia',
+    'appendicitis', 'diabetic', 'cancer', 'hemorrhage', 'aneurysm'
+]
+MEDIUM_SEVERITY_KEYWORDS = [
+    'influenza', 'bronchitis', 'infection', 'fever', 'gastroenteritis'
+]
+
+# Urgency keywords; diseases matching neither get a confidence-based urgency
+EMERGENCY_KEYWORDS = ['stroke', 'heart attack', 'sepsis', 'meningitis', 'hemorrhage']
+URGENT_KEYWORDS = ['pneumonia', 'appendicitis', 'kidney', 'diabetic']
+
+# Confidence above which a non-keyword disease is 'Medium' rather than 'Low' urgency
+CONFIDENCE_URGENCY_THRESHOLD = 0.7
+
+def assess_severity(disease: str) -> str:
+    """Severity tier of a disease name"""
+    disease_lower = disease.lower()
+    if any(term in disease_lower for term in HIGH_SEVERITY_KEYWORDS):
+        return 'High'
+    if any(term in disease_lower for term in MEDIUM_SEVERITY_KEYWORDS):
+        return 'Medium'
+    return 'Low'
+
+def urgency_tier(disease: str) -> Optional[str]:
+    """Fixed urgency of a disease name, or None when it depends on confidence"""
+    disease_lower = disease.lower()
+    if any(keyword in disease_lower for keyword in EMERGENCY_KEYWORDS):
+        return 'Emergency'
+    if any(keyword in disease_lower for keyword in URGENT_KEYWORDS):
+        return 'High'
+    return None
+
+def determine_urgency(disease: str, confidence: float) -> str:
+    """Urgency of a prediction"""
+    tier = urgency_tier(disease)
+    if tier is not None:
+        return tier
+    return 'Medium' if confidence > CONFIDENCE_URGENCY_THRESHOLD else 'Low'
+
+def generate_recommendations(urgency: str) -> List[str]:
+    """Recommendation block for an urgency level"""
+    recommendations = []
+
+    if urgency == 'Emergency':
+        recommendations.append('⚠️ URGENT: Seek emergency medical attention immediately')
+        recommendations.append('Call emergency services or go to the nearest emergency room')
+    elif urgency == 'High':
+        recommendations.append('Consult a healthcare professional as soon as possible')
+        recommendations.append('Do not delay medical attention')
+    else:
+        recommendations.append('Schedule an appointment with your healthcare provider')
+        recommendations.append('Monitor your symptoms and seek care if they worsen')
+
+    recommendations.append('Keep a record of your symptoms and their progression')
+    recommendations.append('Follow up with your doctor for proper diagnosis and treatment')
+
+    return recommendations
+
+class DiseaseMetadata:
+    """Per-class lookup tables aligned with a model's disease_classes
+
+    severity        - severity tier per class
+    urgency         - fixed urgency per class, None where it depends on confidence
+    recommendations - recommendation block per class ('Medium' and 'Low'
+                      urgency share one block, so it never depends on confidence)
+    """
+
+    def __init__(self, classes: List[str], severity: List[str], urgency: List[Optional[str]],
+                 recommendations: List[List[str]]):
+        self.classes = list(classes)
+        self.severity = np.array(severity, dtype=object)
+        self.urgency = np.array(urgency, dtype=object)
+        self.recommendations = recommendations
+
+    @classmethod
+    def build(cls, disease_classes) -> 'DiseaseMetadata':
+        """Compute the tables for a list of disease class names"""
+        classes = [str(disease) for disease in disease_classes]
+        urgency = [urgency_tier(disease) for disease in classes]
+        return cls(
+            classes=classes,
+            severity=[assess_severity(disease) for disease in classes],
+            urgency=urgency,
+            recommendations=[generate_recommendations(tier or 'Low') for tier in urgency]
+        )
+
+    def urgencies(self, class_indices: np.ndarray, confidences: np.ndarray) -> np.ndarray:
+        """Urgency for each (predicted class, confidence) pair"""
+        fixed = self.urgency[class_indices]
+        by_confidence = np.where(np.asarray(confidences) > CONFIDENCE_URGENCY_THRESHOLD, 'Medium', 'Low')
+        return np.where(np.equal(fixed, None), by_confidence.astype(object), fixed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format_version': METADATA_FORMAT_VERSION,
+            'classes': self.classes,
+            'severity': self.severity.tolist(),
+            'urgency': self.urgency.tolist(),
+            'recommendations': self.recommendations
+        }
+
+    def save(self, path: str):
+        """Write the tables as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'DiseaseMetadata':
+        """Read tables written by save()"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format_version') != METADATA_FORMAT_VERSION:
+            raise ValueError(f"Unsupported disease metadata format in {path}: {data.get('format_version')}")
+        return cls(data['classes'], data['severity'], data['urgency'], data['recommendations'])
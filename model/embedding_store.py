@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Persistent Embedding Store for MediConnect Training
+Content-addressed on-disk cache of symptom embeddings, so retraining only
+encodes symptom strings no earlier run has seen. Each text is keyed by a hash
+of (encoder name, encoder version, text). Rows live in an append-only raw
+float32 file that is read back through a memory map; keys.txt holds one key
+per line, line i naming row i. Appends take an exclusive file lock, so the
+male and female training jobs can share one store.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+import numpy as np
+
+_STORE_FORMAT_VERSION = 1
+
+def content_key(encoder_name: str, encoder_version: str, text: str) -> str:
+    """Cache key of one symptom text for one encoder"""
+    return hashlib.sha1(f"{encoder_name}\0{encoder_version}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingStore:
+    """Append-only float32 embedding rows with a key index
+
+    Files in the store directory:
+      embeddings.f32 - raw float32 rows of `dim` values, in append order
+      keys.txt       - content key of each row, one per line
+      store.json     - dimension and the measured encode time per text
+      .lock          - flock target serializing appends
+    """
+
+    def __init__(self, directory: str, dim: int = 384):
+        self.directory = directory
+        self.dim = dim
+        self.data_path = os.path.join(directory, 'embeddings.f32')
+        self.keys_path = os.path.join(directory, 'keys.txt')
+        self.header_path = os.path.join(directory, 'store.json')
+        os.makedirs(directory, exist_ok=True)
+
+        header = self._read_header()
+        if header.get('dim', dim) != dim or header.get('format_version', _STORE_FORMAT_VERSION) != _STORE_FORMAT_VERSION:
+            raise ValueError(f"Embedding store in {directory} holds {header.get('dim')}-dim rows "
+                             f"(format {header.get('format_version')}), expected {dim}")
+        self.rows: Dict[str, int] = {}
+        self.n_rows = 0
+        # Length of keys.txt up to its last complete line
+        self._keys_bytes = 0
+        self._load_keys()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _read_header(self) -> Dict[str, Any]:
+        try:
+            with open(self.header_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _load_keys(self):
+        """Pick up rows appended since the last read (by this or another process)"""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, 'rb') as f:
+            data = f.read()
+        keys = data.decode('ascii', errors='replace').split('\n')
+        # A trailing partial line is a torn write and names no row
+        for row, key in enumerate(keys[:-1]):
+            self.rows.setdefault(key, row)
+        self.n_rows = len(keys) - 1
+        self._keys_bytes = data.rfind(b'\n') + 1
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, keys: List[str]) -> np.ndarray:
+        """Rows for keys that are all present, shape (len(keys), dim)"""
+        if not keys:
+            return np.empty((0, self.dim), dtype=np.float32)
+        stored = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(self.n_rows, self.dim))
+        return np.array(stored[[self.rows[key] for key in keys]])
+
+    def append(self, keys: List[str], embeddings: np.ndarray, encode_seconds: float):
+        """Add rows for new keys and fold their encode time into the per-text rate"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._locked():
+            self._load_keys()
+            n_rows = self.n_rows
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+
+            with open(self.data_path, 'ab') as f:
+                # Drop rows written by an append that died before recording their keys
+                f.truncate(n_rows * self.dim * 4)
+                embeddings[new].tofile(f)
+            lines = ''.join(f'{keys[i]}\n' for i in new).encode('ascii')
+            with open(self.keys_path, 'ab') as f:
+                # Drop a partial key line left by an append that died mid-write
+                f.truncate(self._keys_bytes)
+                f.write(lines)
+            self._keys_bytes += len(lines)
+            for offset, i in enumerate(new):
+                self.rows[keys[i]] = n_rows + offset
+            self.n_rows = n_rows + len(new)
+
+            header = self._read_header()
+            encoded = header.get('encoded_texts', 0) + len(keys)
+            seconds = header.get('encode_seconds', 0.0) + encode_seconds
+            with open(self.header_path + '.tmp', 'w') as f:
+                json.dump({'format_version': _STORE_FORMAT_VERSION, 'dim': self.dim,
+                           'encoded_texts': encoded, 'encode_seconds': seconds}, f, indent=2)
+            os.replace(self.header_path + '.tmp', self.header_path)
+
+    def seconds_per_text(self):
+        """Average encode time of every text this store has recorded, or None"""
+        header = self._read_header()
+        return header['encode_seconds'] / header['encoded_texts'] if header.get('encoded_texts') else None
+
+    def encode(self, encoder, texts: List[str], encoder_name: str, encoder_version: str, **encode_kwargs):
+        """Embeddings for texts, encoding only strings missing from the store
+
+        Returns (embeddings, stats). Each distinct missing string is encoded
+        once. stats counts hits and misses over distinct texts and
+        estimates the encode time saved against encoding every row.
+        """
+        self._load_keys()
+        keys = [content_key(encoder_name, encoder_version, text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows:
+                missing.setdefault(key, text)
+
+        encode_seconds = 0.0
+        if missing:
+            start = time.perf_counter()
+            new_embeddings = encoder.encode(list(missing.values()), **encode_kwargs)
+            encode_seconds = time.perf_counter() - start
+            self.append(list(missing), new_embeddings, encode_seconds)
+
+        seconds_per_text = self.seconds_per_text()
+        stats = {
+            'rows': len(texts),
+            'distinct_texts': len(set(keys)),
+            'cache_hits': len(set(keys)) - len(missing),
+            'cache_misses': len(missing),
+            'encode_seconds': round(encode_seconds, 3),
+            'estimated_seconds_saved': (round((len(texts) - len(missing)) * seconds_per_text, 3)
+                                        if seconds_per_text is not None else None),
+            'store_rows': len(self.rows)
+        }
+        return self.get(keys), stats
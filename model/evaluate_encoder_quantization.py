@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Int8 Encoder Accuracy-Parity Report for MediConnect
+Compares the dynamically quantized all-MiniLM-L6-v2 encoder against float32 on
+the test split of each embedding model: top-1/top-5 agreement, accuracy,
+encode speed and encoder size. Writes encoder_quantization_report.json
+"""
+import json
+import time
+import joblib
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from symptom_encoder import load_symptom_encoder, encoder_size_bytes
+from train_embedding_models import load_gender_datasets, prepare_embedding_features, create_symptom_text
+
+REPORT_FILE = 'encoder_quantization_report.json'
+
+def time_encoder(encoder, texts, single_text, repeats=50):
+    """Return (batch ms per row, single-request ms) for an encoder"""
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=32)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+    encoder.encode([single_text])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        encoder.encode([single_text])
+    single_ms = (time.perf_counter() - start) * 1000 / repeats
+
+    return batch_ms, single_ms
+
+def compare_gender(df, gender_name, encoder_fp32, encoder_int8):
+    """Score the saved forest on float32 and int8 features for the test split"""
+    print(f"\nComparing encoders on {gender_name} test split...")
+
+    X_fp32, y, _, _ = prepare_embedding_features(df.copy(), gender_name, encoder=encoder_fp32,
+                                                 encoder_backend='float32')
+    X_int8, _, _, _ = prepare_embedding_features(df.copy(), gender_name, encoder=encoder_int8,
+                                                 encoder_backend='int8')
+
+    # Same split as train_embedding_models.train_model
+    y_encoded = LabelEncoder().fit_transform(y)
+    _, test_idx = train_test_split(
+        np.arange(len(y_encoded)), test_size=0.2, random_state=42, stratify=y_encoded
+    )
+    y_test = y_encoded[test_idx]
+
+    model = joblib.load(f'{gender_name.lower()}_medical_model_embedding.pkl')
+    proba_fp32 = model.predict_proba(X_fp32[test_idx])
+    proba_int8 = model.predict_proba(X_int8[test_idx])
+
+    top5_fp32 = np.argsort(proba_fp32, axis=1)[:, -5:]
+    top5_int8 = np.argsort(proba_int8, axis=1)[:, -5:]
+    top1_fp32 = top5_fp32[:, -1]
+    top1_int8 = top5_int8[:, -1]
+
+    overlap = [len(set(a) & set(b)) / 5 for a, b in zip(top5_fp32, top5_int8)]
+    embedding_cosine = np.sum(
+        (X_fp32[test_idx, 1:385].astype(np.float64) * X_int8[test_idx, 1:385]), axis=1
+    ) / (np.linalg.norm(X_fp32[test_idx, 1:385], axis=1) *
+         np.linalg.norm(X_int8[test_idx, 1:385], axis=1))
+
+    result = {
+        'test_samples': int(len(test_idx)),
+        'top1_agreement': float(np.mean(top1_fp32 == top1_int8)),
+        'top1_in_int8_top5': float(np.mean([a in b for a, b in zip(top1_fp32, top5_int8)])),
+        'top5_overlap': float(np.mean(overlap)),
+        'accuracy_fp32': float(np.mean(model.classes_[top1_fp32] == y_test)),
+        'accuracy_int8': float(np.mean(model.classes_[top1_int8] == y_test)),
+        'mean_embedding_cosine': float(np.mean(embedding_cosine))
+    }
+
+    print(f"{gender_name} top-1 agreement: {result['top1_agreement']:.4f}")
+    print(f"{gender_name} top-5 overlap: {result['top5_overlap']:.4f}")
+    print(f"{gender_name} accuracy float32: {result['accuracy_fp32']:.4f}, int8: {result['accuracy_int8']:.4f}")
+    return result
+
+def main():
+    """Build the float32 vs int8 parity report"""
+    print("="*70)
+    print("INT8 ENCODER PARITY REPORT")
+    print("="*70)
+
+    encoder_fp32 = load_symptom_encoder('float32')
+    encoder_int8 = load_symptom_encoder('int8')
+
+    df_male, df_female = load_gender_datasets()
+
+    # Encoder speed on distinct training texts plus a typical single request
+    sample_texts = df_male.apply(create_symptom_text, axis=1).drop_duplicates().head(2000).tolist()
+    single_text = "cough, fever, headache"
+    fp32_batch_ms, fp32_single_ms = time_encoder(encoder_fp32, sample_texts, single_text)
+    int8_batch_ms, int8_single_ms = time_encoder(encoder_int8, sample_texts, single_text)
+
+    report = {
+        'encoder': {
+            'float32': {
+                'size_bytes': encoder_size_bytes(encoder_fp32),
+                'batch_ms_per_row': fp32_batch_ms,
+                'single_request_ms': fp32_single_ms
+            },
+            'int8': {
+                'size_bytes': encoder_size_bytes(encoder_int8),
+                'batch_ms_per_row': int8_batch_ms,
+                'single_request_ms': int8_single_ms
+            },
+            'batch_speedup': fp32_batch_ms / int8_batch_ms,
+            'single_request_speedup': fp32_single_ms / int8_single_ms
+        },
+        'male': compare_gender(df_male, "Male", encoder_fp32, encoder_int8),
+        'female': compare_gender(df_female, "Female", encoder_fp32, encoder_int8)
+    }
+
+    print(f"\nEncoder speedup: {report['encoder']['batch_speedup']:.2f}x batch, "
+          f"{report['encoder']['single_request_speedup']:.2f}x single request")
+    print(f"Encoder size: {report['encoder']['float32']['size_bytes'] / 1e6:.1f} MB -> "
+          f"{report['encoder']['int8']['size_bytes'] / 1e6:.1f} MB")
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"OK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
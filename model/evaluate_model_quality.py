@@ -6,6 +6,7 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report
 import joblib
+from dataset_cache import read_dataset
 
 def analyze_data_quality():
     """Analyze the quality and diversity of the training data"""
@@ -14,7 +15,7 @@ def analyze_data_quality():
     print("="*60)
     
     # Load data
-    df = pd.read_csv('medical_train_dataset.csv', delimiter=';', encoding='utf-8-sig')
+    df = read_dataset('medical_train_dataset.csv')
     
     print(f"Dataset shape: {df.shape}")
     
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Compiled NumPy Tree-Ensemble Inference Engine for MediConnect
+Flattens a fitted sklearn RandomForestClassifier into contiguous arrays and
+evaluates every tree in one vectorized pass, returning probabilities and
+predictions together (sklearn's predict + predict_proba walk the trees twice)
+"""
+import json
+import os
+import numpy as np
+from typing import Tuple
+
+# sklearn marks leaves with feature == -2 (TREE_UNDEFINED)
+_SKLEARN_LEAF = -2
+
+# Arrays written as uncompressed .npy sidecars (see CompiledForest.save)
+_ARRAY_FIELDS = ['feature', 'threshold', 'children', 'leaf_values', 'roots', 'classes_']
+_SIDECAR_FORMAT_VERSION = 1
+
+def sidecar_dir(model_path: str) -> str:
+    """Directory holding the .npy sidecars for a pickled model file"""
+    return os.path.splitext(model_path)[0] + '_arrays'
+
+class CompiledForest:
+    """Flat-array representation of a fitted RandomForestClassifier
+
+    All trees are concatenated into one node table:
+      feature     - feature index tested at each node (0 for leaves)
+      threshold   - float32 split threshold; the largest float32 not above
+                    sklearn's float64 threshold, so `x <= threshold` matches
+                    sklearn's float32-input comparison exactly
+      children    - global child pointers interleaved as [left, right] per
+                    node; leaves point at themselves
+      leaf_values - float64 per-node class distribution, normalized to sum 1
+    """
+
+    def __init__(self, feature, threshold, children, leaf_values, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_trees = len(roots)
+        self.n_classes = leaf_values.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """Compile a fitted sklearn forest classifier into flat arrays"""
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or not all(hasattr(tree, 'tree_') for tree in estimators):
+            raise TypeError(f"Unsupported model type for compiled inference: {type(model).__name__}")
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise TypeError("Compiled inference supports single-output classifiers only")
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.feature == _SKLEARN_LEAF
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(_float32_floor(tree.threshold))
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_left),
+                np.where(is_leaf, node_ids, tree.children_right)
+            ], axis=1).astype(np.intp).ravel() + offset)
+
+            # Per-node class distribution, normalized like sklearn's predict_proba
+            node_values = tree.value[:, 0, :].astype(np.float64)
+            totals = node_values.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+            values.append(node_values / totals)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            leaf_values=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_)
+        )
+
+    def save(self, directory: str):
+        """Write the node table as uncompressed .npy files plus a small JSON header
+
+        The files can be opened with load(mmap_mode='r') so several processes
+        share one copy of the model through the OS page cache.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAY_FIELDS:
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)),
+                    allow_pickle=False)
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump({
+                'format_version': _SIDECAR_FORMAT_VERSION,
+                'max_depth': int(self.max_depth),
+                'n_trees': int(self.n_trees),
+                'n_nodes': int(len(self.feature)),
+                'n_classes': int(self.n_classes)
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = 'r') -> 'CompiledForest':
+        """Open a saved node table; with mmap_mode='r' nothing is copied onto the heap"""
+        with open(os.path.join(directory, 'forest.json'), 'r') as f:
+            header = json.load(f)
+        if header.get('format_version') != _SIDECAR_FORMAT_VERSION:
+            raise ValueError(f"Unsupported forest sidecar format in {directory}: {header.get('format_version')}")
+
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in _ARRAY_FIELDS
+        }
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            children=arrays['children'],
+            leaf_values=arrays['leaf_values'],
+            roots=np.asarray(arrays['roots']),
+            max_depth=header['max_depth'],
+            classes=np.asarray(arrays['classes_'])
+        )
+
+    def feature_thresholds(self, feature: int) -> np.ndarray:
+        """Sorted distinct split thresholds tested on one feature (leaves excluded)"""
+        is_split = self.children[0::2] != np.arange(len(self.feature))
+        return np.unique(self.threshold[is_split & (self.feature == feature)])
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the global leaf index reached in every tree, shape (n_samples, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One (sample, tree) walker per entry, with each sample's row offset into flat_X
+        row_offsets = np.repeat(np.arange(n_samples, dtype=np.intp) * n_features, self.n_trees)
+        nodes = np.tile(self.roots, n_samples)
+
+        # Leaves loop back to themselves, so max_depth steps settle every path
+        for _ in range(self.max_depth):
+            go_right = flat_X[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+
+        return nodes.reshape(n_samples, self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Average the trees' leaf distributions, shape (n_samples, n_classes)"""
+        leaves = self.apply(X)
+        probabilities = np.zeros((leaves.shape[0], self.n_classes))
+        for t in range(self.n_trees):
+            probabilities += self.leaf_values[leaves[:, t]]
+        probabilities /= self.n_trees
+        return probabilities
+
+    def predict_with_proba(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (predictions, probabilities) from a single pass over the trees"""
+        probabilities = self.predict_proba(X)
+        predictions = self.classes_.take(np.argmax(probabilities, axis=1), axis=0)
+        return predictions, probabilities
+
+def feature_thresholds(model, feature: int) -> np.ndarray:
+    """Sorted distinct float32 split thresholds a forest tests on one feature
+
+    Accepts a CompiledForest or a fitted sklearn forest. Thresholds use the
+    same float32 rounding as CompiledForest, so two inputs take the same
+    branch at every node testing the feature exactly when threshold_interval
+    puts them in the same interval.
+    """
+    if isinstance(model, CompiledForest):
+        return model.feature_thresholds(feature)
+
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators or not all(hasattr(tree, 'tree_') for tree in estimators):
+        raise TypeError(f"Unsupported model type for threshold extraction: {type(model).__name__}")
+    return np.unique(np.concatenate([
+        _float32_floor(tree.tree_.threshold[tree.tree_.feature == feature]) for tree in estimators
+    ]))
+
+def threshold_interval(thresholds: np.ndarray, values) -> np.ndarray:
+    """Interval index of each value: how many thresholds its float32 value exceeds
+
+    Values with equal indices go the same way at every split on those
+    thresholds (a split sends x right when x > threshold).
+    """
+    return np.searchsorted(thresholds, np.asarray(values, dtype=np.float32), side='left')
+
+def _float32_floor(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 values not greater than the given float64 thresholds"""
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
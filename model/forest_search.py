@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Latency- and Memory-Aware Forest Hyperparameter Search for MediConnect
+Successive halving over the RandomForest settings of a training script
+(n_estimators, max_depth, min_samples_leaf, max_features). Each round fits
+the surviving candidates in parallel processes on a growing share of the
+training split and keeps the best 1/factor of them. Candidates are scored
+on macro-F1 over the held-out split, measured single-row and batch
+predict_proba latency, and pickled size. Survivors are ranked by Pareto
+layer over those objectives, then by macro-F1.
+
+Features are prepared once per gender and cached as .npy files keyed by a
+hash of the dataset and encoder; workers memory-map them, so parallel
+candidates share one copy. Latency is timed in this process, one model at
+a time, so it is not skewed by the parallel fits.
+
+    python forest_search.py train_embedding_models
+
+Writes forest_search_report.json (every round, the final Pareto front and
+the selected settings per gender) and the selected forest of each gender
+to forest_search/ as a .pkl plus its memory-mapped arrays.
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid, train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from forest_engine import CompiledForest, sidecar_dir
+from training_orchestrator import GENDERS, TRAINING_CORES, available_cores, limit_threads
+
+SEARCH_DIR = 'forest_search'
+REPORT_FILE = 'forest_search_report.json'
+
+SEARCH_SPACE = {
+    'n_estimators': [50, 100, 200, 300],
+    'max_depth': [10, 15, 25, None],
+    'min_samples_leaf': [1, 2, 5, 10],
+    'max_features': ['sqrt', 'log2', 0.2]
+}
+
+# Hand-tuned settings in each script's train_model; always evaluated on the full split
+BASELINES = {
+    'train_embedding_models': {'n_estimators': 100, 'max_depth': 15, 'min_samples_leaf': 5, 'max_features': 'sqrt'},
+    'train_gender_models': {'n_estimators': 300, 'max_depth': 25, 'min_samples_leaf': 1, 'max_features': 'sqrt'}
+}
+# Settings the search leaves as each script has them
+FIXED_PARAMS = {
+    'train_embedding_models': {'min_samples_split': 10, 'class_weight': 'balanced', 'random_state': 42},
+    'train_gender_models': {'min_samples_split': 3, 'class_weight': 'balanced', 'random_state': 42}
+}
+
+# Objectives: (report field, True to maximize)
+OBJECTIVES = [('macro_f1', True), ('single_row_ms', False), ('batch_ms_per_row', False), ('size_mb', False)]
+
+# Held-out rows timed per batch prediction
+BATCH_ROWS = 256
+
+# Features shared with forked workers, set by search_gender before the pool starts
+_FEATURES: Dict[str, np.ndarray] = {}
+
+def feature_cache_key(script: str, gender_name: str, module) -> str:
+    """Hash of the dataset bytes plus everything else that shapes the features"""
+    digest = hashlib.sha1()
+    with open(f'medical_training_dataset_{gender_name.lower()}_augmented.csv', 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(script.encode('utf-8'))
+    if hasattr(module, 'ENCODER_BACKEND'):
+        from symptom_encoder import encoder_version
+        from symptom_text import CANONICALIZATION_VERSION
+        digest.update(f"{encoder_version(module.ENCODER_BACKEND)}\0{CANONICALIZATION_VERSION}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def load_features(script: str, gender_name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(X, y) for one gender as the script trains on them, memory-mapped from the cache
+
+    y is the encoded disease label. A cache miss runs the script's own
+    feature preparation once and saves the arrays.
+    """
+    module = importlib.import_module(script)
+    prefix = os.path.join(SEARCH_DIR, 'features',
+                          f'{script}_{gender_name.lower()}_{feature_cache_key(script, gender_name, module)}')
+    if not os.path.exists(prefix + '_y.npy'):
+        df = module.load_gender_dataset(gender_name)
+        if script == 'train_embedding_models':
+            X, y, _, _ = module.prepare_embedding_features(df, gender_name)
+            y = LabelEncoder().fit_transform(y)
+        else:
+            X, y, all_symptoms = module.prepare_features(df, gender_name)
+            X, y, _, _ = module.encode_features(X, y, all_symptoms, gender_name)
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        np.save(prefix + '_X.npy', np.ascontiguousarray(X, dtype=np.float32))
+        # Labels last: their presence marks a complete cache entry
+        np.save(prefix + '_y.npy', np.asarray(y, dtype=np.int32))
+        print(f"OK - Cached {gender_name} features in {prefix}_X.npy")
+    else:
+        print(f"OK - Using cached {gender_name} features {prefix}_X.npy")
+    return np.load(prefix + '_X.npy', mmap_mode='r'), np.load(prefix + '_y.npy', mmap_mode='r')
+
+def sample_candidates(n_candidates: int, baseline: Dict[str, Any], seed: int = 42) -> List[Dict[str, Any]]:
+    """n_candidates distinct settings from SEARCH_SPACE, the baseline first"""
+    grid = [params for params in ParameterGrid(SEARCH_SPACE) if params != baseline]
+    rng = np.random.RandomState(seed)
+    picks = rng.choice(len(grid), size=min(n_candidates - 1, len(grid)), replace=False)
+    return [dict(sorted(baseline.items()))] + [grid[i] for i in picks]
+
+def halving_schedule(n_candidates: int, factor: int, final_candidates: int, n_rows: int) -> List[Tuple[int, int]]:
+    """(candidates, training rows) per round; the last round trains on all rows"""
+    rounds = [n_candidates]
+    while rounds[-1] > final_candidates:
+        rounds.append(max(final_candidates, -(-rounds[-1] // factor)))
+    return [(candidates, max(1, n_rows // factor ** (len(rounds) - 1 - i))) for i, candidates in enumerate(rounds)]
+
+def pareto_layers(rows: List[Dict[str, Any]]) -> List[int]:
+    """Non-dominated sorting layer of each row over OBJECTIVES (0 = Pareto front)"""
+    signs = np.array([-1.0 if maximize else 1.0 for _, maximize in OBJECTIVES])
+    points = np.array([[row[name] for name, _ in OBJECTIVES] for row in rows], dtype=np.float64) * signs
+    layers = np.full(len(rows), -1)
+    layer = 0
+    while (layers < 0).any():
+        remaining = np.flatnonzero(layers < 0)
+        for i in remaining:
+            others = points[remaining]
+            dominated = np.any(np.all(others <= points[i], axis=1) & np.any(others < points[i], axis=1))
+            if not dominated:
+                layers[i] = layer
+        layer += 1
+    return layers.tolist()
+
+def _fit_candidate(params: Dict[str, Any], rows: np.ndarray, validation_rows: np.ndarray, model_path: str) -> Dict[str, Any]:
+    """Fit one candidate on rows, score it on the held-out rows and save it"""
+    X, y = _FEATURES['X'], _FEATURES['y']
+    start = time.perf_counter()
+    model = RandomForestClassifier(**params, n_jobs=1).fit(X[rows], y[rows])
+    fit_seconds = time.perf_counter() - start
+
+    joblib.dump(model, model_path)
+    return {
+        'macro_f1': float(f1_score(y[validation_rows], model.predict(X[validation_rows]), average='macro')),
+        'fit_seconds': round(fit_seconds, 2),
+        'size_mb': round(os.path.getsize(model_path) / 1024 / 1024, 3)
+    }
+
+def _median_ms(predict, X, repeats: int) -> float:
+    predict(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def measure_latency(model_path: str, X_batch: np.ndarray) -> Dict[str, float]:
+    """Median single-row and per-row batch predict_proba time of a saved forest"""
+    model = joblib.load(model_path)
+    return {
+        'single_row_ms': round(_median_ms(model.predict_proba, X_batch[:1], 30), 4),
+        'batch_ms_per_row': round(_median_ms(model.predict_proba, X_batch, 5) / len(X_batch), 4)
+    }
+
+def _report_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if k != 'model_path'}
+
+def select_configuration(front: List[Dict[str, Any]], f1_tolerance: float) -> Dict[str, Any]:
+    """Fastest single-row front member whose macro-F1 is within f1_tolerance of the best"""
+    best_f1 = max(row['macro_f1'] for row in front)
+    eligible = [row for row in front if row['macro_f1'] >= best_f1 - f1_tolerance]
+    return min(eligible, key=lambda row: (row['single_row_ms'], row['size_mb'], -row['macro_f1']))
+
+def search_gender(script: str, gender_name: str, options) -> Dict[str, Any]:
+    """Successive halving for one gender; saves the selected forest and returns its report"""
+    print("\n" + "="*50)
+    print(f"SEARCHING {gender_name.upper()} FOREST SETTINGS ({script})")
+    print("="*50)
+
+    X, y = load_features(script, gender_name)
+    train_rows, validation_rows = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42,
+                                                   stratify=np.asarray(y))
+    # Fixed order, so every round trains on a superset of the last one's rows
+    train_rows = np.random.RandomState(42).permutation(train_rows)
+    X_batch = np.asarray(X[np.sort(validation_rows)[:BATCH_ROWS]])
+    _FEATURES.update(X=X, y=y)
+
+    baseline = BASELINES[script]
+    fixed = FIXED_PARAMS[script]
+    candidates = [{'id': i, 'params': params, 'baseline': params == baseline}
+                  for i, params in enumerate(sample_candidates(options.candidates, baseline))]
+    schedule = halving_schedule(len(candidates), options.factor, options.final, len(train_rows))
+    cores = options.cores or TRAINING_CORES or available_cores()
+    print(f"{len(candidates)} candidates, factor {options.factor}, {cores} parallel fits")
+    print("Rounds: " + ", ".join(f"{n} on {rows} rows" for n, rows in schedule))
+
+    rounds = []
+    survivors = candidates
+    scratch = tempfile.mkdtemp(prefix='forest_search_')
+    try:
+        for round_index, (_, n_rows) in enumerate(schedule):
+            final_round = round_index == len(schedule) - 1
+            if final_round and not any(c['baseline'] for c in survivors):
+                survivors = survivors + [c for c in candidates if c['baseline']]
+            rows = np.sort(train_rows[:n_rows])
+
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=cores, mp_context=context, initializer=limit_threads,
+                                     initargs=(1,)) as pool:
+                futures = [pool.submit(_fit_candidate, {**fixed, **c['params']}, rows, validation_rows,
+                                       os.path.join(scratch, f"{round_index}_{c['id']}.pkl"))
+                           for c in survivors]
+                results = [future.result() for future in futures]
+
+            evaluated = []
+            for candidate, result in zip(survivors, results):
+                model_path = os.path.join(scratch, f"{round_index}_{candidate['id']}.pkl")
+                row = {**candidate, **result, **measure_latency(model_path, X_batch), 'model_path': model_path}
+                evaluated.append(row)
+            for row, layer in zip(evaluated, pareto_layers(evaluated)):
+                row['pareto_layer'] = layer
+            evaluated.sort(key=lambda row: (row['pareto_layer'], -row['macro_f1']))
+
+            print(f"\nRound {round_index + 1}: {len(evaluated)} candidates on {n_rows} rows")
+            for row in evaluated:
+                print(f"  layer {row['pareto_layer']} macro-F1 {row['macro_f1']:.4f} "
+                      f"single {row['single_row_ms']:.2f} ms, batch {row['batch_ms_per_row']:.4f} ms/row, "
+                      f"{row['size_mb']:.1f} MB {row['params']}{' (baseline)' if row['baseline'] else ''}")
+            rounds.append({'training_rows': int(n_rows), 'candidates': [_report_row(row) for row in evaluated]})
+
+            if not final_round:
+                keep = schedule[round_index + 1][0]
+                survivors = [{k: row[k] for k in ['id', 'params', 'baseline']} for row in evaluated[:keep]]
+                for row in evaluated:
+                    os.remove(row['model_path'])
+
+        front = [row for row in evaluated if row['pareto_layer'] == 0]
+        selected = select_configuration(front, options.f1_tolerance)
+        baseline_row = next(row for row in evaluated if row['baseline'])
+
+        # Keep the selected forest as the search's artifact
+        os.makedirs(SEARCH_DIR, exist_ok=True)
+        model_filename = os.path.join(SEARCH_DIR, f'{script}_{gender_name.lower()}_selected.pkl')
+        shutil.move(selected['model_path'], model_filename)
+        CompiledForest.from_sklearn(joblib.load(model_filename)).save(sidecar_dir(model_filename))
+        print(f"\nOK - Saved {model_filename} and {sidecar_dir(model_filename)}/")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"Selected {selected['params']}: macro-F1 {selected['macro_f1']:.4f} "
+          f"(baseline {baseline_row['macro_f1']:.4f}), single row {selected['single_row_ms']:.2f} ms "
+          f"(baseline {baseline_row['single_row_ms']:.2f} ms), {selected['size_mb']:.1f} MB "
+          f"(baseline {baseline_row['size_mb']:.1f} MB)")
+    return {
+        'features': {'rows': int(len(y)), 'columns': int(X.shape[1]), 'validation_rows': int(len(validation_rows))},
+        'fixed_params': fixed,
+        'rounds': rounds,
+        'pareto_front': [_report_row(row) for row in front],
+        'baseline': _report_row(baseline_row),
+        'selected': {**_report_row(selected), 'params': {**fixed, **selected['params']}, 'model_file': model_filename}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive-halving forest search on macro-F1, latency and size')
+    parser.add_argument('script', nargs='?', default='train_embedding_models', choices=sorted(BASELINES))
+    parser.add_argument('--genders', nargs='+', default=GENDERS, choices=GENDERS)
+    parser.add_argument('--candidates', type=int, default=32, help='Settings sampled from the search space')
+    parser.add_argument('--factor', type=int, default=2, help='Keep 1/factor of the candidates per round')
+    parser.add_argument('--final', type=int, default=8, help='Candidates trained on the full training split')
+    parser.add_argument('--f1-tolerance', type=float, default=0.01,
+                        help='Select the fastest front member within this macro-F1 of the best')
+    parser.add_argument('--cores', type=int, default=0, help='Parallel fits (default TRAINING_CORES or all cores)')
+    options = parser.parse_args()
+
+    print("="*70)
+    print("FOREST HYPERPARAMETER SEARCH")
+    print("="*70)
+
+    report = {'script': options.script, 'search_space': SEARCH_SPACE, 'objectives': {name: 'max' if maximize else 'min' for name, maximize in OBJECTIVES},
+              'factor': options.factor, 'f1_tolerance': options.f1_tolerance}
+    for gender_name in options.genders:
+        report[gender_name.lower()] = search_gender(options.script, gender_name, options)
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
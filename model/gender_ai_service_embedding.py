@@ -6,19 +6,269 @@ Uses all-MiniLM-L6-v2 embeddings + RandomForest for better symptom understanding
 import pandas as pd
 import numpy as np
 import joblib
+import bisect
+import hashlib
 import json
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
 import logging
 from sentence_transformers import SentenceTransformer
+from symptom_text import canonical_symptom_text
+from symptom_encoder import EMBEDDING_MODEL_NAME, ENCODER_BACKENDS, load_symptom_encoder
+from forest_engine import CompiledForest, feature_thresholds, sidecar_dir
+from disease_metadata import DiseaseMetadata, assess_severity, determine_urgency, generate_recommendations
+from service_metrics import StageMetrics, sample_verbose, stage_metrics
+from student_model import StudentModel, student_path as default_student_path
+from case_retrieval import CaseIndex, case_index_dir
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load embedding model globally (load once, use many times)
-logger.info("Loading all-MiniLM-L6-v2 embedding model...")
-embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-logger.info("OK - Embedding model loaded")
+# Embedding cache budget (override with environment variables)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 4096))
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get('EMBEDDING_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Diagnosis result cache budget and entry lifetime (RESULT_CACHE_MAX_ENTRIES=0 disables it)
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 10000))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 3600))
+
+# Inference backend: 'sklearn', 'compiled' (flat NumPy arrays, see forest_engine.py),
+# 'student' (compact model distilled from each forest, see student_model.py) or
+# 'retrieval' (nearest training cases by embedding similarity, see case_retrieval.py)
+INFERENCE_BACKENDS = ['sklearn', 'compiled', 'student', 'retrieval']
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'sklearn')
+
+# Most similar training cases returned with each diagnosis by the retrieval backend
+SIMILAR_CASES = int(os.environ.get('SIMILAR_CASES', 5))
+
+# Embedding models are loaded once per encoder backend on first use (see
+# get_embedding_model) so that importing this module stays cheap and the API
+# can bind before models load
+embedding_models = {}
+_embedding_model_lock = threading.Lock()
+
+# Synthetic cases used to warm up both gender paths before serving traffic
+WARMUP_CASES = [
+    {'age': 30, 'symptoms': "fever, cough, body aches, fatigue, chills, sore throat", 'severity': "medium", 'gender': "male"},
+    {'age': 45, 'symptoms': "chest pain, shortness of breath, dizziness", 'severity': "high", 'gender': "male"},
+    {'age': 25, 'symptoms': "abdominal cramps, bloating, lower back pain, breast tenderness", 'severity': "medium", 'gender': "female"},
+    {'age': 60, 'symptoms': "headache, nausea, fatigue", 'severity': "low", 'gender': "female"}
+]
+
+def get_embedding_model(backend: str = 'float32') -> SentenceTransformer:
+    """Return the shared embedding model for an encoder backend, loading it on first call"""
+    if backend not in embedding_models:
+        with _embedding_model_lock:
+            if backend not in embedding_models:
+                logger.info(f"Loading all-MiniLM-L6-v2 embedding model ({backend} backend)...")
+                embedding_models[backend] = load_symptom_encoder(backend)
+                logger.info("OK - Embedding model loaded")
+    return embedding_models[backend]
+
+class EmbeddingCache:
+    """Thread-safe bounded LRU cache of float32 symptom embeddings
+
+    Keys are (embedding model name, encoder backend, normalized symptom text). Entries are
+    evicted least-recently-used first once either the entry budget or the
+    byte budget is exceeded.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key) -> Optional[np.ndarray]:
+        """Return the cached embedding for key, or None on a miss"""
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key, embedding: np.ndarray) -> np.ndarray:
+        """Store an embedding as read-only float32 and return the stored array"""
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        if self.max_entries <= 0 or embedding.nbytes > self.max_bytes:
+            return embedding
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = embedding
+            self._bytes += embedding.nbytes
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+        return embedding
+
+    def clear(self):
+        """Drop all cached embeddings (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters for health/metrics reporting"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Process-wide embedding cache shared by all service instances
+embedding_cache = EmbeddingCache()
+
+class ResultCache:
+    """Thread-safe bounded LRU + TTL cache of complete diagnosis results
+
+    Keys are (model version, encoder backend, canonical symptom text, age,
+    severity, gender), which fully determine a prediction. Stored results
+    are shared between callers and must be treated as read-only. Size is
+    estimated from the JSON encoding of each result.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (result, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a successful result and return it"""
+        if self.max_entries <= 0 or not result.get('success'):
+            return result
+
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return result
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+        return result
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        """Drop all cached results (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters for health/metrics reporting"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Model artifact file names inside a model directory, in constructor argument order
+MODEL_FILES = OrderedDict([
+    ('male_model_path', 'male_medical_model_embedding.pkl'),
+    ('male_encoders_path', 'male_medical_encoders_embedding.pkl'),
+    ('male_classes_path', 'male_disease_classes_embedding.pkl'),
+    ('male_info_path', 'male_model_info_embedding.json'),
+    ('female_model_path', 'female_medical_model_embedding.pkl'),
+    ('female_encoders_path', 'female_medical_encoders_embedding.pkl'),
+    ('female_classes_path', 'female_disease_classes_embedding.pkl'),
+    ('female_info_path', 'female_model_info_embedding.json'),
+    ('male_metadata_path', 'male_disease_metadata_embedding.json'),
+    ('female_metadata_path', 'female_disease_metadata_embedding.json'),
+    ('male_student_path', 'male_medical_model_embedding_student.npz'),
+    ('female_student_path', 'female_medical_model_embedding_student.npz'),
+    ('male_cases_path', 'male_medical_model_embedding_cases'),
+    ('female_cases_path', 'female_medical_model_embedding_cases')
+])
+
+def model_paths(model_dir: str = '.') -> Dict[str, str]:
+    """Constructor keyword arguments for the model artifacts in model_dir"""
+    return OrderedDict((arg, os.path.join(model_dir, filename)) for arg, filename in MODEL_FILES.items())
+
+def model_version(paths: List[str]) -> str:
+    """Short fingerprint of model artifacts from their paths, sizes and modification times"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        except OSError:
+            digest.update(f"{os.path.abspath(path)}:missing;".encode())
+    return digest.hexdigest()[:12]
+
+def top_k_indices(probabilities: np.ndarray, k: int) -> np.ndarray:
+    """Class indices of the k highest probabilities in each row, highest first"""
+    return np.argsort(probabilities, axis=1)[:, -k:][:, ::-1]
 
 class EmbeddingMediConnectAI:
     def __init__(self,
@@ -29,8 +279,26 @@ class EmbeddingMediConnectAI:
                  female_model_path='female_medical_model_embedding.pkl',
                  female_encoders_path='female_medical_encoders_embedding.pkl',
                  female_classes_path='female_disease_classes_embedding.pkl',
-                 female_info_path='female_model_info_embedding.json'):
+                 female_info_path='female_model_info_embedding.json',
+                 male_metadata_path='male_disease_metadata_embedding.json',
+                 female_metadata_path='female_disease_metadata_embedding.json',
+                 male_student_path=None, female_student_path=None,
+                 male_cases_path=None, female_cases_path=None,
+                 inference_backend=INFERENCE_BACKEND,
+                 encoder_backend=None):
         """Initialize the embedding-based AI diagnosis service"""
+        if inference_backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Invalid inference backend: {inference_backend}. Must be one of {INFERENCE_BACKENDS}")
+        self.inference_backend = inference_backend
+        self.compiled_forests = {}
+        self.student_models = {}
+        self.case_indexes = {}
+        self.metrics = stage_metrics
+        self.result_cache = ResultCache()
+        self.model_version = None
+        self.age_thresholds = {}
+        self.disease_metadata = {}
+
         self.male_model = None
         self.male_encoders = None
         self.male_disease_classes = None
@@ -44,232 +312,570 @@ class EmbeddingMediConnectAI:
         # Load both gender models
         self.load_gender_models(
             male_model_path, male_encoders_path, male_classes_path, male_info_path,
-            female_model_path, female_encoders_path, female_classes_path, female_info_path
+            female_model_path, female_encoders_path, female_classes_path, female_info_path,
+            male_metadata_path, female_metadata_path, male_student_path, female_student_path,
+            male_cases_path, female_cases_path
         )
+        self.compile_forests()
+
+        # Load the shared embedding model with the backend the models were trained on
+        self.encoder_backend = self._resolve_encoder_backend(encoder_backend)
+        get_embedding_model(self.encoder_backend)
+
+    def warm_up(self) -> Dict[str, Any]:
+        """Run synthetic predictions through both gender paths
+
+        Pays the first-call costs (encoder graph, allocator, forest page-in)
+        before real traffic arrives. Raises if any warm-up prediction fails.
+        """
+        start = time.perf_counter()
+
+        # Keep cold-start timings out of the live stage histograms, and bypass the
+        # result cache so the batch pass below really runs
+        live_metrics, self.metrics = self.metrics, StageMetrics()
+        live_cache, self.result_cache = self.result_cache, ResultCache(max_entries=0)
+        try:
+            for case in WARMUP_CASES:
+                result = self.predict_disease(**case)
+                if not result['success']:
+                    raise Exception(f"Warm-up prediction failed: {result['error']}")
+
+            results = self.predict_batch(WARMUP_CASES)
+            failed = [result['error'] for result in results if not result['success']]
+            if failed:
+                raise Exception(f"Warm-up batch prediction failed: {failed[0]}")
+        finally:
+            self.metrics = live_metrics
+            self.result_cache = live_cache
+
+        warmup_seconds = time.perf_counter() - start
+        logger.info(f"OK - Warm-up completed in {warmup_seconds:.2f}s ({len(WARMUP_CASES)} cases, both genders)")
+        return {'cases': len(WARMUP_CASES), 'seconds': warmup_seconds}
 
     def load_gender_models(self, male_model_path, male_encoders_path, male_classes_path, male_info_path,
-                          female_model_path, female_encoders_path, female_classes_path, female_info_path):
+                          female_model_path, female_encoders_path, female_classes_path, female_info_path,
+                          male_metadata_path=None, female_metadata_path=None,
+                          male_student_path=None, female_student_path=None,
+                          male_cases_path=None, female_cases_path=None):
         """Load both male and female model components"""
+        # Students and case indexes ship next to their forests unless given explicitly
+        male_student_path = male_student_path or default_student_path(male_model_path)
+        female_student_path = female_student_path or default_student_path(female_model_path)
+        male_cases_path = male_cases_path or case_index_dir(male_model_path)
+        female_cases_path = female_cases_path or case_index_dir(female_model_path)
         try:
             # Load male model
-            self.male_model = joblib.load(male_model_path)
+            self.male_model = self._load_forest('male', male_model_path, male_student_path, male_cases_path)
             self.male_disease_classes = joblib.load(male_classes_path)
             self.male_encoders = joblib.load(male_encoders_path)
 
             with open(male_info_path, 'r') as f:
-                self.male_model_info = json.load(f)
+                self.male_model_info = self._served_model_info('male', json.load(f))
 
             logger.info("OK - Male AI model loaded successfully")
             logger.info(f"Male model supports {len(self.male_disease_classes)} diseases")
 
             # Load female model
-            self.female_model = joblib.load(female_model_path)
+            self.female_model = self._load_forest('female', female_model_path, female_student_path, female_cases_path)
             self.female_disease_classes = joblib.load(female_classes_path)
             self.female_encoders = joblib.load(female_encoders_path)
 
             with open(female_info_path, 'r') as f:
-                self.female_model_info = json.load(f)
+                self.female_model_info = self._served_model_info('female', json.load(f))
 
             logger.info("OK - Female AI model loaded successfully")
             logger.info(f"Female model supports {len(self.female_disease_classes)} diseases")
 
+            self.disease_metadata = {
+                'male': self._load_disease_metadata('male', male_metadata_path, self.male_disease_classes),
+                'female': self._load_disease_metadata('female', female_metadata_path, self.female_disease_classes)
+            }
+
+            # Results computed with the previous models are no longer valid
+            self.model_version = model_version([path for path in [
+                male_model_path, male_encoders_path, male_classes_path, male_info_path,
+                female_model_path, female_encoders_path, female_classes_path, female_info_path,
+                male_metadata_path, female_metadata_path, male_student_path, female_student_path,
+                male_cases_path, female_cases_path
+            ] if path is not None])
+            self.result_cache.clear()
+            logger.info(f"Model version {self.model_version}")
+
+            self.analyze_age_splits()
+
         except FileNotFoundError as e:
             raise Exception(f"Embedding-based AI models not available: {e}")
         except Exception as e:
             logger.error(f"ERROR - Error loading gender models: {e}")
             raise Exception("Failed to load embedding-based AI models")
 
-    def create_symptom_embedding(self, symptoms: str) -> np.ndarray:
+    def _load_disease_metadata(self, gender_lower: str, metadata_path: Optional[str], disease_classes) -> DiseaseMetadata:
+        """Per-class severity/urgency/recommendation tables from training, or built now
+
+        Saved tables are only used when they list exactly this model's classes.
+        """
+        if metadata_path and os.path.exists(metadata_path):
+            metadata = DiseaseMetadata.load(metadata_path)
+            if metadata.classes == [str(disease) for disease in disease_classes]:
+                return metadata
+            logger.warning(f"{metadata_path} does not match the {gender_lower} model classes, rebuilding it")
+        return DiseaseMetadata.build(disease_classes)
+
+    def analyze_age_splits(self):
+        """Collect each gender forest's split thresholds on the age feature (feature 0)
+
+        Ages inside the same interval between consecutive thresholds take
+        identical paths through every tree, so caches and batch
+        deduplication key on the interval instead of the raw age.
+        """
+        self.age_thresholds = {}
+        for gender_lower, model in [('male', self.male_model), ('female', self.female_model)]:
+            if gender_lower in self.student_models:
+                # A student's output changes continuously with age
+                self.age_thresholds[gender_lower] = None
+                logger.info(f"Serving the {gender_lower} student model, caching on raw age")
+                continue
+            if gender_lower in self.case_indexes:
+                # Retrieval compares symptom embeddings only, so every age shares one interval
+                self.age_thresholds[gender_lower] = []
+                logger.info(f"Serving {gender_lower} case retrieval, age does not affect results")
+                continue
+            forest = model if model is not None else self.compiled_forests.get(gender_lower)
+            try:
+                self.age_thresholds[gender_lower] = feature_thresholds(forest, 0).tolist()
+                logger.info(f"{gender_lower.capitalize()} forest splits age into "
+                            f"{len(self.age_thresholds[gender_lower]) + 1} intervals")
+            except TypeError as e:
+                self.age_thresholds[gender_lower] = None
+                logger.warning(f"Age intervals unavailable for {gender_lower} model, caching on raw age: {e}")
+
+    def age_interval(self, gender_lower: str, age):
+        """Equivalence class of an age for a gender model (the raw age when unknown)"""
+        thresholds = self.age_thresholds.get(gender_lower)
+        if thresholds is None:
+            return age
+        # Same float32 value and `x > threshold` branching as the forest itself
+        return bisect.bisect_left(thresholds, float(np.float32(age)))
+
+    def _load_forest(self, gender_lower: str, model_path: str, student_path: str, cases_path: str):
+        """Load a gender forest
+
+        With the compiled backend, memory-mapped .npy sidecars (written at
+        training time) are used when present: the pickle is never unpickled,
+        startup is near-instant and the OS page cache shares the arrays
+        between processes. With the student backend only the distilled
+        student is loaded, and with the retrieval backend only the
+        memory-mapped case index. Returns None in those cases, since the
+        forest itself is not needed.
+        """
+        if self.inference_backend == 'student':
+            self.student_models[gender_lower] = StudentModel.load(student_path)
+            logger.info(f"OK - Loaded {gender_lower} {self.student_models[gender_lower].model_type} from {student_path}")
+            return None
+
+        if self.inference_backend == 'retrieval':
+            self.case_indexes[gender_lower] = CaseIndex.load(cases_path, mmap_mode='r')
+            logger.info(f"OK - Memory-mapped {self.case_indexes[gender_lower].n_cases} {gender_lower} cases from {cases_path}")
+            return None
+
+        arrays_dir = sidecar_dir(model_path)
+        if self.inference_backend == 'compiled' and os.path.isdir(arrays_dir):
+            self.compiled_forests[gender_lower] = CompiledForest.load(arrays_dir, mmap_mode='r')
+            logger.info(f"OK - Memory-mapped {gender_lower} forest from {arrays_dir}")
+            return None
+        return joblib.load(model_path)
+
+    def create_symptom_embedding(self, symptoms: str, verbose: bool = False) -> np.ndarray:
         """Convert symptom text to 384-dim embedding"""
-        # Clean and normalize symptoms
-        symptom_text = symptoms.lower().strip()
+        # Canonicalize symptoms (deduped, trimmed, sorted) exactly as in training
+        symptom_text = canonical_symptom_text(symptoms)
+
+        # Serve repeated symptom strings from the cache without running the transformer
+        cache_key = (EMBEDDING_MODEL_NAME, self.encoder_backend, symptom_text)
+        embedding = embedding_cache.get(cache_key)
+        if embedding is not None:
+            if verbose:
+                logger.info(f"Embedding cache hit for: '{symptom_text}'")
+            return embedding
 
         # Generate embedding
-        embedding = embedding_model.encode([symptom_text])[0]
-        logger.info(f"Generated embedding for: '{symptom_text}' (384 dimensions)")
+        embedding = embedding_cache.put(cache_key, get_embedding_model(self.encoder_backend).encode([symptom_text])[0])
+        if verbose:
+            logger.info(f"Generated embedding for: '{symptom_text}' (384 dimensions)")
 
         return embedding
 
-    def predict_disease(self, age: int, symptoms: str, severity: str, gender: str) -> Dict[str, Any]:
-        """Make disease prediction with embedding-based gender-specific model"""
+    def create_symptom_embeddings(self, symptoms_list: List[str], verbose: bool = False) -> np.ndarray:
+        """Convert a batch of symptom texts to 384-dim embeddings with one encode call"""
+        symptom_texts = [canonical_symptom_text(symptoms) for symptoms in symptoms_list]
+
+        # Look up every distinct text in the cache and encode only the misses
+        embeddings_by_text = {}
+        for symptom_text in dict.fromkeys(symptom_texts):
+            embedding = embedding_cache.get((EMBEDDING_MODEL_NAME, self.encoder_backend, symptom_text))
+            if embedding is not None:
+                embeddings_by_text[symptom_text] = embedding
+
+        missing_texts = [text for text in dict.fromkeys(symptom_texts) if text not in embeddings_by_text]
+        if missing_texts:
+            encoded = get_embedding_model(self.encoder_backend).encode(missing_texts, batch_size=64)
+            for symptom_text, embedding in zip(missing_texts, encoded):
+                embeddings_by_text[symptom_text] = embedding_cache.put((EMBEDDING_MODEL_NAME, self.encoder_backend, symptom_text), embedding)
+
+        if verbose:
+            logger.info(f"Generated {len(symptom_texts)} embeddings in one batch "
+                        f"({len(missing_texts)} encoded, {len(symptom_texts) - len(missing_texts)} from cache)")
+
+        return np.stack([embeddings_by_text[text] for text in symptom_texts])
+
+    def _resolve_encoder_backend(self, requested: Optional[str]) -> str:
+        """Pick the encoder backend recorded in the model info unless one is requested"""
+        trained = {info.get('encoder_backend', 'float32') for info in [self.male_model_info, self.female_model_info]}
+        if len(trained) > 1:
+            logger.warning(f"Male and female models were trained with different encoder backends: {sorted(trained)}")
+
+        backend = requested or self.male_model_info.get('encoder_backend', 'float32')
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Invalid encoder backend: {backend}. Must be one of {ENCODER_BACKENDS}")
+        if backend not in trained:
+            logger.warning(f"Serving with {backend} encoder but models were trained with {sorted(trained)}")
+
+        logger.info(f"Using {backend} encoder backend")
+        return backend
+
+    def compile_forests(self):
+        """Build compiled forest engines when the compiled backend is selected"""
+        if self.inference_backend != 'compiled':
+            self.compiled_forests = {}
+            return
+
+        for gender_lower, model in [('male', self.male_model), ('female', self.female_model)]:
+            if model is None:
+                # Already loaded from memory-mapped sidecars
+                continue
+            try:
+                self.compiled_forests[gender_lower] = CompiledForest.from_sklearn(model)
+                logger.info(f"OK - Compiled {gender_lower} forest ({self.compiled_forests[gender_lower].n_trees} trees)")
+            except TypeError as e:
+                logger.warning(f"Compiled backend unavailable for {gender_lower} model, using sklearn: {e}")
+
+    def _served_model_info(self, gender_lower: str, model_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Model info as reported in responses, naming the student or case index when one is served"""
+        student = self.student_models.get(gender_lower)
+        if student is not None:
+            return {**model_info, 'model_type': f"{student.model_type} distilled from {model_info['model_type']}",
+                    'teacher_model_type': model_info['model_type']}
+        case_index = self.case_indexes.get(gender_lower)
+        if case_index is not None:
+            return {**model_info, 'model_type': case_index.model_type,
+                    'forest_model_type': model_info['model_type']}
+        return model_info
+
+    def _forest_predict(self, gender_lower: str, model, features: np.ndarray):
+        """Return (predictions, probabilities) from one pass over the gender's forest or its replacement"""
+        engine = (self.student_models.get(gender_lower) or self.case_indexes.get(gender_lower)
+                  or self.compiled_forests.get(gender_lower))
+        if engine is not None:
+            return engine.predict_with_proba(features)
+
+        # predict() is the argmax of predict_proba(), so one call gives both
+        probabilities = model.predict_proba(features)
+        return model.classes_.take(np.argmax(probabilities, axis=1), axis=0), probabilities
+
+    def _predict_with_cases(self, gender_lower: str, model, features: np.ndarray, disease_classes):
+        """Return (predictions, probabilities, similar_cases)
+
+        similar_cases holds the SIMILAR_CASES nearest training cases per row
+        with the retrieval backend (found by the same search that votes) and
+        is None otherwise.
+        """
+        case_index = self.case_indexes.get(gender_lower)
+        if case_index is None:
+            return (*self._forest_predict(gender_lower, model, features), None)
+
+        predictions, probabilities, neighbours, similarities = case_index.classify(features)
+        similar_cases = case_index.describe_cases(neighbours[:, :SIMILAR_CASES], similarities[:, :SIMILAR_CASES],
+                                                  disease_classes)
+        return predictions, probabilities, similar_cases
+
+    def _get_gender_components(self, gender_lower: str):
+        """Return (model, encoders, disease_classes, model_info) for a validated gender"""
+        if gender_lower == 'male':
+            return self.male_model, self.male_encoders, self.male_disease_classes, self.male_model_info
+        return self.female_model, self.female_encoders, self.female_disease_classes, self.female_model_info
+
+    def _encode_severity(self, encoders: dict, severity: str) -> int:
+        """Encode severity, falling back to medium for unknown values"""
+        severity_normalized = severity.lower().strip()
+        try:
+            return encoders['severity'].transform([severity_normalized])[0]
+        except:
+            logger.warning(f"Unknown severity: {severity_normalized}, using default (medium)")
+            return encoders['severity'].transform(['medium'])[0]
+
+    def _encode_gender(self, encoders: dict, gender_lower: str) -> int:
+        """Encode gender, falling back to 0 for unknown values"""
+        try:
+            return encoders['gender'].transform([gender_lower])[0]
+        except:
+            logger.warning(f"Unknown gender: {gender_lower}, using default")
+            return 0
+
+    def _assemble_features(self, encoders: dict, gender_lower: str, ages: List[int], embeddings: np.ndarray,
+                           severities: List[str]) -> np.ndarray:
+        """Feature matrix, one row per case: [age, embedding_384, severity, gender] = 387 features"""
+        features = np.empty((len(ages), 387))
+        features[:, 0] = ages
+        features[:, 1:385] = embeddings
+        features[:, 385] = [self._encode_severity(encoders, severity) for severity in severities]
+        features[:, 386] = self._encode_gender(encoders, gender_lower)
+        return features
+
+    def _result_cache_key(self, age: int, symptoms: str, severity: str, gender_lower: str):
+        """Everything that determines a diagnosis result (age reduced to its split interval)"""
+        return (self.model_version, self.encoder_backend, canonical_symptom_text(symptoms),
+                self.age_interval(gender_lower, age), severity.lower().strip(), gender_lower)
+
+    def predict_disease(self, age: int, symptoms: str, severity: str, gender: str,
+                        verbose: Optional[bool] = None) -> Dict[str, Any]:
+        """Make disease prediction with embedding-based gender-specific model
+
+        Repeated inputs are answered from the result cache with the
+        previously built response. Stage timings go to self.metrics.
+        Per-request INFO logs are only written when verbose is set, or for a
+        VERBOSE_LOG_SAMPLE_RATE sample of requests when it is left as None.
+        """
+        if verbose is None:
+            verbose = sample_verbose()
+
         try:
             # Validate gender
             gender_lower = gender.lower().strip()
             if gender_lower not in ['male', 'female']:
                 raise ValueError(f"Invalid gender: {gender}. Must be 'Male' or 'Female'")
 
+            cache_key = self._result_cache_key(age, symptoms, severity, gender_lower)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                if verbose:
+                    logger.info(f"Result cache hit for {gender_lower.upper()} model")
+                return cached
+
             # Select appropriate model and encoders
-            if gender_lower == 'male':
-                model = self.male_model
-                encoders = self.male_encoders
-                disease_classes = self.male_disease_classes
-                model_info = self.male_model_info
-                logger.info(f"Using MALE embedding-based model")
-            else:  # female
-                model = self.female_model
-                encoders = self.female_encoders
-                disease_classes = self.female_disease_classes
-                model_info = self.female_model_info
-                logger.info(f"Using FEMALE embedding-based model")
+            model, encoders, disease_classes, model_info = self._get_gender_components(gender_lower)
+            if verbose:
+                logger.info(f"Using {gender_lower.upper()} embedding-based model")
 
             # Generate symptom embedding
-            symptom_embedding = self.create_symptom_embedding(symptoms)
+            with self.metrics.timed(gender_lower, 'embed'):
+                symptom_embedding = self.create_symptom_embedding(symptoms, verbose)
 
-            # Encode severity
-            severity_normalized = severity.lower().strip()
-            try:
-                severity_encoded = encoders['severity'].transform([severity_normalized])[0]
-                logger.info(f"Encoded severity: {severity_normalized} -> {severity_encoded}")
-            except:
-                logger.warning(f"Unknown severity: {severity_normalized}, using default (medium)")
-                severity_encoded = encoders['severity'].transform(['medium'])[0]
-
-            # Encode gender
-            gender_normalized = gender_lower
+            with self.metrics.timed(gender_lower, 'features'):
+                features = self._assemble_features(encoders, gender_lower, [age], symptom_embedding[None],
+                                                   [severity])
+
+            if verbose:
+                logger.info(f"Encoded severity: {severity.lower().strip()} -> {int(features[0, 385])}")
+                logger.info(f"Encoded gender: {gender_lower} -> {int(features[0, 386])}")
+                logger.info(f"Feature vector shape: {features.shape} (expected: (1, 387))")
+
+            # Make prediction (probabilities and argmax from a single forest pass)
+            with self.metrics.timed(gender_lower, 'inference'):
+                predictions, probabilities, similar_cases = self._predict_with_cases(gender_lower, model, features,
+                                                                                     disease_classes)
+
+            with self.metrics.timed(gender_lower, 'response'):
+                result = self._build_diagnosis_results(predictions, probabilities, disease_classes, model_info,
+                                                       self.disease_metadata[gender_lower], [gender], verbose,
+                                                       similar_cases)[0]
+            return self.result_cache.put(cache_key, result)
+
+        except Exception as e:
+            logger.error(f"ERROR - Prediction failed: {e}")
+            import traceback
+            traceback.print_exc()
+            return {
+                'success': False,
+                'error': str(e),
+                'diagnosis': None
+            }
+
+    def predict_batch(self, cases: List[Dict[str, Any]], verbose: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Make disease predictions for many cases at once
+
+        Each case is a dict with 'age', 'symptoms', 'severity' and 'gender'.
+        All symptom strings go through one batched encode and each gender
+        model runs a single predict_proba over its rows. Results come back in
+        the same order as the input cases, with per-case error results for
+        invalid entries. Cases found in the result cache skip the model
+        entirely, and cases with the same cache key within a batch are scored
+        once. Stage timings are recorded once per batch.
+        """
+        if verbose is None:
+            verbose = sample_verbose()
+
+        results: List[Dict[str, Any]] = [None] * len(cases)
+        rows_by_gender = {'male': [], 'female': []}
+        first_index = {}     # cache key -> index of the case that gets scored
+        duplicates = []      # (index, index of the equivalent scored case)
+
+        # Validate cases and split them by gender
+        for i, case in enumerate(cases):
             try:
-                gender_encoded = encoders['gender'].transform([gender_normalized])[0]
-                logger.info(f"Encoded gender: {gender_normalized} -> {gender_encoded}")
-            except:
-                logger.warning(f"Unknown gender: {gender_normalized}, using default")
-                gender_encoded = 0
-
-            # Create feature vector: [age, embedding_384, severity, gender] = 387 features
-            features = np.concatenate([
-                [age],                    # 1 feature
-                symptom_embedding,        # 384 features
-                [severity_encoded],       # 1 feature
-                [gender_encoded]          # 1 feature
-            ]).reshape(1, -1)
-
-            logger.info(f"Feature vector shape: {features.shape} (expected: (1, 387))")
-
-            # Make prediction
-            prediction = model.predict(features)[0]
-            probabilities = model.predict_proba(features)[0]
-
-            # Get predicted disease
+                gender_lower = str(case.get('gender', '')).lower().strip()
+                if gender_lower not in ['male', 'female']:
+                    raise ValueError(f"Invalid gender: {case.get('gender')}. Must be 'Male' or 'Female'")
+                symptoms = case.get('symptoms') or ''
+                if not symptoms.strip():
+                    raise ValueError("Symptoms are required")
+                age = int(case.get('age', 30))
+                severity = case.get('severity', 'Medium')
+                cache_key = self._result_cache_key(age, symptoms, severity, gender_lower)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                if cache_key in first_index:
+                    duplicates.append((i, first_index[cache_key]))
+                    continue
+                first_index[cache_key] = i
+                rows_by_gender[gender_lower].append((i, age, symptoms, severity, case.get('gender'), cache_key))
+            except Exception as e:
+                results[i] = {'success': False, 'error': str(e), 'diagnosis': None}
+
+        valid_rows = rows_by_gender['male'] + rows_by_gender['female']
+        if not valid_rows:
+            return results
+
+        try:
+            # One encode call over every valid symptom string
+            with self.metrics.timed('all', 'embed', 'batch'):
+                embeddings = self.create_symptom_embeddings([row[2] for row in valid_rows], verbose)
+
+            offset = 0
+            for gender_lower in ['male', 'female']:
+                rows = rows_by_gender[gender_lower]
+                if not rows:
+                    continue
+                model, encoders, disease_classes, model_info = self._get_gender_components(gender_lower)
+
+                # Assemble the (n, 387) feature matrix for this gender
+                with self.metrics.timed(gender_lower, 'features', 'batch'):
+                    features = self._assemble_features(encoders, gender_lower, [row[1] for row in rows],
+                                                       embeddings[offset:offset + len(rows)],
+                                                       [row[3] for row in rows])
+                offset += len(rows)
+
+                if verbose:
+                    logger.info(f"Batch {gender_lower.upper()} model: {len(rows)} cases")
+
+                # One forest pass per gender
+                with self.metrics.timed(gender_lower, 'inference', 'batch'):
+                    predictions, probabilities, similar_cases = self._predict_with_cases(
+                        gender_lower, model, features, disease_classes)
+
+                with self.metrics.timed(gender_lower, 'response', 'batch'):
+                    built = self._build_diagnosis_results(predictions, probabilities, disease_classes, model_info,
+                                                          self.disease_metadata[gender_lower],
+                                                          [row[4] for row in rows], verbose, similar_cases)
+                    for row, result in zip(rows, built):
+                        results[row[0]] = self.result_cache.put(row[5], result)
+
+        except Exception as e:
+            logger.error(f"ERROR - Batch prediction failed: {e}")
+            import traceback
+            traceback.print_exc()
+            for row in valid_rows:
+                results[row[0]] = {'success': False, 'error': str(e), 'diagnosis': None}
+
+        for i, scored_index in duplicates:
+            results[i] = results[scored_index]
+
+        return results
+
+    def _build_diagnosis_results(self, predictions: np.ndarray, probabilities: np.ndarray, disease_classes,
+                                 model_info: Dict[str, Any], metadata: DiseaseMetadata, genders: List[str],
+                                 verbose: bool = False,
+                                 similar_cases: Optional[List[List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """Build diagnosis responses for rows of class probabilities
+
+        Top-5 ranking, severity, urgency and recommendations are gathered for
+        all rows at once from the per-class metadata tables. Rows of
+        similar_cases, when given, are added to each diagnosis.
+        """
+        predictions = np.asarray(predictions)
+        rows = np.arange(len(predictions))
+        confidences = probabilities[rows, predictions]
+
+        # Top 5 predictions per row
+        top_5_indices = top_k_indices(probabilities, 5)
+        top_5_probabilities = np.take_along_axis(probabilities, top_5_indices, axis=1)
+        top_5_diseases = np.asarray(disease_classes)[top_5_indices].tolist()
+        top_5_severities = metadata.severity[top_5_indices].tolist()
+
+        # Urgency per row: fixed per class, or from the confidence
+        urgencies = metadata.urgencies(predictions, confidences).tolist()
+        source = f"{model_info['model_type']}"
+
+        results = []
+        for i, prediction in enumerate(predictions):
             predicted_disease = disease_classes[prediction]
-            confidence = probabilities[prediction]
+            confidence = confidences[i]
 
-            logger.info(f"PREDICTION: {predicted_disease} with {confidence:.1%} confidence")
+            if verbose:
+                logger.info(f"PREDICTION: {predicted_disease} with {confidence:.1%} confidence")
 
-            # Get top 5 predictions
-            top_5_indices = np.argsort(probabilities)[-5:][::-1]
             top_5_predictions = []
-
-            for i, idx in enumerate(top_5_indices):
-                disease = disease_classes[idx]
-                prob = probabilities[idx]
+            for rank, (disease, prob, severity) in enumerate(zip(top_5_diseases[i], top_5_probabilities[i],
+                                                                 top_5_severities[i])):
                 top_5_predictions.append({
-                    'rank': i + 1,
+                    'rank': rank + 1,
                     'condition': disease,
                     'confidence': f"{prob:.1%}",
                     'probability': float(prob),
-                    'source': f"{model_info['model_type']}",
+                    'source': source,
                     'category': 'Medical Condition',
-                    'severity': self._assess_severity(disease, prob)
+                    'severity': severity
                 })
-                logger.info(f"  #{i+1}: {disease} - {prob:.1%}")
-
-            # Determine urgency
-            urgency = self._determine_urgency(predicted_disease, confidence)
+                if verbose:
+                    logger.info(f"  #{rank+1}: {disease} - {prob:.1%}")
 
             # Create diagnosis response
-            diagnosis_result = {
+            results.append({
                 'success': True,
                 'diagnosis': {
                     'primary_diagnosis': f"Based on AI analysis: {predicted_disease}",
                     'confidence': f"{confidence:.1%}",
                     'top_disease': predicted_disease,
                     'possible_conditions': top_5_predictions,
-                    'urgency': urgency,
-                    'recommendations': self._generate_recommendations(predicted_disease, urgency),
+                    'urgency': urgencies[i],
+                    'recommendations': list(metadata.recommendations[prediction]),
                     'disclaimer': 'This is an AI-generated prediction. Please consult a healthcare professional for proper diagnosis.',
                     'model_info': {
                         'type': model_info['model_type'],
                         'diseases_supported': model_info['total_diseases'],
                         'accuracy': '70-74% test accuracy',
                         'training_samples': 'Trained on 27,000+ medical cases',
-                        'gender_specific': f"{gender.capitalize()} model"
+                        'gender_specific': f"{genders[i].capitalize()} model"
                     }
                 }
-            }
+            })
+            if similar_cases is not None:
+                results[-1]['diagnosis']['similar_cases'] = similar_cases[i]
 
-            return diagnosis_result
-
-        except Exception as e:
-            logger.error(f"ERROR - Prediction failed: {e}")
-            import traceback
-            traceback.print_exc()
-            return {
-                'success': False,
-                'error': str(e),
-                'diagnosis': None
-            }
+        return results
 
     def _assess_severity(self, disease: str, confidence: float) -> str:
-        """Assess severity based on disease and confidence"""
-        disease_lower = disease.lower()
-
-        # High severity diseases
-        high_severity = [
-            'stroke', 'heart attack', 'sepsis', 'meningitis', 'pneumonia',
-            'appendicitis', 'diabetic', 'cancer', 'hemorrhage', 'aneurysm'
-        ]
-
-        # Medium severity
-        medium_severity = [
-            'influenza', 'bronchitis', 'infection', 'fever', 'gastroenteritis'
-        ]
-
-        for term in high_severity:
-            if term in disease_lower:
-                return 'High'
-
-        for term in medium_severity:
-            if term in disease_lower:
-                return 'Medium'
-
-        return 'Low'
+        """Assess severity based on disease (see disease_metadata.py)"""
+        return assess_severity(disease)
 
     def _determine_urgency(self, disease: str, confidence: float) -> str:
-        """Determine urgency level"""
-        disease_lower = disease.lower()
-
-        emergency_keywords = ['stroke', 'heart attack', 'sepsis', 'meningitis', 'hemorrhage']
-        urgent_keywords = ['pneumonia', 'appendicitis', 'kidney', 'diabetic']
-
-        for keyword in emergency_keywords:
-            if keyword in disease_lower:
-                return 'Emergency'
-
-        for keyword in urgent_keywords:
-            if keyword in disease_lower:
-                return 'High'
-
-        if confidence > 0.7:
-            return 'Medium'
-
-        return 'Low'
+        """Determine urgency level (see disease_metadata.py)"""
+        return determine_urgency(disease, confidence)
 
     def _generate_recommendations(self, disease: str, urgency: str) -> List[str]:
-        """Generate recommendations based on disease and urgency"""
-        recommendations = []
-
-        if urgency == 'Emergency':
-            recommendations.append('⚠️ URGENT: Seek emergency medical attention immediately')
-            recommendations.append('Call emergency services or go to the nearest emergency room')
-        elif urgency == 'High':
-            recommendations.append('Consult a healthcare professional as soon as possible')
-            recommendations.append('Do not delay medical attention')
-        else:
-            recommendations.append('Schedule an appointment with your healthcare provider')
-            recommendations.append('Monitor your symptoms and seek care if they worsen')
-
-        recommendations.append('Keep a record of your symptoms and their progression')
-        recommendations.append('Follow up with your doctor for proper diagnosis and treatment')
-
-        return recommendations
+        """Generate recommendations based on urgency (see disease_metadata.py)"""
+        return generate_recommendations(urgency)
 
 # Test function
 def test_embedding_ai():
@@ -311,5 +917,19 @@ def test_embedding_ai():
         print(f"Prediction: {result['diagnosis']['top_disease']}")
         print(f"Confidence: {result['diagnosis']['confidence']}")
 
+    # Test 3: Batch prediction keeps input order across genders
+    print("\n3. Testing BATCH prediction (mixed genders):")
+    results = ai.predict_batch([
+        {'age': 30, 'symptoms': "fever, cough, body aches", 'severity': "medium", 'gender': "male"},
+        {'age': 25, 'symptoms': "abdominal cramps, bloating", 'severity': "medium", 'gender': "female"},
+        {'age': 40, 'symptoms': "headache, nausea", 'severity': "low", 'gender': "unknown"}
+    ])
+
+    for i, result in enumerate(results, 1):
+        if result['success']:
+            print(f"  Case {i}: {result['diagnosis']['top_disease']} ({result['diagnosis']['confidence']})")
+        else:
+            print(f"  Case {i}: ERROR - {result['error']}")
+
 if __name__ == "__main__":
     test_embedding_ai()
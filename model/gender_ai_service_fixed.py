@@ -8,13 +8,20 @@ import pandas as pd
 import numpy as np
 import joblib
 import json
-from typing import List, Dict, Any
+import os
+import time
+from typing import List, Dict, Any, Optional
 import logging
+from forest_engine import CompiledForest, sidecar_dir
+from service_metrics import sample_verbose, stage_metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Forest inference backend: 'sklearn' or 'compiled' (flat NumPy arrays, see forest_engine.py)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'sklearn')
+
 class GenderMediConnectAI:
     def __init__(self, 
                  male_model_path='male_medical_model.pkl', 
@@ -24,8 +31,14 @@ class GenderMediConnectAI:
                  female_model_path='female_medical_model.pkl', 
                  female_encoders_path='female_medical_encoders.pkl', 
                  female_classes_path='female_disease_classes.pkl',
-                 female_info_path='female_model_info.json'):
+                 female_info_path='female_model_info.json',
+                 inference_backend=INFERENCE_BACKEND):
         """Initialize the gender-specific AI diagnosis service"""
+        if inference_backend not in ['sklearn', 'compiled']:
+            raise ValueError(f"Invalid inference backend: {inference_backend}. Must be 'sklearn' or 'compiled'")
+        self.inference_backend = inference_backend
+        self.compiled_forests = {}
+
         self.male_model = None
         self.male_encoders = None
         self.male_disease_classes = None
@@ -41,13 +54,14 @@ class GenderMediConnectAI:
             male_model_path, male_encoders_path, male_classes_path, male_info_path,
             female_model_path, female_encoders_path, female_classes_path, female_info_path
         )
+        self.compile_forests()
         
     def load_gender_models(self, male_model_path, male_encoders_path, male_classes_path, male_info_path,
                           female_model_path, female_encoders_path, female_classes_path, female_info_path):
         """Load both male and female model components"""
         try:
             # Load male model
-            self.male_model = joblib.load(male_model_path)
+            self.male_model = self._load_forest('male', male_model_path)
             self.male_encoders = joblib.load(male_encoders_path)
             self.male_disease_classes = joblib.load(male_classes_path)
             
@@ -58,7 +72,7 @@ class GenderMediConnectAI:
             logger.info(f"Male model supports {len(self.male_disease_classes)} diseases")
             
             # Load female model
-            self.female_model = joblib.load(female_model_path)
+            self.female_model = self._load_forest('female', female_model_path)
             self.female_encoders = joblib.load(female_encoders_path)
             self.female_disease_classes = joblib.load(female_classes_path)
             
@@ -75,7 +89,34 @@ class GenderMediConnectAI:
             logger.error(f"❌ Error loading gender models: {e}")
             raise Exception("Failed to load gender-specific AI models")
     
-    def normalize_symptom(self, symptom: str) -> str:
+    def _load_forest(self, gender_lower: str, model_path: str):
+        """Load a gender forest, memory-mapping .npy sidecars when the compiled backend can use them"""
+        arrays_dir = sidecar_dir(model_path)
+        if self.inference_backend == 'compiled' and os.path.isdir(arrays_dir):
+            # Skips unpickling the 1 GB forest; pages are shared through the OS page cache
+            self.compiled_forests[gender_lower] = CompiledForest.load(arrays_dir, mmap_mode='r')
+            logger.info(f"✅ Memory-mapped {gender_lower} forest from {arrays_dir}")
+            return None
+        return joblib.load(model_path)
+    
+    def compile_forests(self):
+        """Build compiled forest engines when the compiled backend is selected"""
+        if self.inference_backend != 'compiled':
+            self.compiled_forests = {}
+            return
+        
+        for gender_lower, model in [('male', self.male_model), ('female', self.female_model)]:
+            if model is None:
+                # Already loaded from memory-mapped sidecars
+                continue
+            try:
+                self.compiled_forests[gender_lower] = CompiledForest.from_sklearn(model)
+                logger.info(f"✅ Compiled {gender_lower} forest ({self.compiled_forests[gender_lower].n_trees} trees)")
+            except TypeError as e:
+                # XGBoost models from train_gender_models.py stay on their own predict path
+                logger.warning(f"⚠️ Compiled backend unavailable for {gender_lower} model, using model API: {e}")
+    
+    def normalize_symptom(self, symptom: str, verbose: bool = False) -> str:
         """Normalize and map common symptom variations to model vocabulary"""
         symptom = symptom.strip().lower()
         
@@ -130,17 +171,17 @@ class GenderMediConnectAI:
         
         # Return mapped symptom or original
         mapped = mapping.get(symptom, symptom)
-        if mapped != symptom:
+        if verbose and mapped != symptom:
             logger.info(f"🔄 Mapped symptom: '{symptom}' → '{mapped}'")
         return mapped
     
-    def parse_symptoms(self, symptoms_input: str) -> List[str]:
+    def parse_symptoms(self, symptoms_input: str, verbose: bool = False) -> List[str]:
         """Parse and clean symptom input - NORMALIZE TO LOWERCASE AND MAP VARIATIONS"""
         if not symptoms_input:
             return ['', '', '', '', '', '']
 
         # Split by comma, clean, NORMALIZE TO LOWERCASE, and MAP to known symptoms
-        symptoms = [self.normalize_symptom(s) for s in symptoms_input.split(',')]
+        symptoms = [self.normalize_symptom(s, verbose) for s in symptoms_input.split(',')]
 
         # Pad to 6 symptoms
         while len(symptoms) < 6:
@@ -149,13 +190,15 @@ class GenderMediConnectAI:
         # Truncate to 6 symptoms
         symptoms = symptoms[:6]
 
-        logger.info(f"Parsed symptoms (normalized & mapped): {symptoms}")
+        if verbose:
+            logger.info(f"Parsed symptoms (normalized & mapped): {symptoms}")
         return symptoms
     
-    def prepare_input_data(self, age: int, symptoms: str, severity: str, gender: str) -> pd.DataFrame:
+    def prepare_input_data(self, age: int, symptoms: str, severity: str, gender: str,
+                           verbose: bool = False) -> pd.DataFrame:
         """Prepare input data for prediction - NORMALIZE ALL TEXT TO LOWERCASE"""
         # Parse symptoms (already normalized to lowercase and mapped)
-        symptom_list = self.parse_symptoms(symptoms)
+        symptom_list = self.parse_symptoms(symptoms, verbose)
 
         # Create input DataFrame - NORMALIZE severity and gender to lowercase
         input_data = {
@@ -171,10 +214,11 @@ class GenderMediConnectAI:
         }
 
         df = pd.DataFrame(input_data)
-        logger.info(f"Input DataFrame created (normalized): {df.to_dict()}")
+        if verbose:
+            logger.info(f"Input DataFrame created (normalized): {df.to_dict()}")
         return df
     
-    def encode_input(self, df: pd.DataFrame, encoders: dict, gender: str) -> pd.DataFrame:
+    def encode_input(self, df: pd.DataFrame, encoders: dict, gender: str, verbose: bool = False) -> pd.DataFrame:
         """Encode input data using gender-specific encoders"""
         df_encoded = df.copy()
         
@@ -184,7 +228,8 @@ class GenderMediConnectAI:
             encoder = encoders[col]
             try:
                 df_encoded[col] = encoder.transform(df_encoded[col].astype(str))
-                logger.info(f"✅ Encoded {col}: {df[col].iloc[0]} -> {df_encoded[col].iloc[0]}")
+                if verbose:
+                    logger.info(f"✅ Encoded {col}: {df[col].iloc[0]} -> {df_encoded[col].iloc[0]}")
             except ValueError as e:
                 logger.warning(f"⚠️  Unknown symptom in {col}: {df[col].iloc[0]}, using empty string")
                 df_encoded[col] = encoder.transform([''])
@@ -192,7 +237,8 @@ class GenderMediConnectAI:
         # Encode severity
         try:
             df_encoded['severity'] = encoders['severity'].transform(df_encoded['severity'])
-            logger.info(f"✅ Encoded severity: {df['severity'].iloc[0]} -> {df_encoded['severity'].iloc[0]}")
+            if verbose:
+                logger.info(f"✅ Encoded severity: {df['severity'].iloc[0]} -> {df_encoded['severity'].iloc[0]}")
         except ValueError:
             logger.warning(f"⚠️ Unknown severity: {df['severity'].iloc[0]}, using default")
             df_encoded['severity'] = [0]
@@ -200,16 +246,27 @@ class GenderMediConnectAI:
         # Encode gender_specific
         try:
             df_encoded['gender_specific'] = encoders['gender_specific'].transform(df_encoded['gender_specific'])
-            logger.info(f"✅ Encoded gender: {df['gender_specific'].iloc[0]} -> {df_encoded['gender_specific'].iloc[0]}")
+            if verbose:
+                logger.info(f"✅ Encoded gender: {df['gender_specific'].iloc[0]} -> {df_encoded['gender_specific'].iloc[0]}")
         except ValueError:
             logger.warning(f"⚠️ Unknown gender: {df['gender_specific'].iloc[0]}, using default")
             df_encoded['gender_specific'] = [0]
         
-        logger.info(f"Final encoded data for {gender}: {df_encoded.to_dict()}")
+        if verbose:
+            logger.info(f"Final encoded data for {gender}: {df_encoded.to_dict()}")
         return df_encoded
     
-    def predict_disease(self, age: int, symptoms: str, severity: str, gender: str) -> Dict[str, Any]:
-        """Make disease prediction with gender-specific model"""
+    def predict_disease(self, age: int, symptoms: str, severity: str, gender: str,
+                        verbose: Optional[bool] = None) -> Dict[str, Any]:
+        """Make disease prediction with gender-specific model
+        
+        Stage timings (parse, features, inference, response) are recorded in
+        service_metrics.stage_metrics; per-request INFO logs are sampled
+        (VERBOSE_LOG_SAMPLE_RATE) unless verbose is given.
+        """
+        if verbose is None:
+            verbose = sample_verbose()
+        
         try:
             # Validate gender
             gender_lower = gender.lower()
@@ -222,36 +279,52 @@ class GenderMediConnectAI:
                 encoders = self.male_encoders
                 disease_classes = self.male_disease_classes
                 model_info = self.male_model_info
-                logger.info(f"🔵 Using MALE model for prediction")
+                if verbose:
+                    logger.info(f"🔵 Using MALE model for prediction")
             else:  # female
                 model = self.female_model
                 encoders = self.female_encoders
                 disease_classes = self.female_disease_classes
                 model_info = self.female_model_info
-                logger.info(f"🔴 Using FEMALE model for prediction")
+                if verbose:
+                    logger.info(f"🔴 Using FEMALE model for prediction")
             
             # Prepare input data with correct gender
-            input_df = self.prepare_input_data(age, symptoms, severity, gender)
-            encoded_df = self.encode_input(input_df, encoders, gender)
+            stage_start = time.perf_counter()
+            input_df = self.prepare_input_data(age, symptoms, severity, gender, verbose)
+            stage_metrics.observe(gender_lower, 'parse', time.perf_counter() - stage_start)
+            
+            stage_start = time.perf_counter()
+            encoded_df = self.encode_input(input_df, encoders, gender, verbose)
+            stage_metrics.observe(gender_lower, 'features', time.perf_counter() - stage_start)
             
             # Make prediction using gender-specific model
-            prediction = model.predict(encoded_df)[0]
-            probabilities = model.predict_proba(encoded_df)[0]
+            stage_start = time.perf_counter()
+            engine = self.compiled_forests.get(gender_lower)
+            if engine is not None:
+                predictions, probabilities = engine.predict_with_proba(encoded_df.to_numpy(dtype=np.float32))
+                prediction, probabilities = predictions[0], probabilities[0]
+            else:
+                prediction = model.predict(encoded_df)[0]
+                probabilities = model.predict_proba(encoded_df)[0]
+            stage_metrics.observe(gender_lower, 'inference', time.perf_counter() - stage_start)
+            
+            stage_start = time.perf_counter()
             
             # Get predicted disease
             predicted_disease = disease_classes[prediction]
             confidence = probabilities[prediction]
             
-            logger.info(f"🎯 {gender} model prediction: {predicted_disease}")
-            logger.info(f"🎯 Confidence: {confidence:.3f} ({confidence*100:.1f}%)")
-            
             # Get top 10 predictions for debugging
             top_10_indices = np.argsort(probabilities)[-10:][::-1]
-            logger.info(f"=== TOP 10 PREDICTIONS ({gender.upper()} MODEL) ===")
-            for i, idx in enumerate(top_10_indices):
-                disease = disease_classes[idx]
-                conf = probabilities[idx]
-                logger.info(f"{i+1}. {disease}: {conf:.4f} ({conf*100:.2f}%)")
+            if verbose:
+                logger.info(f"🎯 {gender} model prediction: {predicted_disease}")
+                logger.info(f"🎯 Confidence: {confidence:.3f} ({confidence*100:.1f}%)")
+                logger.info(f"=== TOP 10 PREDICTIONS ({gender.upper()} MODEL) ===")
+                for i, idx in enumerate(top_10_indices):
+                    disease = disease_classes[idx]
+                    conf = probabilities[idx]
+                    logger.info(f"{i+1}. {disease}: {conf:.4f} ({conf*100:.2f}%)")
             
             # Get top 5 predictions for response
             possible_conditions = []
@@ -286,6 +359,7 @@ class GenderMediConnectAI:
                 'disclaimer': f"This is an AI-generated analysis using a {gender}-specific model based on symptoms. Please consult a healthcare professional for proper medical evaluation and treatment.",
                 'model_info': f"{gender} model - {model_info['total_diseases']} diseases, {model_info['total_symptoms']} symptoms"
             }
+            stage_metrics.observe(gender_lower, 'response', time.perf_counter() - stage_start)
             
             return response
             
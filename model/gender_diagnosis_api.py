@@ -3,11 +3,20 @@
 Gender-Specific Diagnosis API for MediConnect
 Uses separate male and female models to eliminate gender bias
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import hmac
 import logging
+import os
+import threading
+import time
 import traceback
-from gender_ai_service_embedding import EmbeddingMediConnectAI
+import pandas as pd
+from gender_ai_service_embedding import EmbeddingMediConnectAI, embedding_cache, model_paths, model_version
+from micro_batcher import MicroBatchDispatcher
+from model_reloader import ModelReloader
+from service_metrics import (render_prometheus_gauges, render_prometheus_histogram,
+                             sample_verbose, stage_metrics)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,71 +29,265 @@ CORS(app)
 # Global AI instance
 ai_service = None
 
-def initialize_gender_ai():
-    """Initialize the embedding-based gender-specific AI service"""
+# Upper bound on cases accepted by /ai/diagnose/batch
+MAX_BATCH_SIZE = 4096
+
+# Micro-batching for /ai/diagnose: concurrent requests arriving within the
+# window are scored together (0 disables; see micro_batcher.py)
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 0))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+DIAGNOSIS_TIMEOUT_SECONDS = 30
+
+# Dispatcher instance (created once the service is ready, if enabled)
+dispatcher = None
+
+# Directory holding the embedding model artifacts; a new version can be loaded
+# without restarting via POST /ai/admin/reload or by setting MODEL_WATCH_SECONDS
+MODEL_DIR = os.environ.get('MODEL_DIR', '.')
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', 0))
+
+# Token required by /ai/admin/* (sent as X-Admin-Token); when unset, admin
+# endpoints only accept requests from the local machine
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Hot reloader (created once the first models are loaded)
+reloader = None
+
+# Retry-After hint (seconds) for requests that arrive before the models are ready
+READINESS_RETRY_AFTER_SECONDS = 5
+
+# Startup state reported by /ai/health
+# readiness: starting -> loading -> warming_up -> ready (or failed)
+service_state = {
+    'readiness': 'starting',
+    'started_at': time.time(),
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'error': None
+}
+
+def load_service(model_dir: str) -> EmbeddingMediConnectAI:
+    """Load the gender models found in model_dir (the shared encoder is reused)"""
+    return EmbeddingMediConnectAI(**model_paths(model_dir))
+
+def model_fingerprint(model_dir: str) -> str:
+    """Version the files in model_dir would load as"""
+    return model_version(list(model_paths(model_dir).values()))
+
+def swap_service(service):
+    """Publish a new service and return the previous one
+
+    A single reference assignment: each request reads ai_service once and
+    keeps using that service, so in-flight requests finish on the old models.
+    """
     global ai_service
+    previous, ai_service = ai_service, service
+    return previous
+
+def predict_batch_current(cases):
+    """Score a micro-batch on the service that is current when the batch starts"""
+    return ai_service.predict_batch(cases)
+
+def start_dispatcher():
+    """Start the micro-batching dispatcher if enabled
+
+    Its worker thread does not survive fork(), so preforked workers call this
+    themselves after forking (see serve_prefork.py).
+    """
+    global dispatcher
+    if MICRO_BATCH_WINDOW_MS > 0:
+        dispatcher = MicroBatchDispatcher(predict_batch_current, MICRO_BATCH_WINDOW_MS, MICRO_BATCH_MAX_SIZE)
+
+def start_model_watcher():
+    """Start watching MODEL_DIR for new models if enabled (preforked workers each run one)"""
+    if MODEL_WATCH_SECONDS > 0 and reloader is not None:
+        reloader.watch(MODEL_WATCH_SECONDS)
+
+def initialize_gender_ai(start_threads=True):
+    """Initialize the embedding-based gender-specific AI service and warm it up
+
+    With start_threads=False the dispatcher and model watcher are left to
+    the caller (preforked workers start their own after fork()).
+    """
+    global reloader
     try:
-        ai_service = EmbeddingMediConnectAI()
-        logger.info("OK - Embedding-based AI service initialized successfully")
+        service_state['readiness'] = 'loading'
+        load_start = time.perf_counter()
+        service = load_service(MODEL_DIR)
+        service_state['load_seconds'] = round(time.perf_counter() - load_start, 3)
+        logger.info(f"OK - Embedding-based AI service initialized in {service_state['load_seconds']}s")
+
+        service_state['readiness'] = 'warming_up'
+        warmup = service.warm_up()
+        service_state['warmup_seconds'] = round(warmup['seconds'], 3)
+
+        swap_service(service)
+        reloader = ModelReloader(load_service, swap_service, model_fingerprint, MODEL_DIR)
+        reloader.record_initial(service, MODEL_DIR, service_state['load_seconds'], service_state['warmup_seconds'])
+
+        if start_threads:
+            start_dispatcher()
+            start_model_watcher()
+
+        service_state['readiness'] = 'ready'
+        logger.info("OK - Embedding-based AI service ready")
         return True
     except Exception as e:
+        service_state['readiness'] = 'failed'
+        service_state['error'] = str(e)
         logger.error(f"ERROR - Failed to initialize embedding-based AI service: {e}")
         return False
 
+def start_background_initialization():
+    """Load and warm up the models in a background thread so the API can bind immediately"""
+    loader = threading.Thread(target=initialize_gender_ai, name='model-loader', daemon=True)
+    loader.start()
+    return loader
+
+def is_ready():
+    """True once the models are loaded and warmed up"""
+    return service_state['readiness'] == 'ready' and ai_service is not None
+
+def not_ready_payload():
+    """Body of the 503 returned before readiness"""
+    if service_state['readiness'] == 'failed':
+        error = f"AI service failed to load: {service_state['error']}"
+    else:
+        error = f"AI service is starting ({service_state['readiness']}), please retry"
+
+    return {
+        'success': False,
+        'error': error,
+        'readiness': service_state['readiness']
+    }
+
+def not_ready_response():
+    """Fast 503 with Retry-After for requests that arrive before readiness"""
+    response = jsonify(not_ready_payload())
+    response.status_code = 503
+    response.headers['Retry-After'] = str(READINESS_RETRY_AFTER_SECONDS)
+    return response
+
+def parse_diagnosis_request(data, verbose=False):
+    """Apply defaults to a /ai/diagnose body and validate it
+
+    Returns (case, None) for a valid request or (None, error message).
+    """
+    if not data:
+        return None, 'No data provided'
+
+    # Extract parameters
+    age = data.get('age', 30)
+    symptoms = data.get('symptoms', '')
+    severity = data.get('severity', 'Medium')
+    gender = data.get('gender', 'Male')
+    user_id = data.get('user_id', 'unknown')
+
+    if verbose:
+        logger.info(f"🔍 Diagnosis request from user {user_id}")
+        logger.info(f"🔍 Age: {age}, Gender: {gender}, Severity: {severity}")
+        logger.info(f"🔍 Symptoms: {symptoms}")
+
+    # Validate inputs
+    if not symptoms or not symptoms.strip():
+        return None, 'Symptoms are required'
+
+    if gender.lower() not in ['male', 'female']:
+        return None, 'Gender must be either Male or Female'
+
+    return {
+        'age': int(age),
+        'symptoms': symptoms,
+        'severity': severity,
+        'gender': gender
+    }, None
+
+def diagnosis_error_payload(e: Exception):
+    """Body of the 500 returned when a diagnosis raises"""
+    return {
+        'success': False,
+        'error': f'Internal server error: {str(e)}',
+        'diagnosis': {
+            'primary_diagnosis': 'Technical error occurred during diagnosis',
+            'top_disease': 'Unknown',
+            'confidence': '0%',
+            'urgency': 'Unknown',
+            'possible_conditions': [],
+            'recommendations': [
+                'Please try again later',
+                'Consult a healthcare professional for proper diagnosis'
+            ],
+            'disclaimer': 'AI diagnosis service encountered a technical error.'
+        }
+    }
+
+def parse_batch_request(data):
+    """Validate a /ai/diagnose/batch body and apply the single-case defaults to each case
+
+    Returns (cases, None) for a valid request or (None, error message).
+    """
+    if not data or not isinstance(data.get('cases'), list) or not data['cases']:
+        return None, 'A non-empty list of cases is required'
+
+    cases = data['cases']
+    if len(cases) > MAX_BATCH_SIZE:
+        return None, f'Batch too large: {len(cases)} cases (maximum {MAX_BATCH_SIZE})'
+
+    normalized_cases = []
+    for case in cases:
+        case = case if isinstance(case, dict) else {}
+        normalized_cases.append({
+            'age': case.get('age', 30),
+            'symptoms': case.get('symptoms', ''),
+            'severity': case.get('severity', 'Medium'),
+            'gender': case.get('gender', 'Male')
+        })
+    return normalized_cases, None
+
+def batch_response_payload(results):
+    """Body of a successful /ai/diagnose/batch response"""
+    return {
+        'success': True,
+        'total': len(results),
+        'succeeded': sum(1 for result in results if result['success']),
+        'results': results
+    }
+
 @app.route('/ai/diagnose', methods=['POST'])
 def diagnose():
     """Gender-specific AI diagnosis endpoint"""
+    if not is_ready():
+        return not_ready_response()
+
+    # One read of the current service; a concurrent model swap does not affect this request
+    service = ai_service
+    request_start = time.perf_counter()
+    verbose = sample_verbose()
+
     try:
-        # Get request data
-        data = request.json
-        if not data:
+        # Get and validate request data
+        case, error = parse_diagnosis_request(request.json, verbose)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'No data provided'
+                'error': error
             }), 400
-        
-        # Extract parameters
-        age = data.get('age', 30)
-        symptoms = data.get('symptoms', '')
-        severity = data.get('severity', 'Medium')
-        gender = data.get('gender', 'Male')
-        user_id = data.get('user_id', 'unknown')
-        
-        logger.info(f"🔍 Diagnosis request from user {user_id}")
-        logger.info(f"🔍 Age: {age}, Gender: {gender}, Severity: {severity}")
-        logger.info(f"🔍 Symptoms: {symptoms}")
-        
-        # Validate inputs
-        if not symptoms or not symptoms.strip():
-            return jsonify({
-                'success': False,
-                'error': 'Symptoms are required'
-            }), 400
-        
-        if gender.lower() not in ['male', 'female']:
-            return jsonify({
-                'success': False,
-                'error': 'Gender must be either Male or Female'
-            }), 400
-        
-        if not ai_service:
-            logger.error("❌ AI service not initialized")
-            return jsonify({
-                'success': False,
-                'error': 'AI service not available'
-            }), 500
-        
+
         # Make prediction using gender-specific model
-        result = ai_service.predict_disease(
-            age=int(age),
-            symptoms=symptoms,
-            severity=severity,
-            gender=gender
-        )
+        gender_lower = case['gender'].lower()
+        stage_metrics.observe(gender_lower, 'parse', time.perf_counter() - request_start)
+
+        if dispatcher:
+            result = dispatcher.predict(case, timeout=DIAGNOSIS_TIMEOUT_SECONDS)
+        else:
+            result = service.predict_disease(**case, verbose=verbose)
         
         if result['success']:
-            logger.info(f"OK - Diagnosis completed: {result['diagnosis']['top_disease']} ({result['diagnosis']['confidence']})")
-            return jsonify(result)
+            if verbose:
+                logger.info(f"OK - Diagnosis completed: {result['diagnosis']['top_disease']} ({result['diagnosis']['confidence']})")
+            response = jsonify(result)
+            stage_metrics.observe(gender_lower, 'total', time.perf_counter() - request_start)
+            return response
         else:
             logger.error(f"ERROR - Diagnosis failed: {result.get('error', 'Unknown error')}")
             return jsonify({
@@ -96,48 +299,97 @@ def diagnose():
     except Exception as e:
         logger.error(f"❌ API error: {e}")
         traceback.print_exc()
-        
+
+        return jsonify(diagnosis_error_payload(e)), 500
+
+@app.route('/ai/diagnose/batch', methods=['POST'])
+def diagnose_batch():
+    """Batch diagnosis endpoint - results are returned in input order"""
+    if not is_ready():
+        return not_ready_response()
+
+    service = ai_service
+    request_start = time.perf_counter()
+    verbose = sample_verbose()
+
+    try:
+        normalized_cases, error = parse_batch_request(request.json)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        stage_metrics.observe('all', 'parse', time.perf_counter() - request_start, 'batch')
+        if verbose:
+            logger.info(f"🔍 Batch diagnosis request with {len(normalized_cases)} cases")
+
+        payload = batch_response_payload(service.predict_batch(normalized_cases, verbose=verbose))
+        if verbose:
+            logger.info(f"OK - Batch diagnosis completed: {payload['succeeded']}/{payload['total']} succeeded")
+
+        response = jsonify(payload)
+        stage_metrics.observe('all', 'total', time.perf_counter() - request_start, 'batch')
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ Batch API error: {e}")
+        traceback.print_exc()
+
         return jsonify({
             'success': False,
-            'error': f'Internal server error: {str(e)}',
-            'diagnosis': {
-                'primary_diagnosis': 'Technical error occurred during diagnosis',
-                'top_disease': 'Unknown',
-                'confidence': '0%',
-                'urgency': 'Unknown',
-                'possible_conditions': [],
-                'recommendations': [
-                    'Please try again later',
-                    'Consult a healthcare professional for proper diagnosis'
-                ],
-                'disclaimer': 'AI diagnosis service encountered a technical error.'
-            }
+            'error': f'Internal server error: {str(e)}'
         }), 500
 
+def health_payload():
+    """Body of /ai/health"""
+    service = ai_service
+    ready = is_ready()
+    if ready:
+        status = "healthy"
+    elif service_state['readiness'] == 'failed':
+        status = "unhealthy"
+    else:
+        status = "starting"
+    models_status = "active" if ready else "inactive"
+
+    male_diseases = len(service.male_disease_classes) if ready else 0
+    female_diseases = len(service.female_disease_classes) if ready else 0
+
+    return {
+        'status': status,
+        'liveness': 'alive',
+        'readiness': service_state['readiness'],
+        'startup': {
+            'uptime_seconds': round(time.time() - service_state['started_at'], 3),
+            'load_seconds': service_state['load_seconds'],
+            'warmup_seconds': service_state['warmup_seconds'],
+            'error': service_state['error']
+        },
+        'timestamp': pd.Timestamp.now().isoformat(),
+        'models': {
+            'male_model': models_status,
+            'female_model': models_status,
+            'male_diseases': male_diseases,
+            'female_diseases': female_diseases,
+            'model_type': 'Embedding-based Gender-Specific (all-MiniLM-L6-v2 + RandomForest)',
+            'encoder_backend': service.encoder_backend if ready else None,
+            'model_version': service.model_version if ready else None,
+            'reloading': reloader.is_loading() if reloader else False
+        },
+        'embedding_cache': embedding_cache.stats(),
+        'result_cache': service.result_cache.stats() if ready else None,
+        'micro_batching': dispatcher.stats() if dispatcher else {'enabled': False},
+        'service': 'Gender-Specific AI Diagnosis API',
+        'version': '2.0'
+    }
+
 @app.route('/ai/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
-        status = "healthy" if ai_service else "unhealthy"
-        models_status = "active" if ai_service else "inactive"
-        
-        male_diseases = len(ai_service.male_disease_classes) if ai_service else 0
-        female_diseases = len(ai_service.female_disease_classes) if ai_service else 0
-        
-        return jsonify({
-            'status': status,
-            'timestamp': pd.Timestamp.now().isoformat(),
-            'models': {
-                'male_model': models_status,
-                'female_model': models_status,
-                'male_diseases': male_diseases,
-                'female_diseases': female_diseases,
-                'model_type': 'Embedding-based Gender-Specific (all-MiniLM-L6-v2 + RandomForest)'
-            },
-            'service': 'Gender-Specific AI Diagnosis API',
-            'version': '2.0'
-        })
-        
+        return jsonify(health_payload())
+
     except Exception as e:
         logger.error(f"❌ Health check error: {e}")
         return jsonify({
@@ -145,51 +397,140 @@ def health_check():
             'error': str(e)
         }), 500
 
+@app.route('/ai/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe - the process is up and serving HTTP"""
+    return jsonify({'liveness': 'alive'})
+
+@app.route('/ai/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe - 200 once models are loaded and warmed up, 503 before"""
+    if not is_ready():
+        return not_ready_response()
+    return jsonify({'readiness': 'ready'})
+
+@app.route('/ai/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text metrics: per-stage latency histograms, cache and batching counters
+
+    Served without readiness gating. Under serve_prefork.py each worker
+    reports its own process's metrics.
+    """
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
+def metrics_text() -> str:
+    """Prometheus text for /ai/metrics"""
+    cache = embedding_cache.stats()
+    results = ai_service.result_cache.stats() if is_ready() else None
+    sections = [
+        stage_metrics.render_prometheus(),
+        render_prometheus_gauges('mediconnect_embedding_cache', 'Symptom embedding LRU cache counters', {
+            kind: cache[kind] for kind in ['entries', 'bytes', 'hits', 'misses', 'evictions']
+        }),
+        render_prometheus_gauges('mediconnect_result_cache', 'Diagnosis result cache counters', {
+            kind: results[kind] for kind in ['entries', 'bytes', 'hits', 'misses', 'evictions', 'expirations']
+        }) if results else '',
+        render_prometheus_gauges('mediconnect_ready', 'Whether models are loaded and warmed up', {
+            'ready': int(is_ready())
+        })
+    ]
+    if dispatcher:
+        batching = dispatcher.stats()
+        sections.append(render_prometheus_gauges('mediconnect_micro_batching', 'Micro-batch dispatcher counters', {
+            kind: batching[kind] for kind in ['batches', 'requests', 'pending']
+        }))
+        sections.append(render_prometheus_histogram('mediconnect_micro_batch_size', 'Requests per micro-batch',
+                                                    batching['batch_size']))
+        sections.append(render_prometheus_histogram('mediconnect_micro_batch_queue_depth',
+                                                    'Requests still queued when a micro-batch closes',
+                                                    batching['queue_depth']))
+
+    return ''.join(sections)
+
+def info_payload():
+    """Body of /ai/info"""
+    service = ai_service
+    return {
+        'male_model': service.male_model_info,
+        'female_model': service.female_model_info,
+        'model_version': service.model_version,
+        'model_dir': os.path.abspath(reloader.model_dir),
+        'reloading': reloader.is_loading(),
+        'versions': reloader.versions(),
+        'service': 'Gender-Specific AI Diagnosis',
+        'description': 'Separate male and female models to eliminate gender bias'
+    }
+
 @app.route('/ai/info', methods=['GET'])
 def model_info():
     """Get model information"""
+    if not is_ready():
+        return not_ready_response()
+
     try:
-        if not ai_service:
-            return jsonify({
-                'error': 'AI service not initialized'
-            }), 500
-        
-        return jsonify({
-            'male_model': ai_service.male_model_info,
-            'female_model': ai_service.female_model_info,
-            'service': 'Gender-Specific AI Diagnosis',
-            'description': 'Separate male and female models to eliminate gender bias'
-        })
-        
+        return jsonify(info_payload())
+
     except Exception as e:
         logger.error(f"❌ Model info error: {e}")
         return jsonify({
             'error': str(e)
         }), 500
 
+def admin_authorized(token: str = None, remote_addr: str = None) -> bool:
+    """X-Admin-Token must match ADMIN_TOKEN; without a token only local callers are allowed
+
+    Defaults to the current Flask request's header and address.
+    """
+    if token is None and remote_addr is None:
+        token, remote_addr = request.headers.get('X-Admin-Token', ''), request.remote_addr
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(token or '', ADMIN_TOKEN)
+    return remote_addr in ('127.0.0.1', '::1')
+
+def start_reload(data):
+    """Start a reload for a /ai/admin/reload body; returns (payload, status code)"""
+    model_dir = (data or {}).get('model_dir') or reloader.model_dir
+    if not os.path.isdir(model_dir):
+        return {'success': False, 'error': f'Model directory not found: {model_dir}'}, 400
+
+    if not reloader.reload(model_dir):
+        return {'success': False, 'error': 'A model reload is already in progress'}, 409
+
+    logger.info(f"Model reload requested for {model_dir}")
+    return {
+        'success': True,
+        'status': 'loading',
+        'model_dir': os.path.abspath(model_dir),
+        'current_version': ai_service.model_version
+    }, 202
+
+@app.route('/ai/admin/reload', methods=['POST'])
+def reload_models():
+    """Load a model version in the background and swap it in once it passes smoke predictions
+
+    Optional JSON body: {"model_dir": "path/to/version"} (default: the active
+    directory). Returns 202 immediately; progress is reported in /ai/info.
+    """
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Not authorized'}), 403
+    if not is_ready():
+        return not_ready_response()
+
+    payload, status = start_reload(request.get_json(silent=True))
+    return jsonify(payload), status
+
 if __name__ == '__main__':
     print("="*70)
     print("STARTING EMBEDDING-BASED AI DIAGNOSIS API")
     print("Using: all-MiniLM-L6-v2 + RandomForest")
     print("="*70)
 
-    # Initialize AI service
-    if initialize_gender_ai():
-        print("OK - Embedding-based AI models loaded successfully")
-        print("Male model ready (70.6% accuracy)")
-        print("Female model ready (74.1% accuracy)")
-        print("Starting API server on http://127.0.0.1:5002")
-        print("="*70)
-
-        # Import pandas for health check
-        import pandas as pd
+    # Load and warm up models in the background; diagnosis requests get a
+    # 503 with Retry-After until /ai/health reports readiness 'ready'
+    start_background_initialization()
+    print("Loading models in the background (see /ai/health for readiness)")
+    print("Starting API server on http://127.0.0.1:5002")
+    print("="*70)
 
-        # Start the Flask app
-        app.run(host='127.0.0.1', port=5002, debug=False)
-    else:
-        print("ERROR - Failed to initialize AI service")
-        print("Please ensure embedding model files exist:")
-        print("- male_medical_model_embedding.pkl")
-        print("- female_medical_model_embedding.pkl")
-        print("- And corresponding encoders/classes files")
-        exit(1)
\ No newline at end of file
+    # Start the Flask app
+    app.run(host='127.0.0.1', port=5002, debug=False)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Incremental Retraining for MediConnect
+Folds new labelled cases from a diagnosis_records JSONL export into the
+embedding-based forests without a full rebuild. Only symptom texts the
+embedding store has not seen are encoded. The original training rows come
+back from the store, and each forest grows extra trees with warm_start. The
+new trees are fitted on a sample of old and new rows, weighted toward recent
+records. The grown models are written as a new model version directory
+that the API can load with MODEL_DIR or POST /ai/admin/reload.
+
+    python incremental_training.py diagnosis_records.jsonl
+
+Each line of the export is one diagnosis_records row (user_id, symptoms,
+severity, age, gender, diagnosis, created_at). The label is the
+record's `label` or `confirmed_diagnosis` field when present, otherwise the
+top disease of the stored diagnosis. A share of the new records is held out.
+The report compares wall time and accuracy with a full retrain on the same
+rows. Writes incremental_training_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+from case_retrieval import CaseIndex, case_index_dir, normalize_rows
+from embedding_store import EmbeddingStore
+from forest_engine import CompiledForest, sidecar_dir
+from gender_ai_service_embedding import MODEL_FILES
+from symptom_encoder import EMBEDDING_MODEL_NAME, encoder_version
+from symptom_text import canonical_symptom_text
+from training_orchestrator import GENDERS, TRAINING_CORES, available_cores
+import train_embedding_models
+from train_embedding_models import ENCODER_BACKEND, embedding_model, load_gender_dataset, prepare_embedding_features
+
+REPORT_FILE = 'incremental_training_report.json'
+
+# Trees added per update
+EXTRA_TREES = int(os.environ.get('INCREMENTAL_TREES', '25'))
+# Rows drawn (without replacement) from old and new cases for the new trees
+SAMPLE_ROWS = int(os.environ.get('INCREMENTAL_SAMPLE_ROWS', '20000'))
+# A brand-new record is this many times as likely to be drawn as an original
+# training row; the boost halves every RECENCY_HALF_LIFE_DAYS, down to 1
+NEW_CASE_WEIGHT = float(os.environ.get('INCREMENTAL_NEW_CASE_WEIGHT', '4.0'))
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get('INCREMENTAL_HALF_LIFE_DAYS', '30'))
+
+def record_label(record: Dict[str, Any]) -> Optional[str]:
+    """Disease label of a diagnosis record, or None when it has none"""
+    for field in ['label', 'confirmed_diagnosis']:
+        if record.get(field):
+            return str(record[field]).strip()
+
+    diagnosis = record.get('diagnosis')
+    if isinstance(diagnosis, str):
+        try:
+            diagnosis = json.loads(diagnosis)
+        except ValueError:
+            return diagnosis.strip() or None
+    if isinstance(diagnosis, dict):
+        if diagnosis.get('top_disease'):
+            return str(diagnosis['top_disease']).strip()
+        primary = str(diagnosis.get('primary_diagnosis') or '')
+        return primary.split(':', 1)[-1].strip() or None
+    return None
+
+def load_records(path: str) -> pd.DataFrame:
+    """diagnosis_records export as one row per usable case
+
+    Columns: gender, age, severity, symptom_text, disease, created_at.
+    Lines that are not JSON, or lack a gender, age or label, are skipped.
+    """
+    cases = []
+    skipped = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                gender = str(record.get('gender') or '').lower().strip()
+                label = record_label(record)
+                if gender not in ['male', 'female'] or not label:
+                    raise ValueError("no gender or label")
+                cases.append({
+                    'gender': gender,
+                    'age': int(record['age']),
+                    'severity': str(record.get('severity') or 'medium').lower().strip(),
+                    'symptom_text': canonical_symptom_text(record.get('symptoms') or ''),
+                    'disease': label,
+                    'created_at': record.get('created_at')
+                })
+            except (ValueError, TypeError, KeyError):
+                skipped += 1
+
+    df = pd.DataFrame(cases, columns=['gender', 'age', 'severity', 'symptom_text', 'disease', 'created_at'])
+    df['created_at'] = pd.to_datetime(df['created_at'], utc=True, errors='coerce')
+    print(f"Loaded {len(df)} usable records from {path} ({skipped} skipped)")
+    return df
+
+def recency_weights(created_at: pd.Series, now: pd.Timestamp) -> np.ndarray:
+    """Sampling weight of each new record relative to an original training row
+
+    Records without a timestamp count as brand new.
+    """
+    age_days = ((now - created_at).dt.total_seconds() / 86400.0).fillna(0.0).clip(lower=0.0).to_numpy()
+    return np.maximum(1.0, NEW_CASE_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS))
+
+def _encode_gender(encoders: Dict[str, Any], gender_lower: str) -> int:
+    """Gender code as the service computes it (0 for a value the encoder never saw)"""
+    try:
+        return int(encoders['gender'].transform([gender_lower])[0])
+    except ValueError:
+        return 0
+
+def encode_records(records: pd.DataFrame, encoders: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """387-feature rows for new records, encoding only texts missing from the embedding store"""
+    texts = records['symptom_text'].tolist()
+    if train_embedding_models.EMBEDDING_STORE_DIR:
+        embeddings, stats = EmbeddingStore(train_embedding_models.EMBEDDING_STORE_DIR).encode(
+            embedding_model, texts, EMBEDDING_MODEL_NAME, encoder_version(ENCODER_BACKEND), batch_size=32)
+    else:
+        start = time.perf_counter()
+        embeddings = embedding_model.encode(texts, batch_size=32)
+        stats = {'rows': len(texts), 'cache_misses': len(texts), 'encode_seconds': round(time.perf_counter() - start, 3)}
+
+    # Unknown severities fall back to medium, as at serving time
+    severities = records['severity'].where(records['severity'].isin(encoders['severity'].classes_), 'medium')
+    X = np.empty((len(records), embeddings.shape[1] + 3), dtype=np.float32)
+    X[:, 0] = records['age'].to_numpy()
+    X[:, 1:embeddings.shape[1] + 1] = embeddings
+    X[:, -2] = encoders['severity'].transform(severities)
+    X[:, -1] = _encode_gender(encoders, records['gender'].iloc[0]) if len(records) else 0
+    return X, stats
+
+def recency_weighted_sample(weights: np.ndarray, y: np.ndarray, n_classes: int, n_rows: int,
+                            rng: np.random.RandomState) -> np.ndarray:
+    """Row indices drawn without replacement with probability proportional to weights
+
+    One row of any class the draw missed is added, so the new trees see
+    every class and the forest's classes_ stay the same.
+    """
+    n_rows = min(n_rows, len(weights))
+    rows = rng.choice(len(weights), size=n_rows, replace=False, p=weights / weights.sum())
+    missing = np.setdiff1d(np.arange(n_classes), y[rows])
+    extra = [rng.choice(np.flatnonzero(y == label)) for label in missing]
+    return np.sort(np.concatenate([rows, np.asarray(extra, dtype=rows.dtype)]))
+
+def grow_forest(model, X: np.ndarray, y: np.ndarray, extra_trees: int, n_jobs: int):
+    """Add extra_trees trees fitted on (X, y) to a fitted forest, in place"""
+    n_estimators = model.n_estimators
+    model.set_params(warm_start=True, n_estimators=n_estimators + extra_trees, n_jobs=n_jobs)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+def extend_case_index(index: CaseIndex, X_new: np.ndarray, y_new: np.ndarray, texts: np.ndarray,
+                      severity_encoder) -> CaseIndex:
+    """Case index with the new training records appended"""
+    severity_names = list(index.severity_names)
+    for name in severity_encoder.classes_:
+        if name not in severity_names:
+            severity_names.append(name)
+    severity_codes = [severity_names.index(name) for name in severity_encoder.inverse_transform(X_new[:, 385].astype(int))]
+    return CaseIndex(
+        embeddings=np.vstack([np.asarray(index.embeddings), normalize_rows(X_new[:, 1:385])]),
+        labels=np.concatenate([np.asarray(index.labels), y_new.astype(np.int32)]),
+        ages=np.concatenate([np.asarray(index.ages), X_new[:, 0].astype(np.int16)]),
+        severities=np.concatenate([np.asarray(index.severities), np.asarray(severity_codes, dtype=np.int8)]),
+        symptoms=np.concatenate([np.asarray(index.symptoms), np.asarray(texts, dtype=str)]),
+        classes=np.asarray(index.classes_),
+        severity_names=severity_names,
+        vote_k=index.vote_k
+    )
+
+def _evaluate(model, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    if len(y) == 0:
+        return {'rows': 0, 'accuracy': None, 'macro_f1': None}
+    predictions = model.predict(X)
+    return {'rows': int(len(y)), 'accuracy': float(accuracy_score(y, predictions)),
+            'macro_f1': float(f1_score(y, predictions, average='macro'))}
+
+def copy_artifacts(source_dir: str, output_dir: str, gender_lower: str):
+    """Copy one gender's artifacts (with forest sidecar arrays) into the new version directory"""
+    for arg, filename in MODEL_FILES.items():
+        if not arg.startswith(f'{gender_lower}_'):
+            continue
+        source = os.path.join(source_dir, filename)
+        paths = [source, sidecar_dir(source)] if arg.endswith('_model_path') else [source]
+        for path in paths:
+            target = os.path.join(output_dir, os.path.basename(path))
+            if os.path.isdir(path):
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            elif os.path.exists(path):
+                shutil.copy2(path, target)
+
+def update_gender(gender_name: str, records: pd.DataFrame, source_dir: str, output_dir: str,
+                  options, now: pd.Timestamp) -> Dict[str, Any]:
+    """Grow one gender's forest with its new records; returns its report section"""
+    gender_lower = gender_name.lower()
+    print("\n" + "="*50)
+    print(f"UPDATING {gender_name.upper()} MODEL")
+    print("="*50)
+
+    model_path = os.path.join(source_dir, MODEL_FILES[f'{gender_lower}_model_path'])
+    model = joblib.load(model_path)
+    encoders = joblib.load(os.path.join(source_dir, MODEL_FILES[f'{gender_lower}_encoders_path']))
+    disease_classes = np.asarray(joblib.load(os.path.join(source_dir, MODEL_FILES[f'{gender_lower}_classes_path'])))
+    copy_artifacts(source_dir, output_dir, gender_lower)
+
+    # New records with a disease the model knows; new classes need a full retrain
+    known = records['disease'].isin(disease_classes)
+    if (~known).any():
+        print(f"WARNING - {int((~known).sum())} {gender_name} records have diseases the model does not know: "
+              f"{sorted(records.loc[~known, 'disease'].unique())[:10]}")
+    records = records[known].reset_index(drop=True)
+    report = {'new_records': int(len(records)), 'unknown_disease_records': int((~known).sum())}
+    if len(records) == 0:
+        print(f"No usable {gender_name} records; model copied unchanged")
+        return report
+
+    # Original training rows: features come back from the embedding store, split as train_model splits them
+    start = time.perf_counter()
+    X_old, y_old, _, store_stats = prepare_embedding_features(load_gender_dataset(gender_name), gender_name)
+    y_old = np.searchsorted(disease_classes, y_old.to_numpy())
+    old_train, old_test = train_test_split(np.arange(len(y_old)), test_size=0.2, random_state=42, stratify=y_old)
+    old_features_seconds = time.perf_counter() - start
+
+    # Incremental update: encode new rows, draw a recency-weighted sample, grow the forest
+    rng = np.random.RandomState(options.seed)
+    new_train, new_holdout = (train_test_split(np.arange(len(records)), test_size=options.holdout, random_state=options.seed)
+                              if options.holdout > 0 and len(records) > 1 else (np.arange(len(records)), np.arange(0)))
+    start = time.perf_counter()
+    X_new, encode_stats = encode_records(records, encoders)
+    y_new = np.searchsorted(disease_classes, records['disease'].to_numpy())
+    encode_seconds = time.perf_counter() - start
+
+    X_pool = np.vstack([X_old[old_train], X_new[new_train]])
+    y_pool = np.concatenate([y_old[old_train], y_new[new_train]])
+    weights = np.concatenate([np.ones(len(old_train)), recency_weights(records['created_at'].iloc[new_train], now)])
+    sample = recency_weighted_sample(weights, y_pool, len(disease_classes), options.sample_rows, rng)
+    sampled_new = int((sample >= len(old_train)).sum())
+
+    previous = _evaluate(model, X_old[old_test], y_old[old_test]), _evaluate(model, X_new[new_holdout], y_new[new_holdout])
+    full_model = clone(model).set_params(n_jobs=options.cores)
+    previous_trees, previous_n_jobs = model.n_estimators, model.n_jobs
+
+    start = time.perf_counter()
+    grow_forest(model, X_pool[sample], y_pool[sample], options.extra_trees, options.cores)
+    fit_seconds = time.perf_counter() - start
+    print(f"OK - Grew {gender_name} forest from {previous_trees} to {model.n_estimators} trees on {len(sample)} rows "
+          f"({sampled_new} new) in {fit_seconds:.1f}s")
+
+    # Save the grown forest and the extended case index into the new version
+    start = time.perf_counter()
+    out_model_path = os.path.join(output_dir, MODEL_FILES[f'{gender_lower}_model_path'])
+    model.set_params(n_jobs=previous_n_jobs)
+    joblib.dump(model, out_model_path)
+    CompiledForest.from_sklearn(model).save(sidecar_dir(out_model_path))
+    cases_dir = case_index_dir(model_path)
+    if os.path.isdir(cases_dir):
+        index = extend_case_index(CaseIndex.load(cases_dir, mmap_mode='r'), X_new[new_train], y_new[new_train],
+                                  records['symptom_text'].to_numpy()[new_train], encoders['severity'])
+        index.save(case_index_dir(out_model_path))
+    save_seconds = time.perf_counter() - start
+
+    info_path = os.path.join(output_dir, MODEL_FILES[f'{gender_lower}_info_path'])
+    with open(info_path, 'r') as f:
+        model_info = json.load(f)
+    update = {
+        'base_model_dir': os.path.abspath(source_dir),
+        'records_file': os.path.abspath(options.records),
+        'new_cases': int(len(new_train)),
+        'extra_trees': options.extra_trees,
+        'total_trees': int(model.n_estimators),
+        'sample_rows': int(len(sample)),
+        'sampled_new_cases': sampled_new,
+        'created_at': now.isoformat(),
+        'student': 'copied from the base version, not re-distilled'
+    }
+    model_info['incremental_updates'] = model_info.get('incremental_updates', []) + [update]
+    with open(info_path, 'w') as f:
+        json.dump(model_info, f, indent=2)
+
+    # Saving is left out of both totals: a full retrain writes a version too
+    incremental_seconds = old_features_seconds + encode_seconds + fit_seconds
+    report['incremental'] = {
+        **update,
+        'encode': encode_stats,
+        'seconds': {'old_features': round(old_features_seconds, 2), 'encode_new': round(encode_seconds, 2),
+                    'fit': round(fit_seconds, 2), 'save': round(save_seconds, 2), 'total': round(incremental_seconds, 2)},
+        'original_test': _evaluate(model, X_old[old_test], y_old[old_test]),
+        'new_holdout': _evaluate(model, X_new[new_holdout], y_new[new_holdout])
+    }
+    report['previous'] = {'trees': previous_trees, 'original_test': previous[0], 'new_holdout': previous[1]}
+
+    # Full retrain of the original configuration on every old and new training row
+    if options.full_retrain:
+        start = time.perf_counter()
+        full_model.fit(X_pool, y_pool)
+        full_fit_seconds = time.perf_counter() - start
+        report['full_retrain'] = {
+            'trees': int(full_model.n_estimators),
+            'rows': int(len(y_pool)),
+            'old_features_store_stats': store_stats,
+            'seconds': {'old_features': round(old_features_seconds, 2), 'encode_new': round(encode_seconds, 2),
+                        'fit': round(full_fit_seconds, 2),
+                        'total': round(old_features_seconds + encode_seconds + full_fit_seconds, 2)},
+            'original_test': _evaluate(full_model, X_old[old_test], y_old[old_test]),
+            'new_holdout': _evaluate(full_model, X_new[new_holdout], y_new[new_holdout])
+        }
+
+    for name in ['previous', 'incremental', 'full_retrain']:
+        if name in report:
+            row = report[name]
+            seconds = f", {row['seconds']['total']:.1f}s" if 'seconds' in row else ''
+            holdout = row['new_holdout']['accuracy']
+            print(f"  {name:<13} original test {row['original_test']['accuracy']:.1%}, new holdout "
+                  f"{'-' if holdout is None else f'{holdout:.1%}'}{seconds}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Grow the embedding forests with new diagnosis records')
+    parser.add_argument('records', help='JSONL export of diagnosis_records')
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', '.'), help='Version to update')
+    parser.add_argument('--output-dir', help='New version directory (default model_versions/<UTC timestamp>)')
+    parser.add_argument('--extra-trees', type=int, default=EXTRA_TREES)
+    parser.add_argument('--sample-rows', type=int, default=SAMPLE_ROWS)
+    parser.add_argument('--holdout', type=float, default=0.2, help='Share of new records held out for evaluation')
+    parser.add_argument('--no-full-retrain', dest='full_retrain', action='store_false',
+                        help='Skip the full-retrain comparison')
+    parser.add_argument('--cores', type=int, default=TRAINING_CORES or available_cores())
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+
+    print("="*70)
+    print("INCREMENTAL MODEL UPDATE FROM DIAGNOSIS RECORDS")
+    print("="*70)
+
+    now = pd.Timestamp(datetime.now(timezone.utc))
+    output_dir = options.output_dir or os.path.join('model_versions', now.strftime('%Y%m%d-%H%M%S'))
+    if os.path.abspath(output_dir) == os.path.abspath(options.model_dir):
+        raise SystemExit("ERROR - The new version must not overwrite the version it is built from")
+    os.makedirs(output_dir, exist_ok=True)
+
+    records = load_records(options.records)
+    report = {'records_file': options.records, 'base_model_dir': options.model_dir, 'output_dir': output_dir,
+              'extra_trees': options.extra_trees, 'sample_rows': options.sample_rows,
+              'new_case_weight': NEW_CASE_WEIGHT, 'recency_half_life_days': RECENCY_HALF_LIFE_DAYS}
+    for gender_name in GENDERS:
+        report[gender_name.lower()] = update_gender(
+            gender_name, records[records['gender'] == gender_name.lower()].reset_index(drop=True),
+            options.model_dir, output_dir, options, now)
+
+    with open(REPORT_FILE, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {REPORT_FILE}")
+    print(f"OK - New model version in {output_dir}/ (serve with MODEL_DIR={output_dir} "
+          f"or POST /ai/admin/reload {{\"model_dir\": \"{output_dir}\"}})")
+
+if __name__ == "__main__":
+    main()
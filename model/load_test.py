@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+End-to-End Load Test for the MediConnect Diagnosis API
+Builds a reproducible stream of /ai/diagnose requests from
+medical_training_dataset_clean.csv and DISEASE_SYMPTOM_PATTERNS with
+Zipf-like popularity (a few presentations are very common, most are rare)
+and a configurable gender mix, then drives the API either in-process through
+Flask's test client or over HTTP against a running server:
+
+  closed loop - N concurrent clients, each sending its next request when the
+                previous one returns
+  open loop   - Poisson arrivals at a fixed rate; latency is measured from
+                each request's scheduled arrival, so queueing is not hidden
+
+Reports throughput and p50/p95/p99 latency per scenario, saves the results
+as a JSON baseline and flags regressions against a previous baseline.
+
+Usage:
+  python load_test.py --concurrency 1 8 32 --rates 20 50
+  python load_test.py --url http://127.0.0.1:5002 --save-baseline load_baseline.json
+  python load_test.py --url http://127.0.0.1:5002 --baseline load_baseline.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from augment_medical_data import DISEASE_SYMPTOM_PATTERNS, generate_realistic_combination
+
+REPORT_FILE = 'load_test_report.json'
+DATASET_FILE = 'medical_training_dataset_clean.csv'
+SYMPTOM_COLUMNS = [f'symptom{i}' for i in range(1, 7)]
+
+# A scenario regresses when p99 latency rises or throughput falls by more than this fraction
+DEFAULT_TOLERANCE = 0.10
+
+def build_presentations(synthetic_per_disease: int, seed: int):
+    """Distinct presentations: every clean dataset row plus synthetic ones per pattern
+
+    Returns (male, female) lists of request bodies; gender-neutral
+    presentations appear in both.
+    """
+    presentations = {'male': [], 'female': []}
+
+    def add(gender_specific, body):
+        gender_specific = str(gender_specific).lower()
+        for gender in ('male', 'female'):
+            if gender_specific in (gender, 'both', 'any', 'nan'):
+                presentations[gender].append(dict(body, gender=gender.capitalize()))
+
+    df = pd.read_csv(DATASET_FILE)
+    for row in df.itertuples(index=False):
+        symptoms = [str(value) for value in (getattr(row, col) for col in SYMPTOM_COLUMNS) if pd.notna(value)]
+        add(row.gender_specific, {
+            'age': int(row.age),
+            'symptoms': ', '.join(symptoms),
+            'severity': str(row.severity).lower()
+        })
+
+    # generate_realistic_combination draws from the global random module
+    random.seed(seed)
+    for disease, pattern in DISEASE_SYMPTOM_PATTERNS.items():
+        for _ in range(synthetic_per_disease):
+            row = generate_realistic_combination(disease, pattern, pattern.get('gender', 'both'))
+            add(row['gender_specific'], {
+                'age': row['age'],
+                'symptoms': ', '.join(row[col] for col in SYMPTOM_COLUMNS if row[col]),
+                'severity': row['severity']
+            })
+
+    return presentations['male'], presentations['female']
+
+def build_stream(n_requests: int, female_fraction: float, zipf_exponent: float,
+                 synthetic_per_disease: int, seed: int):
+    """Request bodies in send order
+
+    Each request picks a gender from the mix, then a presentation of that
+    gender with probability proportional to 1 / rank ** zipf_exponent over a
+    seeded shuffle of the presentations.
+    """
+    rng = np.random.RandomState(seed)
+    pools = build_presentations(synthetic_per_disease, seed)
+
+    weights = []
+    for pool in pools:
+        rng.shuffle(pool)
+        ranks = np.arange(1, len(pool) + 1)
+        weights.append(ranks ** -zipf_exponent / np.sum(ranks ** -zipf_exponent))
+
+    genders = (rng.rand(n_requests) < female_fraction).astype(int)
+    picks = [iter(rng.choice(len(pool), size=count, p=pool_weights))
+             for pool, pool_weights, count in zip(pools, weights, np.bincount(genders, minlength=2))]
+    return [pools[gender][next(picks[gender])] for gender in genders]
+
+class InProcessTarget:
+    """Sends requests through Flask's test client (no network, one shared app)"""
+
+    name = 'in-process'
+
+    def __init__(self):
+        import gender_diagnosis_api as api
+        if not api.initialize_gender_ai():
+            raise RuntimeError(f"AI service failed to load: {api.service_state['error']}")
+        self.api = api
+        self._local = threading.local()
+
+    def diagnose(self, body) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.api.app.test_client()
+        return client.post('/ai/diagnose', json=body).status_code
+
+    def model_version(self):
+        return self.api.ai_service.model_version
+
+class HttpTarget:
+    """Sends requests to a running server, one keep-alive connection per client thread"""
+
+    name = 'http'
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _request(self, method: str, path: str, body=None):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port,
+                                                                             timeout=self.timeout)
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                               headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def diagnose(self, body) -> int:
+        return self._request('POST', '/ai/diagnose', body)[0]
+
+    def model_version(self):
+        status, payload = self._request('GET', '/ai/health')
+        return json.loads(payload)['models']['model_version'] if status == 200 else None
+
+def timed_send(target, body):
+    """(seconds, ok) for one request; connection errors count as failures"""
+    start = time.perf_counter()
+    try:
+        ok = target.diagnose(body) == 200
+    except (OSError, http.client.HTTPException):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def summarize(scenario: str, latencies, errors: int, elapsed: float):
+    summary = {
+        'scenario': scenario,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        summary.update({'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)})
+    else:
+        summary.update({'p50_ms': None, 'p95_ms': None, 'p99_ms': None})
+    return summary
+
+def run_closed_loop(target, stream, concurrency: int, seconds: float):
+    """concurrency clients send back-to-back requests for the given duration"""
+    cursor = itertools.count()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            elapsed, ok = timed_send(target, stream[next(cursor) % len(stream)])
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(f'closed:concurrency={concurrency}', latencies, errors[0], time.perf_counter() - start)
+
+def run_open_loop(target, stream, rate: float, seconds: float, seed: int, max_in_flight: int = 512):
+    """Poisson arrivals at rate requests/s; latency runs from the scheduled arrival"""
+    rng = np.random.RandomState(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, size=int(rate * seconds * 2) + 1))
+    arrivals = arrivals[arrivals < seconds]
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def send(scheduled, body):
+        _, ok = timed_send(target, body)
+        finished = time.perf_counter()
+        with lock:
+            if ok:
+                latencies.append(finished - scheduled)
+            else:
+                errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i, offset in enumerate(arrivals):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled, stream[i % len(stream)])
+    return summarize(f'open:rate={rate:g}', latencies, errors[0], time.perf_counter() - start)
+
+def compare(results, baseline, tolerance: float):
+    """Scenarios whose p99 latency or throughput moved the wrong way by more than tolerance"""
+    previous = {result['scenario']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if before is None:
+            continue
+        if before['p99_ms'] and result['p99_ms'] and result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p99 {before['p99_ms']} ms -> {result['p99_ms']} ms")
+        # Open-loop throughput is fixed by the arrival rate, so only closed loops are compared
+        if result['scenario'].startswith('closed') and \
+                result['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: throughput {before['throughput_rps']} -> "
+                               f"{result['throughput_rps']} req/s")
+        if result['errors'] > before['errors']:
+            regressions.append(f"{result['scenario']}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the diagnosis API')
+    parser.add_argument('--url', help='Running server to test (default: in-process Flask test client)')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 32],
+                        help='Closed-loop client counts')
+    parser.add_argument('--rates', type=float, nargs='*', default=[],
+                        help='Open-loop arrival rates (requests/s)')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each scenario')
+    parser.add_argument('--warmup-seconds', type=float, default=2.0)
+    parser.add_argument('--requests', type=int, default=20000, help='Length of the request stream')
+    parser.add_argument('--female-fraction', type=float, default=0.5)
+    parser.add_argument('--zipf', type=float, default=1.1, help='Popularity exponent (0 = uniform)')
+    parser.add_argument('--synthetic-per-disease', type=int, default=20,
+                        help='Presentations generated from each DISEASE_SYMPTOM_PATTERNS entry')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=REPORT_FILE)
+    parser.add_argument('--save-baseline', help='Also write the results to this baseline file')
+    parser.add_argument('--baseline', help='Compare against this baseline; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args()
+
+def main():
+    options = parse_args()
+
+    print("="*70)
+    print("DIAGNOSIS API LOAD TEST")
+    print("="*70)
+
+    stream = build_stream(options.requests, options.female_fraction, options.zipf,
+                          options.synthetic_per_disease, options.seed)
+    distinct = len({json.dumps(body, sort_keys=True) for body in stream})
+    print(f"Request stream: {len(stream)} requests, {distinct} distinct presentations")
+
+    target = HttpTarget(options.url) if options.url else InProcessTarget()
+    print(f"Target: {options.url or 'in-process Flask test client'}")
+
+    if options.warmup_seconds > 0:
+        run_closed_loop(target, stream, 4, options.warmup_seconds)
+
+    scenarios = [lambda concurrency=concurrency: run_closed_loop(target, stream, concurrency, options.seconds)
+                 for concurrency in options.concurrency]
+    scenarios += [lambda rate=rate: run_open_loop(target, stream, rate, options.seconds, options.seed)
+                  for rate in options.rates]
+
+    results = []
+    for run in scenarios:
+        result = run()
+        results.append(result)
+        print(f"{result['scenario']:<24} {result['throughput_rps']:>8.1f} req/s  "
+              f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+              f"{result['errors']} errors")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'target': target.name,
+        'url': options.url,
+        'model_version': target.model_version(),
+        'python': sys.version.split()[0],
+        'config': {
+            'seconds': options.seconds,
+            'requests': options.requests,
+            'distinct_presentations': distinct,
+            'female_fraction': options.female_fraction,
+            'zipf': options.zipf,
+            'synthetic_per_disease': options.synthetic_per_disease,
+            'seed': options.seed
+        },
+        'results': results
+    }
+
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nOK - Saved {options.output}")
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"OK - Saved baseline {options.save_baseline}")
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print("WARNING - Baseline was recorded with a different configuration")
+        regressions = compare(results, baseline, options.tolerance)
+        if regressions:
+            print(f"\nERROR - {len(regressions)} regression(s) against {options.baseline} "
+                  f"(tolerance {options.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"OK - No regressions against {options.baseline} (tolerance {options.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
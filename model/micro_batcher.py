@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Micro-Batching Request Dispatcher for MediConnect
+Collects concurrent diagnosis requests for a short window (or until a batch
+is full), scores them with one predict_batch call and fans the results back
+to the waiting request threads
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from service_metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets for queue depth and batch size (requests)
+COUNT_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+class MicroBatchDispatcher:
+    """Single worker thread that turns concurrent cases into batches
+
+    predict_batch must accept a list of case dicts and return results in the
+    same order (EmbeddingMediConnectAI.predict_batch does).
+    """
+
+    def __init__(self, predict_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                 max_wait_ms: float = 5.0, max_batch_size: int = 64):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.predict_batch = predict_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self.batches = 0
+        self.requests = 0
+        self.queue_depth = Histogram(COUNT_BUCKETS)
+        self.batch_size = Histogram(COUNT_BUCKETS)
+
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+        logger.info(f"OK - Micro-batching enabled (window {max_wait_ms} ms, max batch {max_batch_size})")
+
+    def submit(self, case: Dict[str, Any]) -> Future:
+        """Queue one case; the returned Future resolves to its diagnosis result"""
+        if self._stopped.is_set():
+            raise RuntimeError("Micro-batch dispatcher is stopped")
+        future = Future()
+        self._queue.put((case, future))
+        return future
+
+    def predict(self, case: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Submit one case and wait for its result"""
+        return self.submit(case).result(timeout=timeout)
+
+    def stop(self):
+        """Stop the worker after it finishes the requests already queued"""
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return dispatcher counters and histograms"""
+        return {
+            'enabled': True,
+            'window_ms': self.max_wait_ms,
+            'max_batch_size': self.max_batch_size,
+            'batches': self.batches,
+            'requests': self.requests,
+            'pending': self._queue.qsize(),
+            'queue_depth': self.queue_depth.snapshot(),
+            'batch_size': self.batch_size.snapshot()
+        }
+
+    def _collect_batch(self, first) -> List:
+        """Gather up to max_batch_size items, waiting at most max_wait_ms after the first"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop sentinel: finish this batch, then exit
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        """Worker loop: collect a batch, score it, resolve the futures"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect_batch(first)
+            self.queue_depth.observe(self._queue.qsize())
+            self.batch_size.observe(len(batch))
+            self.batches += 1
+            self.requests += len(batch)
+
+            try:
+                results = self.predict_batch([case for case, _ in batch])
+            except Exception as e:
+                logger.error(f"ERROR - Micro-batch prediction failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
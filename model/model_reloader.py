@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Hot Model Reloading for MediConnect
+Loads a new model version in a background thread, validates it with the
+service's warm-up smoke predictions and only then swaps it in. Requests that
+already hold the previous service finish on it; the retired service is
+released from the reloader thread after a grace period so freeing a large
+forest never lands on a request thread.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Versions kept in the history reported by /ai/info
+VERSION_HISTORY_SIZE = 10
+
+class ModelReloader:
+    """Background loader, validator and atomic swapper for diagnosis services
+
+    load_service(model_dir) must return a loaded service with warm_up() and
+    model_version; swap(service) publishes it; fingerprint(model_dir)
+    returns the version the files on disk would load as.
+    """
+
+    def __init__(self, load_service: Callable[[str], Any], swap: Callable[[Any], None],
+                 fingerprint: Callable[[str], str], model_dir: str, retire_grace_seconds: float = 30.0):
+        self.load_service = load_service
+        self.swap = swap
+        self.fingerprint = fingerprint
+        self.model_dir = model_dir
+        self.retire_grace_seconds = retire_grace_seconds
+
+        self._lock = threading.Lock()
+        self._loading = None          # thread of the reload in progress
+        self._history: List[Dict[str, Any]] = []
+        self._watcher = None
+        self._stopped = threading.Event()
+
+    def record_initial(self, service, model_dir: str, load_seconds: float, warmup_seconds: float):
+        """Record the version loaded at startup as the active one"""
+        self.model_dir = model_dir
+        self._record(service.model_version, model_dir, 'active', 'startup', load_seconds, warmup_seconds)
+
+    def reload(self, model_dir: Optional[str] = None, reason: str = 'admin') -> bool:
+        """Start loading model_dir (default: the active directory) in the background
+
+        Returns False if a reload is already in progress.
+        """
+        with self._lock:
+            if self._loading is not None and self._loading.is_alive():
+                return False
+            self._loading = threading.Thread(target=self.load_and_swap, args=(model_dir or self.model_dir, reason),
+                                             name='model-reloader', daemon=True)
+            self._loading.start()
+            return True
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the reload in progress (if any) finishes"""
+        loading = self._loading
+        if loading is not None:
+            loading.join(timeout)
+
+    def is_loading(self) -> bool:
+        return self._loading is not None and self._loading.is_alive()
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Loaded versions, newest first"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._history)]
+
+    def watch(self, interval_seconds: float):
+        """Poll the active model directory and reload when its files change
+
+        A change must be seen on two consecutive polls (files no longer being
+        written) before a reload starts; a version that failed validation is
+        not retried until the files change again.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval_seconds,),
+                                         name='model-watcher', daemon=True)
+        self._watcher.start()
+        logger.info(f"OK - Watching {self.model_dir} for new models every {interval_seconds}s")
+
+    def stop(self):
+        """Stop the file watcher"""
+        self._stopped.set()
+
+    def _watch(self, interval_seconds: float):
+        pending = None
+        while not self._stopped.wait(interval_seconds):
+            try:
+                version = self.fingerprint(self.model_dir)
+            except Exception as e:
+                logger.warning(f"Model watch failed: {e}")
+                continue
+
+            known = {entry['version'] for entry in self.versions() if entry['status'] in ('active', 'failed')}
+            if version in known or self.is_loading():
+                pending = None
+            elif version != pending:
+                pending = version
+            else:
+                pending = None
+                logger.info(f"Model files in {self.model_dir} changed (version {version}), reloading")
+                self.reload(reason='file watch')
+
+    def load_and_swap(self, model_dir: str, reason: str, background: bool = True) -> bool:
+        """Load, validate and swap in model_dir; returns True once the new version is live
+
+        reload() runs this on the reloader thread. With background=False (a
+        process serving no requests, such as the prefork parent) it runs at
+        normal priority and the retired service is released immediately.
+        """
+        if background:
+            _lower_thread_priority()
+        logger.info(f"Reloading models from {model_dir} ({reason})")
+
+        try:
+            load_start = time.perf_counter()
+            service = self.load_service(model_dir)
+            load_seconds = time.perf_counter() - load_start
+
+            # warm_up raises if any smoke prediction fails
+            warmup_seconds = service.warm_up()['seconds']
+        except Exception as e:
+            logger.error(f"ERROR - Model reload from {model_dir} failed, keeping current models: {e}")
+            try:
+                version = self.fingerprint(model_dir)
+            except Exception:
+                version = None
+            self._record(version, model_dir, 'failed', reason, error=str(e))
+            return False
+
+        retired = self.swap(service)
+        self.model_dir = model_dir
+        self._record(service.model_version, model_dir, 'active', reason, load_seconds, warmup_seconds)
+        logger.info(f"OK - Swapped in model version {service.model_version} "
+                    f"(load {load_seconds:.2f}s, warm-up {warmup_seconds:.2f}s)")
+
+        # In-flight requests keep their own reference to the retired service;
+        # a helper thread holds ours for the grace period and then releases it,
+        # so freeing the old forests never lands on a request thread
+        if retired is not None and background:
+            threading.Thread(target=_release_after, args=(retired, self.retire_grace_seconds),
+                             name='model-retire', daemon=True).start()
+        del retired
+        return True
+
+    def _record(self, version, model_dir: str, status: str, reason: str,
+                load_seconds: float = None, warmup_seconds: float = None, error: str = None):
+        with self._lock:
+            if status == 'active':
+                for entry in self._history:
+                    if entry['status'] == 'active':
+                        entry['status'] = 'retired'
+                        entry['retired_at'] = time.time()
+            self._history.append({
+                'version': version,
+                'model_dir': os.path.abspath(model_dir),
+                'status': status,
+                'reason': reason,
+                'loaded_at': time.time(),
+                'load_seconds': round(load_seconds, 3) if load_seconds is not None else None,
+                'warmup_seconds': round(warmup_seconds, 3) if warmup_seconds is not None else None,
+                'error': error
+            })
+            # Trim the oldest entries, never the active one
+            while len(self._history) > VERSION_HISTORY_SIZE:
+                oldest = next(i for i, entry in enumerate(self._history) if entry['status'] != 'active')
+                del self._history[oldest]
+
+def _release_after(service, grace_seconds: float):
+    """Hold a retired service for grace_seconds; the thread drops it on exit"""
+    time.sleep(grace_seconds)
+    logger.info(f"Released retired model version {getattr(service, 'model_version', None)}")
+
+def _lower_thread_priority():
+    """Nice the calling thread (Linux) so loading competes less with request threads"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
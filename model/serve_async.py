@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Asyncio Front End for the MediConnect Diagnosis API
+Serves the routes of gender_diagnosis_api.py from an aiohttp event loop.
+Request bodies are read and responses written by coroutines, so slow clients
+hold no threads; symptom encoding, forest inference and response
+serialization run in a bounded thread pool, so /ai/health, /ai/info and
+/ai/metrics answer from the event loop without queueing behind diagnoses.
+Diagnoses beyond the pool's pending limit get a fast 503 with Retry-After.
+
+Usage:
+  python serve_async.py --port 5002
+  python serve_async.py --inference-threads 4 --max-pending 256
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from aiohttp import web
+
+import gender_diagnosis_api as api
+from service_metrics import render_prometheus_gauges, sample_verbose, stage_metrics
+
+logger = logging.getLogger(__name__)
+
+# Threads running encode + forest work (numpy and torch release the GIL)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', os.cpu_count() or 1))
+
+# Diagnosis requests allowed to wait for or hold an inference thread; the rest get a 503
+MAX_PENDING_DIAGNOSES = int(os.environ.get('MAX_PENDING_DIAGNOSES', 256))
+
+# Retry-After hint (seconds) when the inference queue is full
+QUEUE_FULL_RETRY_AFTER_SECONDS = 1
+
+# Largest accepted request body (a full /ai/diagnose/batch fits comfortably)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+JSON_CONTENT_TYPE = 'application/json'
+
+class InferenceExecutor:
+    """Bounded thread pool for CPU-bound diagnosis work with admission control
+
+    pending counts jobs waiting for or running on a thread, including jobs
+    whose request has already gone away. It is only touched from the event
+    loop, so it needs no lock.
+    """
+
+    def __init__(self, threads: int, max_pending: int):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='inference')
+
+    def full(self) -> bool:
+        """True when a new diagnosis should be turned away"""
+        return self.pending >= self.max_pending
+
+    def _hold(self, future: asyncio.Future):
+        """Count future as pending until it finishes, even if its awaiting request is cancelled"""
+        self.pending += 1
+        future.add_done_callback(self._release)
+
+    def _release(self, future: asyncio.Future):
+        self.pending -= 1
+        self.completed += 1
+        if not future.cancelled():
+            # Mark the outcome retrieved when the request that wanted it is gone
+            future.exception()
+
+    async def run(self, model: str, path: str, function: Callable, *args, **kwargs):
+        """Run function on an inference thread, recording the queue wait as the 'queue' stage
+
+        The await is shielded, so a client disconnect does not free the slot
+        while the job is still queued or running on its thread.
+        """
+        submitted = time.perf_counter()
+
+        def call():
+            stage_metrics.observe(model, 'queue', time.perf_counter() - submitted, path)
+            return function(*args, **kwargs)
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        self._hold(future)
+        return await asyncio.shield(future)
+
+    async def wait(self, future, timeout: float):
+        """Await a micro-batch dispatcher future, counted as pending like run()
+
+        The slot is held until the dispatcher resolves the future, also when
+        this request times out or is cancelled first.
+        """
+        future = asyncio.wrap_future(future)
+        self._hold(future)
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'threads': self.threads,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+def json_response(payload, status: int = 200, headers=None) -> web.Response:
+    return web.Response(text=json.dumps(payload), status=status, headers=headers,
+                        content_type=JSON_CONTENT_TYPE)
+
+def not_ready_response() -> web.Response:
+    """Fast 503 with Retry-After for requests that arrive before readiness"""
+    return json_response(api.not_ready_payload(), 503,
+                         {'Retry-After': str(api.READINESS_RETRY_AFTER_SECONDS)})
+
+def queue_full_response(executor: InferenceExecutor) -> web.Response:
+    """Fast 503 with Retry-After when the inference queue is full"""
+    executor.rejected += 1
+    return json_response({
+        'success': False,
+        'error': 'AI service is busy, please retry'
+    }, 503, {'Retry-After': str(QUEUE_FULL_RETRY_AFTER_SECONDS)})
+
+async def read_json(request: web.Request):
+    """Parsed JSON body, or None when it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def serialized_diagnosis(service, case: Dict[str, Any], verbose: bool):
+    """Predict and serialize on the inference thread (JSON encoding stays off the event loop)"""
+    result = service.predict_disease(**case, verbose=verbose)
+    return result, json.dumps(result)
+
+async def diagnose(request: web.Request) -> web.Response:
+    """Gender-specific AI diagnosis endpoint"""
+    if not api.is_ready():
+        return not_ready_response()
+    executor = request.app['executor']
+    if executor.full():
+        return queue_full_response(executor)
+
+    # One read of the current service; a concurrent model swap does not affect this request
+    service = api.ai_service
+    request_start = time.perf_counter()
+    verbose = sample_verbose()
+
+    try:
+        case, error = api.parse_diagnosis_request(await read_json(request), verbose)
+        if error:
+            return json_response({'success': False, 'error': error}, 400)
+
+        gender_lower = case['gender'].lower()
+        stage_metrics.observe(gender_lower, 'parse', time.perf_counter() - request_start)
+
+        if api.dispatcher:
+            # The dispatcher has its own worker thread; just wait on its future
+            result = await executor.wait(api.dispatcher.submit(case), api.DIAGNOSIS_TIMEOUT_SECONDS)
+            body = json.dumps(result)
+        else:
+            result, body = await executor.run(gender_lower, 'single', serialized_diagnosis, service, case, verbose)
+
+        if not result['success']:
+            logger.error(f"ERROR - Diagnosis failed: {result.get('error', 'Unknown error')}")
+            return json_response({
+                'success': False,
+                'error': result.get('error', 'Diagnosis failed'),
+                'diagnosis': result
+            }, 500)
+        if verbose:
+            logger.info(f"OK - Diagnosis completed: {result['diagnosis']['top_disease']} ({result['diagnosis']['confidence']})")
+
+        response = web.Response(text=body, content_type=JSON_CONTENT_TYPE)
+        stage_metrics.observe(gender_lower, 'total', time.perf_counter() - request_start)
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ API error: {e}")
+        traceback.print_exc()
+        return json_response(api.diagnosis_error_payload(e), 500)
+
+def serialized_batch(service, cases, verbose: bool) -> str:
+    payload = api.batch_response_payload(service.predict_batch(cases, verbose=verbose))
+    if verbose:
+        logger.info(f"OK - Batch diagnosis completed: {payload['succeeded']}/{payload['total']} succeeded")
+    return json.dumps(payload)
+
+async def diagnose_batch(request: web.Request) -> web.Response:
+    """Batch diagnosis endpoint - results are returned in input order"""
+    if not api.is_ready():
+        return not_ready_response()
+    executor = request.app['executor']
+    if executor.full():
+        return queue_full_response(executor)
+
+    service = api.ai_service
+    request_start = time.perf_counter()
+    verbose = sample_verbose()
+
+    try:
+        cases, error = api.parse_batch_request(await read_json(request))
+        if error:
+            return json_response({'success': False, 'error': error}, 400)
+
+        stage_metrics.observe('all', 'parse', time.perf_counter() - request_start, 'batch')
+        if verbose:
+            logger.info(f"🔍 Batch diagnosis request with {len(cases)} cases")
+
+        body = await executor.run('all', 'batch', serialized_batch, service, cases, verbose)
+        response = web.Response(text=body, content_type=JSON_CONTENT_TYPE)
+        stage_metrics.observe('all', 'total', time.perf_counter() - request_start, 'batch')
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ Batch API error: {e}")
+        traceback.print_exc()
+        return json_response({'success': False, 'error': f'Internal server error: {str(e)}'}, 500)
+
+async def health_check(request: web.Request) -> web.Response:
+    """Health check endpoint (answered on the event loop)"""
+    try:
+        payload = api.health_payload()
+        payload['inference_executor'] = request.app['executor'].stats()
+        return json_response(payload)
+    except Exception as e:
+        logger.error(f"❌ Health check error: {e}")
+        return json_response({'status': 'error', 'error': str(e)}, 500)
+
+async def liveness_check(request: web.Request) -> web.Response:
+    """Liveness probe - the process is up and serving HTTP"""
+    return json_response({'liveness': 'alive'})
+
+async def readiness_check(request: web.Request) -> web.Response:
+    """Readiness probe - 200 once models are loaded and warmed up, 503 before"""
+    if not api.is_ready():
+        return not_ready_response()
+    return json_response({'readiness': 'ready'})
+
+async def metrics(request: web.Request) -> web.Response:
+    """Prometheus text metrics, plus inference executor gauges"""
+    executor = request.app['executor'].stats()
+    text = api.metrics_text() + render_prometheus_gauges(
+        'mediconnect_inference_executor', 'Async front end inference thread pool', {
+            kind: executor[kind] for kind in ['threads', 'max_pending', 'pending', 'completed', 'rejected']
+        })
+    return web.Response(text=text, headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def model_info(request: web.Request) -> web.Response:
+    """Get model information"""
+    if not api.is_ready():
+        return not_ready_response()
+    try:
+        return json_response(api.info_payload())
+    except Exception as e:
+        logger.error(f"❌ Model info error: {e}")
+        return json_response({'error': str(e)}, 500)
+
+async def reload_models(request: web.Request) -> web.Response:
+    """Load a model version in the background (see gender_diagnosis_api.reload_models)"""
+    if not api.admin_authorized(request.headers.get('X-Admin-Token', ''), request.remote or ''):
+        return json_response({'success': False, 'error': 'Not authorized'}, 403)
+    if not api.is_ready():
+        return not_ready_response()
+
+    payload, status = api.start_reload(await read_json(request))
+    return json_response(payload, status)
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Token'
+}
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    """Allow browser callers from any origin, as flask_cors does for the Flask app"""
+    if request.method == 'OPTIONS':
+        return web.Response(headers=CORS_HEADERS)
+    response = await handler(request)
+    response.headers.update(CORS_HEADERS)
+    return response
+
+def create_app(inference_threads: int = INFERENCE_THREADS,
+               max_pending: int = MAX_PENDING_DIAGNOSES) -> web.Application:
+    """aiohttp application with the diagnosis routes and its inference executor"""
+    app = web.Application(client_max_size=MAX_REQUEST_BYTES, middlewares=[cors_middleware])
+    app['executor'] = InferenceExecutor(inference_threads, max_pending)
+
+    async def shutdown_executor(app):
+        app['executor'].shutdown()
+    app.on_cleanup.append(shutdown_executor)
+
+    app.add_routes([
+        web.post('/ai/diagnose', diagnose),
+        web.post('/ai/diagnose/batch', diagnose_batch),
+        web.get('/ai/health', health_check),
+        web.get('/ai/health/live', liveness_check),
+        web.get('/ai/health/ready', readiness_check),
+        web.get('/ai/metrics', metrics),
+        web.get('/ai/info', model_info),
+        web.post('/ai/admin/reload', reload_models)
+    ])
+    return app
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Asyncio MediConnect diagnosis API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--inference-threads', type=int, default=INFERENCE_THREADS,
+                        help='Threads running encode + forest work (default: INFERENCE_THREADS or CPU count)')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING_DIAGNOSES,
+                        help='Diagnoses allowed to queue for a thread before new ones get a 503')
+    parser.add_argument('--backlog', type=int, default=1024)
+    return parser.parse_args()
+
+def main():
+    options = parse_args()
+
+    print("="*70)
+    print("STARTING ASYNC EMBEDDING-BASED AI DIAGNOSIS API")
+    print(f"Inference threads: {options.inference_threads}, max pending diagnoses: {options.max_pending}")
+    print("="*70)
+
+    # Load and warm up models in the background; diagnosis requests get a
+    # 503 with Retry-After until /ai/health reports readiness 'ready'
+    api.start_background_initialization()
+    print("Loading models in the background (see /ai/health for readiness)")
+    print(f"Starting API server on http://{options.host}:{options.port}")
+
+    web.run_app(create_app(options.inference_threads, options.max_pending), host=options.host,
+                port=options.port, backlog=options.backlog, access_log=None, print=None)
+
+if __name__ == '__main__':
+    main()
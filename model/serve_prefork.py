@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Preforking Production Server for the MediConnect Diagnosis API
+Loads the encoder, both gender forests and their encoders once in the parent
+process, then forks N workers that share the model memory copy-on-write.
+
+Signals to the parent:
+  SIGHUP          - graceful rolling restart of all workers; if the model files
+                    changed, the parent loads and validates them first so the
+                    new workers fork with the new version
+  SIGTERM/SIGINT  - graceful shutdown (in-flight requests finish first)
+
+Usage:
+  python serve_prefork.py --workers 4 --port 5002
+  python serve_prefork.py --workers 0     # single process, no fork
+"""
+import argparse
+import gc
+import logging
+import mmap
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import numpy as np
+from flask import jsonify
+from werkzeug.serving import make_server
+import gender_diagnosis_api as api
+
+logger = logging.getLogger(__name__)
+
+# Per-worker stats live in an anonymous shared mapping so any worker can report all of them
+STATS_FIELDS = ['pid', 'requests', 'in_flight', 'rss_bytes', 'started_at', 'generation']
+
+# Seconds a stopping worker waits for in-flight requests before exiting
+GRACEFUL_TIMEOUT_SECONDS = 30
+
+class WorkerStats:
+    """Fixed table of per-worker counters in memory shared across fork()"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._buffer = mmap.mmap(-1, max(slots, 1) * len(STATS_FIELDS) * 8)
+        self.table = np.frombuffer(self._buffer, dtype=np.float64).reshape(max(slots, 1), len(STATS_FIELDS))
+
+    def set(self, slot: int, field: str, value: float):
+        self.table[slot, STATS_FIELDS.index(field)] = value
+
+    def get(self, slot: int, field: str) -> float:
+        return self.table[slot, STATS_FIELDS.index(field)]
+
+    def snapshot(self):
+        """Return one dict per live worker slot"""
+        now = time.time()
+        workers = []
+        for slot in range(self.slots):
+            row = dict(zip(STATS_FIELDS, self.table[slot].tolist()))
+            if not row['pid']:
+                continue
+            workers.append({
+                'slot': slot,
+                'pid': int(row['pid']),
+                'generation': int(row['generation']),
+                'requests': int(row['requests']),
+                'in_flight': int(row['in_flight']),
+                'rss_mb': round(row['rss_bytes'] / (1024 * 1024), 1),
+                'uptime_seconds': round(now - row['started_at'], 1)
+            })
+        return workers
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class WorkerMiddleware:
+    """Counts requests for one worker and asks it to recycle when limits are hit"""
+
+    def __init__(self, app, stats: WorkerStats, slot: int, max_requests: int, max_rss_mb: float, recycle):
+        self.app = app
+        self.stats = stats
+        self.slot = slot
+        self.max_requests = max_requests
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.recycle = recycle
+        self.requests = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _publish(self, rss: int = None):
+        """Mirror counters to the shared slot while this process still owns it"""
+        if int(self.stats.get(self.slot, 'pid')) != os.getpid():
+            return
+        self.stats.set(self.slot, 'requests', self.requests)
+        self.stats.set(self.slot, 'in_flight', self.in_flight)
+        if rss is not None:
+            self.stats.set(self.slot, 'rss_bytes', rss)
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.in_flight += 1
+            self._publish()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            rss = current_rss_bytes()
+            with self._lock:
+                self.in_flight -= 1
+                self.requests += 1
+                requests = self.requests
+                self._publish(rss)
+
+            if self.max_requests and requests >= self.max_requests:
+                self.recycle(f"served {requests} requests")
+            elif self.max_rss_bytes and rss > self.max_rss_bytes:
+                self.recycle(f"RSS {rss / (1024 * 1024):.0f} MB over limit")
+
+def run_worker(slot: int, generation: int, sock: socket.socket, stats: WorkerStats, options):
+    """Serve requests in a forked worker until told to stop or recycle"""
+    for sig in (signal.SIGHUP, signal.SIGINT):
+        signal.signal(sig, signal.SIG_IGN)
+
+    stats.table[slot] = 0
+    stats.set(slot, 'pid', os.getpid())
+    stats.set(slot, 'started_at', time.time())
+    stats.set(slot, 'generation', generation)
+    stats.set(slot, 'rss_bytes', current_rss_bytes())
+
+    if options.threads_per_worker:
+        import torch
+        torch.set_num_threads(options.threads_per_worker)
+
+    # Threads do not survive fork(), so the dispatcher and model watcher start here
+    api.start_dispatcher()
+    api.start_model_watcher()
+
+    stopping = threading.Event()
+    server = None
+
+    def stop(reason):
+        if not stopping.is_set():
+            stopping.set()
+            logger.info(f"Worker {os.getpid()} stopping: {reason}")
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    app = WorkerMiddleware(api.app, stats, slot, options.max_requests, options.max_rss_mb, stop)
+    server = make_server(options.host, options.port, app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop("SIGTERM"))
+
+    logger.info(f"Worker {os.getpid()} (slot {slot}, generation {generation}) serving")
+    server.serve_forever()
+
+    # Let in-flight requests finish before exiting
+    deadline = time.time() + GRACEFUL_TIMEOUT_SECONDS
+    while app.in_flight > 0 and time.time() < deadline:
+        time.sleep(0.05)
+    if api.dispatcher:
+        api.dispatcher.stop()
+
+class PreforkServer:
+    """Parent process: owns the listening socket and supervises workers"""
+
+    def __init__(self, options):
+        self.options = options
+        self.stats = WorkerStats(options.workers)
+        self.workers = {}          # pid -> slot
+        self.retiring = set()      # pids replaced during a rolling restart
+        self.generation = 0
+        self.shutting_down = False
+        self.restart_requested = False
+        self.sock = None
+
+    def spawn(self, slot: int):
+        """Fork one worker into a stats slot"""
+        self.generation += 1
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                run_worker(slot, self.generation, self.sock, self.stats, self.options)
+            except Exception as e:
+                logger.error(f"ERROR - Worker crashed: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = slot
+        return pid
+
+    def reload_models(self):
+        """Load changed model files into the parent before a rolling restart"""
+        model_dir = api.reloader.model_dir
+        if api.model_fingerprint(model_dir) == api.ai_service.model_version:
+            return
+        logger.info(f"Model files in {model_dir} changed, loading them before restarting workers")
+        if api.reloader.load_and_swap(model_dir, 'SIGHUP', background=False):
+            gc.collect()
+            gc.freeze()
+
+    def rolling_restart(self):
+        """Replace every worker with a fresh fork, one slot at a time"""
+        logger.info("Rolling restart of all workers")
+        for pid, slot in list(self.workers.items()):
+            if pid in self.retiring:
+                continue
+            self.retiring.add(pid)
+            self.spawn(slot)
+            os.kill(pid, signal.SIGTERM)
+
+    def reap(self):
+        """Collect exited workers and respawn their slots"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            slot = self.workers.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if slot is not None and not self.shutting_down:
+                logger.info(f"Worker {pid} exited (status {status}), respawning slot {slot}")
+                self.spawn(slot)
+
+    def shutdown(self):
+        """Stop all workers gracefully and wait for them"""
+        self.shutting_down = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.time() + GRACEFUL_TIMEOUT_SECONDS + 5
+        while self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self):
+        """Bind, fork workers and supervise until shutdown"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.options.host, self.options.port))
+        self.sock.listen(self.options.backlog)
+        self.sock.set_inheritable(True)
+
+        # Move everything allocated so far out of the GC's reach so collections
+        # in the workers do not touch (and un-share) the model pages
+        gc.collect()
+        gc.freeze()
+
+        for slot in range(self.options.workers):
+            self.spawn(slot)
+
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'restart_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'shutting_down', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'shutting_down', True))
+
+        print(f"Serving on http://{self.options.host}:{self.options.port} with {self.options.workers} workers "
+              f"(parent pid {os.getpid()})")
+
+        while not self.shutting_down:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.reload_models()
+                self.rolling_restart()
+            self.reap()
+            time.sleep(0.2)
+
+        self.shutdown()
+        self.sock.close()
+
+def register_worker_stats_route(server: PreforkServer):
+    """Expose per-worker stats on /ai/workers"""
+    @api.app.route('/ai/workers', methods=['GET'])
+    def worker_stats():
+        """Per-worker request counts, RSS and uptime"""
+        return jsonify({
+            'parent_pid': os.getppid(),
+            'worker_pid': os.getpid(),
+            'workers': server.stats.snapshot()
+        })
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Preforking MediConnect diagnosis API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes to fork (0 = serve in this process)')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='torch intra-op threads per worker (default: cores / workers)')
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help='recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-rss-mb', type=float, default=0,
+                        help='recycle a worker when its RSS exceeds this many MB (0 = never)')
+    parser.add_argument('--backlog', type=int, default=1024)
+    options = parser.parse_args()
+
+    if options.threads_per_worker is None:
+        options.threads_per_worker = max(1, (os.cpu_count() or 1) // max(options.workers, 1))
+    return options
+
+def main():
+    options = parse_args()
+
+    print("="*70)
+    print("STARTING PREFORK EMBEDDING-BASED AI DIAGNOSIS API")
+    print("="*70)
+
+    # Load and warm up once in the parent; workers inherit the models
+    if not api.initialize_gender_ai(start_threads=options.workers == 0):
+        print(f"ERROR - Failed to initialize AI service: {api.service_state['error']}")
+        sys.exit(1)
+
+    if options.workers == 0:
+        print(f"Serving on http://{options.host}:{options.port} in a single process")
+        make_server(options.host, options.port, api.app, threaded=True).serve_forever()
+        return
+
+    server = PreforkServer(options)
+    register_worker_stats_route(server)
+    server.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Service Metrics for MediConnect
+Thread-safe fixed-bucket histograms used by the diagnosis service, per-stage
+latency tracking, Prometheus text rendering and sampled verbose logging
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+# Fraction of requests that emit verbose per-request INFO logs (0 = none, 1 = all)
+VERBOSE_LOG_SAMPLE_RATE = float(os.environ.get('VERBOSE_LOG_SAMPLE_RATE', 0))
+
+# Stage latency buckets (seconds), 100 us to 5 s
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+def sample_verbose() -> bool:
+    """Decide whether this request logs verbosely"""
+    return VERBOSE_LOG_SAMPLE_RATE > 0 and random.random() < VERBOSE_LOG_SAMPLE_RATE
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus-style cumulative `le` buckets)"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts, total count and sum"""
+        with self._lock:
+            counts = list(self._counts)
+            total, value_sum = self._count, self._sum
+
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            running += count
+            cumulative['+Inf' if bound == float('inf') else f'{bound:g}'] = running
+
+        return {
+            'buckets': cumulative,
+            'count': total,
+            'sum': value_sum,
+            'mean': value_sum / total if total else 0.0
+        }
+
+class StageMetrics:
+    """Latency histograms keyed by (path, model, stage)
+
+    Stages are parse and total (timed by the API), queue (waiting for an
+    inference thread under serve_async.py) and embed, features, inference
+    and response (timed by the diagnosis service).
+
+    path is 'single' (one case per call) or 'batch' (predict_batch, which
+    also serves micro-batched /ai/diagnose traffic). model is 'male' or
+    'female', or 'all' for stages shared by both genders such as the
+    batched embedding pass and request parsing.
+    """
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, stage: str, seconds: float, path: str = 'single'):
+        """Record one stage duration"""
+        key = (path, model, stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, model: str, stage: str, path: str = 'single'):
+        """Time the enclosed block as one stage observation"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(model, stage, time.perf_counter() - start, path)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Dict[str, Any]]]]:
+        """Return {path: {model: {stage: histogram snapshot}}}"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        result = {}
+        for (path, model, stage), histogram in items:
+            result.setdefault(path, {}).setdefault(model, {})[stage] = histogram.snapshot()
+        return result
+
+    def render_prometheus(self, name: str = 'mediconnect_stage_latency_seconds') -> str:
+        """Render every histogram in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {name} Diagnosis hot-path latency by path, model and stage',
+            f'# TYPE {name} histogram'
+        ]
+        for path, models in self.snapshot().items():
+            for model, stages in models.items():
+                for stage, snapshot in stages.items():
+                    labels = f'path="{path}",model="{model}",stage="{stage}"'
+                    lines.extend(histogram_lines(name, snapshot, labels))
+        return '\n'.join(lines) + '\n'
+
+def histogram_lines(name: str, snapshot: Dict[str, Any], labels: str = '') -> List[str]:
+    """Prometheus _bucket/_sum/_count lines for one Histogram snapshot"""
+    prefix = f'{labels},' if labels else ''
+    lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}' for bound, count in snapshot['buckets'].items()]
+    label_block = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{label_block} {snapshot["sum"]:.9f}')
+    lines.append(f'{name}_count{label_block} {snapshot["count"]}')
+    return lines
+
+def render_prometheus_histogram(name: str, help_text: str, snapshot: Dict[str, Any]) -> str:
+    """Render one unlabelled Histogram snapshot"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    lines.extend(histogram_lines(name, snapshot))
+    return '\n'.join(lines) + '\n'
+
+def render_prometheus_gauges(name: str, help_text: str, values: Dict[str, float]) -> str:
+    """Render a gauge family keyed by a 'kind' label (e.g. cache counters)"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    for kind, value in values.items():
+        lines.append(f'{name}{{kind="{kind}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+# Process-wide stage metrics shared by the diagnosis services and the API
+stage_metrics = StageMetrics()
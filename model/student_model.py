@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Distilled Student Models for MediConnect
+Compact classifiers fitted to a RandomForest teacher's soft predict_proba
+outputs over the same 387 features (age + 384 embedding dims + severity +
+gender). A student is a multinomial linear head (hidden_units=0) or a
+one-hidden-layer ReLU MLP. Training and inference are plain NumPy and the
+weights ship as a single .npz next to the teacher's .pkl, which
+EmbeddingMediConnectAI serves with INFERENCE_BACKEND=student.
+"""
+import json
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+STUDENT_FORMAT_VERSION = 1
+
+# Training defaults
+HIDDEN_UNITS = 256
+EPOCHS = 40
+BATCH_SIZE = 256
+LEARNING_RATE = 1e-3
+WEIGHT_DECAY = 1e-5
+
+# Augmented copies per training row: age and severity resampled, small
+# embedding noise; the teacher labels them so the student sees its response
+# away from the training points
+AUGMENT_COPIES = 2
+EMBEDDING_NOISE = 0.1   # fraction of each embedding dimension's std
+
+# Feature layout shared with the teacher
+AGE_COLUMN, SEVERITY_COLUMN = 0, 385
+
+def student_path(model_path: str) -> str:
+    """Student weights file for a teacher model file"""
+    return f"{os.path.splitext(model_path)[0]}_student.npz"
+
+class StudentModel:
+    """Standardize -> [Linear -> ReLU] -> Linear -> softmax over the teacher's classes"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, layers: List[Tuple[np.ndarray, np.ndarray]],
+                 classes: np.ndarray, info: Optional[Dict[str, Any]] = None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.layers = [(np.asarray(W, dtype=np.float32), np.asarray(b, dtype=np.float32)) for W, b in layers]
+        self.classes_ = np.asarray(classes)
+        self.info = info or {}
+
+    @property
+    def hidden_units(self) -> int:
+        return self.layers[0][0].shape[1] if len(self.layers) > 1 else 0
+
+    @property
+    def model_type(self) -> str:
+        return f"MLP student ({self.hidden_units} hidden)" if self.hidden_units else "Linear student"
+
+    def n_parameters(self) -> int:
+        return sum(W.size + b.size for W, b in self.layers)
+
+    def logits(self, X) -> np.ndarray:
+        h = (np.asarray(X, dtype=np.float32) - self.mean) / self.scale
+        for W, b in self.layers[:-1]:
+            h = np.maximum(h @ W + b, 0)
+        W, b = self.layers[-1]
+        return h @ W + b
+
+    def predict_proba(self, X) -> np.ndarray:
+        return _softmax(self.logits(X)).astype(np.float64)
+
+    def predict_with_proba(self, X):
+        """(predictions, probabilities) like CompiledForest.predict_with_proba"""
+        probabilities = self.predict_proba(X)
+        return self.classes_.take(np.argmax(probabilities, axis=1)), probabilities
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def save(self, path: str):
+        """Write weights and metadata to one uncompressed .npz"""
+        arrays = {'mean': self.mean, 'scale': self.scale, 'classes': self.classes_}
+        for i, (W, b) in enumerate(self.layers):
+            arrays[f'W{i}'], arrays[f'b{i}'] = W, b
+        info = dict(self.info, format_version=STUDENT_FORMAT_VERSION, n_layers=len(self.layers))
+        np.savez(path, info=np.array(json.dumps(info)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'StudentModel':
+        with np.load(path, allow_pickle=False) as data:
+            info = json.loads(str(data['info']))
+            if info.get('format_version') != STUDENT_FORMAT_VERSION:
+                raise ValueError(f"Unsupported student model format in {path}: {info.get('format_version')}")
+            layers = [(data[f'W{i}'], data[f'b{i}']) for i in range(info['n_layers'])]
+            return cls(data['mean'], data['scale'], layers, data['classes'], info)
+
+    @classmethod
+    def fit(cls, X, soft_targets, classes, hidden_units: int = HIDDEN_UNITS, epochs: int = EPOCHS,
+            batch_size: int = BATCH_SIZE, learning_rate: float = LEARNING_RATE,
+            weight_decay: float = WEIGHT_DECAY, seed: int = 42, verbose: bool = True) -> 'StudentModel':
+        """Minimize cross-entropy against the teacher's probabilities with Adam"""
+        rng = np.random.RandomState(seed)
+        X = np.asarray(X, dtype=np.float32)
+        P = np.asarray(soft_targets, dtype=np.float32)
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale < 1e-6] = 1.0
+        Z = (X - mean) / scale
+
+        sizes = [X.shape[1]] + ([hidden_units] if hidden_units else []) + [P.shape[1]]
+        params = []
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            params.append(rng.normal(0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)).astype(np.float32))
+            params.append(np.zeros(fan_out, dtype=np.float32))
+        adam_m = [np.zeros_like(p) for p in params]
+        adam_v = [np.zeros_like(p) for p in params]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+        step = 0
+        for epoch in range(epochs):
+            order = rng.permutation(len(Z))
+            epoch_loss = 0.0
+            for start in range(0, len(Z), batch_size):
+                batch = order[start:start + batch_size]
+                grads, loss = _backward(params, Z[batch], P[batch])
+                epoch_loss += loss * len(batch)
+
+                step += 1
+                for i, (param, grad) in enumerate(zip(params, grads)):
+                    if param.ndim == 2:
+                        grad = grad + weight_decay * param
+                    adam_m[i] = beta1 * adam_m[i] + (1 - beta1) * grad
+                    adam_v[i] = beta2 * adam_v[i] + (1 - beta2) * grad * grad
+                    m_hat = adam_m[i] / (1 - beta1 ** step)
+                    v_hat = adam_v[i] / (1 - beta2 ** step)
+                    param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+            if verbose and (epoch == 0 or (epoch + 1) % 10 == 0 or epoch + 1 == epochs):
+                print(f"  epoch {epoch + 1:>3}/{epochs}: soft cross-entropy {epoch_loss / len(Z):.4f}")
+
+        layers = list(zip(params[0::2], params[1::2]))
+        info = {'hidden_units': hidden_units, 'epochs': epochs, 'training_rows': int(len(Z))}
+        return cls(mean, scale, layers, classes, info)
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def _backward(params, Z, P):
+    """Gradients of mean soft cross-entropy for [W0, b0, (W1, b1)]"""
+    activations = [Z]
+    h = Z
+    for W, b in zip(params[0:-2:2], params[1:-2:2]):
+        h = np.maximum(h @ W + b, 0)
+        activations.append(h)
+    Q = _softmax(h @ params[-2] + params[-1])
+    loss = float(-np.sum(P * np.log(Q + 1e-12)) / len(Z))
+
+    grads = [None] * len(params)
+    delta = (Q - P) / len(Z)
+    for layer in range(len(params) // 2 - 1, -1, -1):
+        grads[2 * layer] = activations[layer].T @ delta
+        grads[2 * layer + 1] = delta.sum(axis=0)
+        if layer > 0:
+            delta = (delta @ params[2 * layer].T) * (activations[layer] > 0)
+    return grads, loss
+
+def augment_features(X: np.ndarray, copies: int = AUGMENT_COPIES, seed: int = 42) -> np.ndarray:
+    """Copies of X with resampled age and severity and jittered embeddings"""
+    rng = np.random.RandomState(seed)
+    X = np.asarray(X, dtype=np.float64)
+    embedding_std = X[:, 1:SEVERITY_COLUMN].std(axis=0)
+    severities = np.unique(X[:, SEVERITY_COLUMN])
+    age_low, age_high = X[:, AGE_COLUMN].min(), X[:, AGE_COLUMN].max()
+
+    augmented = []
+    for _ in range(copies):
+        copy = X.copy()
+        copy[:, AGE_COLUMN] = rng.randint(int(age_low), int(age_high) + 1, len(X))
+        copy[:, SEVERITY_COLUMN] = rng.choice(severities, len(X))
+        copy[:, 1:SEVERITY_COLUMN] += rng.normal(0, 1, (len(X), SEVERITY_COLUMN - 1)) * embedding_std * EMBEDDING_NOISE
+        augmented.append(copy)
+    return np.vstack(augmented)
+
+def median_latency_ms(predict, X, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def latency_report(name: str, predict, X_test: np.ndarray, size_bytes: int) -> Dict[str, Any]:
+    """Single-row and 512-row batch latency of one predictor"""
+    batch = X_test[:512]
+    predict(X_test[:1])
+    return {
+        'model': name,
+        'size_mb': round(size_bytes / (1024 * 1024), 3),
+        'single_row_ms': round(median_latency_ms(predict, X_test[:1], 200), 4),
+        f'batch_{len(batch)}_ms': round(median_latency_ms(predict, batch, 20), 3)
+    }
+
+def distill(teacher, X_train, X_test, y_test, gender_name: str, hidden_units: int = HIDDEN_UNITS,
+            augment_copies: int = AUGMENT_COPIES, epochs: int = EPOCHS, seed: int = 42):
+    """Fit a student to the teacher's soft outputs; returns (student, report)
+
+    The student is trained on the teacher's training rows plus augmented
+    copies and evaluated on the held-out test rows.
+    """
+    X_train = np.asarray(X_train, dtype=np.float64)
+    X_test = np.asarray(X_test, dtype=np.float64)
+
+    X_fit = np.vstack([X_train, augment_features(X_train, augment_copies, seed)]) if augment_copies else X_train
+    print(f"\nDistilling {gender_name} student ({hidden_units or 'linear'} hidden units) "
+          f"on {len(X_fit)} teacher-labelled rows...")
+    soft_targets = teacher.predict_proba(X_fit)
+    student = StudentModel.fit(X_fit, soft_targets, teacher.classes_, hidden_units=hidden_units,
+                               epochs=epochs, seed=seed)
+    student.info['augment_copies'] = augment_copies
+
+    teacher_proba = teacher.predict_proba(X_test)
+    student_proba = student.predict_proba(X_test)
+    teacher_pred = teacher.classes_.take(np.argmax(teacher_proba, axis=1))
+    student_pred = student.classes_.take(np.argmax(student_proba, axis=1))
+    teacher_top5 = np.argsort(teacher_proba, axis=1)[:, -5:]
+    student_top5 = np.argsort(student_proba, axis=1)[:, -5:]
+
+    report = {
+        'gender': gender_name,
+        'student_type': student.model_type,
+        'parameters': student.n_parameters(),
+        'training_rows': int(len(X_fit)),
+        'test_rows': int(len(X_test)),
+        'top1_agreement': float(np.mean(student_pred == teacher_pred)),
+        'top5_overlap': float(np.mean([len(set(a) & set(b)) / 5 for a, b in zip(teacher_top5, student_top5)])),
+        'mean_total_variation': float(np.mean(0.5 * np.abs(teacher_proba - student_proba).sum(axis=1))),
+        'teacher_accuracy': float(np.mean(teacher_pred == y_test)),
+        'student_accuracy': float(np.mean(student_pred == y_test)),
+        'latency': [
+            latency_report('RandomForest (sklearn)', teacher.predict_proba, X_test, len(pickle.dumps(teacher))),
+            latency_report(student.model_type, student.predict_proba, X_test,
+                           sum(W.nbytes + b.nbytes for W, b in student.layers))
+        ]
+    }
+    try:
+        from forest_engine import CompiledForest
+        engine = CompiledForest.from_sklearn(teacher)
+        engine_bytes = sum(array.nbytes for array in [engine.feature, engine.threshold, engine.children,
+                                                      engine.leaf_values, engine.roots])
+        report['latency'].insert(1, latency_report('RandomForest (compiled)', engine.predict_proba, X_test,
+                                                   engine_bytes))
+    except TypeError:
+        pass
+
+    print(f"{gender_name} student: top-1 agreement {report['top1_agreement']:.1%}, "
+          f"accuracy {report['student_accuracy']:.1%} (teacher {report['teacher_accuracy']:.1%})")
+    for row in report['latency']:
+        print(f"  {row['model']:<28} {row['size_mb']:>9.2f} MB  single row {row['single_row_ms']:.3f} ms")
+    return student, report
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Symptom Encoder Loading for MediConnect
+Builds the all-MiniLM-L6-v2 sentence encoder for training and serving, either
+as the stock float32 model or with torch dynamic int8 quantization applied to
+its linear layers (faster on CPU-only nodes, smaller resident model)
+"""
+import io
+import logging
+from typing import Any, Dict
+
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# Supported encoder backends
+ENCODER_BACKENDS = ['float32', 'int8']
+
+def load_symptom_encoder(backend: str = 'float32') -> SentenceTransformer:
+    """Load the symptom encoder with the requested backend"""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Invalid encoder backend: {backend}. Must be one of {ENCODER_BACKENDS}")
+
+    encoder = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')
+
+    if backend == 'int8':
+        import torch
+        # Quantize weights of every nn.Linear to int8; activations are
+        # quantized on the fly, so no calibration data is needed
+        encoder = torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("OK - Applied dynamic int8 quantization to encoder linear layers")
+
+    encoder.eval()
+    return encoder
+
+def encoder_info(backend: str) -> Dict[str, Any]:
+    """Encoder description recorded in *_model_info_embedding.json"""
+    return {
+        'embedding_model': EMBEDDING_MODEL_NAME,
+        'encoder_backend': backend,
+        'encoder_quantization': 'torch dynamic int8 (nn.Linear)' if backend == 'int8' else None
+    }
+
+def encoder_version(backend: str) -> str:
+    """Everything besides the model name that changes the encoder's output (embedding store keys)"""
+    import sentence_transformers
+    import torch
+    return f"{backend}; sentence-transformers {sentence_transformers.__version__}; torch {torch.__version__}"
+
+def encoder_size_bytes(encoder: SentenceTransformer) -> int:
+    """Serialized size of the encoder's weights"""
+    import torch
+    buffer = io.BytesIO()
+    torch.save(encoder.state_dict(), buffer)
+    return buffer.tell()
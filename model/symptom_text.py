@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Canonical Symptom Text for MediConnect
+Shared by train_embedding_models.py and gender_ai_service_embedding.py so that
+training rows and live requests embed exactly the same string
+"""
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+# Text used when a case has no usable symptoms
+NO_SYMPTOMS_TEXT = "no symptoms"
+
+# Recorded in model info so serving can tell which text form a model was trained on
+CANONICALIZATION_VERSION = "sorted-unique-v1"
+
+def canonical_symptom_text(symptoms: Union[str, Iterable]) -> str:
+    """Build order-invariant symptom text
+
+    Accepts a comma-separated string or an iterable of symptom values
+    (e.g. the symptom1..symptom6 columns of a row). Tokens are lowercased,
+    trimmed, whitespace-collapsed, deduplicated and sorted, so
+    "Cough, fever" and "fever, cough, fever" both become "cough, fever".
+    """
+    if isinstance(symptoms, str):
+        symptoms = symptoms.split(',')
+
+    tokens = set()
+    for symptom in symptoms:
+        if symptom is None:
+            continue
+        token = ' '.join(str(symptom).lower().split())
+        if token and token != 'nan':
+            tokens.add(token)
+
+    if not tokens:
+        return NO_SYMPTOMS_TEXT
+    return ", ".join(sorted(tokens))
+
+def canonical_symptom_texts(columns, return_inverse: bool = False):
+    """Vectorized canonical_symptom_text over parallel symptom columns
+
+    columns are equal-length sequences such as df['symptom1'] ..
+    df['symptom6']; element i of the result equals
+    canonical_symptom_text(column[i] for column in columns), each cell
+    being one token as in the row-wise form. Cells are mapped to ids in a
+    sorted token vocabulary, so sorting and deduplicating a row is integer
+    work, and strings are only joined once per distinct row. With
+    return_inverse, returns (distinct texts, index of each row's text).
+    """
+    # Clean each column's distinct values only
+    factorized = []
+    for column in columns:
+        codes, values = pd.factorize(pd.Series(np.asarray(column, dtype=object)))
+        factorized.append((codes, [' '.join(str(value).lower().split()) for value in values]))
+
+    vocabulary = sorted({token for _, cleaned in factorized for token in cleaned if token and token != 'nan'})
+    token_ids = {token: i for i, token in enumerate(vocabulary)}
+
+    # -1 marks an empty cell (missing values get code -1 from factorize)
+    ids = np.empty((len(factorized[0][0]), len(factorized)), dtype=np.int32)
+    for j, (codes, cleaned) in enumerate(factorized):
+        lookup = np.array([token_ids.get(token, -1) for token in cleaned] + [-1], dtype=np.int32)
+        ids[:, j] = lookup[codes]
+
+    # Sorted ids are sorted tokens; blank out repeats of the previous token, then
+    # sort again so rows with the same tokens but different repeats share a key
+    ids.sort(axis=1)
+    ids[:, 1:][ids[:, 1:] == ids[:, :-1]] = -1
+    ids.sort(axis=1)
+
+    # One int64 key per row (mixed radix over the ids) unless the vocabulary is too large
+    radix = len(vocabulary) + 1
+    if radix ** ids.shape[1] < 2 ** 63:
+        keys = (ids + 1).astype(np.int64) @ (radix ** np.arange(ids.shape[1] - 1, -1, -1, dtype=np.int64))
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        rows = ids[first]
+    else:
+        rows, inverse = np.unique(ids, axis=0, return_inverse=True)
+    texts = np.array([", ".join(vocabulary[i] for i in row if i >= 0) or NO_SYMPTOMS_TEXT for row in rows])
+    inverse = inverse.ravel()
+    if return_inverse:
+        return texts, inverse
+    return texts[inverse]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the nearest-neighbour case retrieval engine
+Checks that the blocked top-k search returns exactly the brute-force nearest
+cases, that voting gives valid probabilities, and that an index memory-mapped
+back from disk answers the same way
+"""
+import tempfile
+import numpy as np
+import case_retrieval
+from case_retrieval import CaseIndex, normalize_rows
+
+N_CASES = 5000
+N_CLASSES = 12
+
+def build_index(seed=0):
+    """Random unit embeddings with a class per case"""
+    rng = np.random.RandomState(seed)
+    return CaseIndex.build(
+        embeddings=rng.normal(size=(N_CASES, 384)),
+        labels=rng.randint(0, N_CLASSES, N_CASES),
+        ages=rng.randint(1, 90, N_CASES),
+        severities=rng.choice(['low', 'medium', 'high'], N_CASES),
+        symptoms=[f'symptom {i}' for i in range(N_CASES)],
+        classes=np.arange(N_CLASSES)
+    ), rng
+
+def test_blocked_search_matches_brute_force():
+    """Top-k over blocks smaller than k, not dividing N_CASES, equals a full sort"""
+    index, rng = build_index()
+    queries = rng.normal(size=(40, 384))
+    similarities = normalize_rows(queries) @ np.asarray(index.embeddings).T
+    expected = np.sort(similarities, axis=1)[:, ::-1][:, :25]
+
+    block_rows = case_retrieval.BLOCK_ROWS
+    try:
+        for case_retrieval.BLOCK_ROWS in [7, 333, 4096, N_CASES, 65536]:
+            neighbours, found = index.search(queries, 25)
+            np.testing.assert_allclose(found, expected, rtol=0, atol=1e-6)
+            np.testing.assert_allclose(np.take_along_axis(similarities, neighbours, axis=1), found, rtol=0, atol=1e-6)
+    finally:
+        case_retrieval.BLOCK_ROWS = block_rows
+
+def test_stored_case_is_its_own_nearest_neighbour():
+    index, _ = build_index()
+    features = np.zeros((10, 387))
+    features[:, 1:385] = index.embeddings[:10] * 3.0
+
+    predictions, probabilities, neighbours, similarities = index.classify(features)
+    np.testing.assert_array_equal(neighbours[:, 0], np.arange(10))
+    np.testing.assert_allclose(similarities[:, 0], 1.0, atol=1e-5)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+    np.testing.assert_array_equal(predictions, np.argmax(probabilities, axis=1))
+
+def test_mmap_index_matches():
+    """Index saved as .npy files and memory-mapped back gives the same answers"""
+    index, rng = build_index()
+    features = np.zeros((20, 387))
+    features[:, 1:385] = rng.normal(size=(20, 384))
+
+    with tempfile.TemporaryDirectory() as directory:
+        index.save(directory)
+        loaded = CaseIndex.load(directory, mmap_mode='r')
+        assert isinstance(loaded.embeddings, np.memmap)
+
+        predictions, probabilities = loaded.predict_with_proba(features)
+        expected_predictions, expected_probabilities = index.predict_with_proba(features)
+        np.testing.assert_array_equal(predictions, expected_predictions)
+        np.testing.assert_allclose(probabilities, expected_probabilities, rtol=0, atol=1e-12)
+
+        _, _, neighbours, similarities = loaded.classify(features[:1])
+        case = loaded.describe_cases(neighbours[:, :1], similarities[:, :1], [f'disease {i}' for i in range(N_CLASSES)])[0][0]
+        assert case['symptoms'] == f'symptom {neighbours[0, 0]}'
+        assert case['severity'] in ['low', 'medium', 'high']
+
+if __name__ == "__main__":
+    print("Testing nearest-neighbour case retrieval...")
+    test_blocked_search_matches_brute_force()
+    print("OK - Blocked top-k search matches brute force")
+    test_stored_case_is_its_own_nearest_neighbour()
+    print("OK - Stored cases retrieve themselves first")
+    test_mmap_index_matches()
+    print("OK - Memory-mapped index matches")
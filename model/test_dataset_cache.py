@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the typed columnar dataset cache
+Checks that cached loads give the same values as pd.read_csv and that an
+entry is rebuilt when its source file changes
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import cache_entry_dir, read_dataset
+
+ROWS = [
+    ['Influenza', 34, 'Fever', 'Cough ', 'headache', None, None, None, 'Medium', 'Both'],
+    ['Migraine', 27, 'headache', 'nausea', None, None, None, None, 'high', 'both'],
+    ['Influenza', 61, 'fever', 'fatigue', 'cough', 'chills', None, None, 'medium', 'both'],
+    ['Menstrual cramps', 19, 'abdominal pain', None, None, None, None, None, 'low', 'female']
+]
+COLUMNS = ['disease', 'age', 'symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6',
+           'severity', 'gender_specific']
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+
+def test_cached_load_matches_read_csv():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dataset.csv')
+        cache_dir = os.path.join(directory, 'cache')
+        write_csv(path, ROWS)
+        expected = pd.read_csv(path, delimiter=';', encoding='utf-8-sig')
+
+        read_dataset(path, cache_dir=cache_dir)
+        df = read_dataset(path, cache_dir=cache_dir)
+        assert list(df.columns) == list(expected.columns)
+        assert df['age'].dtype == np.int8
+        assert isinstance(df['disease'].dtype, pd.CategoricalDtype)
+        assert list(df['symptom1'].cat.categories) == list(df['symptom3'].cat.categories)
+        for column in expected.columns:
+            assert df[column].astype(object).where(df[column].notna(), None).tolist() == \
+                expected[column].astype(object).where(expected[column].notna(), None).tolist(), column
+        assert df['symptom2'].fillna('').str.lower().str.strip().tolist() == \
+            expected['symptom2'].fillna('').str.lower().str.strip().tolist()
+
+def test_cache_rebuilt_when_source_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dataset.csv')
+        cache_dir = os.path.join(directory, 'cache')
+        write_csv(path, ROWS)
+        assert len(read_dataset(path, cache_dir=cache_dir)) == 4
+        assert os.path.exists(os.path.join(cache_entry_dir(path, cache_dir), 'dataset.json'))
+
+        write_csv(path, ROWS + [['Migraine', 300, 'aura', None, None, None, None, None, 'high', 'both']])
+        df = read_dataset(path, cache_dir=cache_dir)
+        assert len(df) == 5
+        assert df['age'].dtype == np.int16
+        assert df['symptom1'].iloc[-1] == 'aura'
+
+if __name__ == "__main__":
+    print("Testing typed columnar dataset cache...")
+    test_cached_load_matches_read_csv()
+    print("OK - Cached load matches pd.read_csv")
+    test_cache_rebuilt_when_source_changes()
+    print("OK - Cache rebuilt when the source changes")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent embedding store
+Checks that stored rows come back under their keys, including after an
+append that died part-way through writing
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, content_key
+
+DIM = 4
+
+def key(text):
+    return content_key('encoder', 'v1', text)
+
+def embedding(seed):
+    return np.random.default_rng(seed).random((1, DIM), dtype=np.float32)
+
+def test_rows_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore(directory, dim=DIM)
+        store.append([key('fever'), key('cough')], np.vstack([embedding(0), embedding(1)]), 0.1)
+        reopened = EmbeddingStore(directory, dim=DIM)
+        assert np.array_equal(reopened.get([key('cough'), key('fever')]), np.vstack([embedding(1), embedding(0)]))
+
+def test_append_after_torn_write():
+    """A partial key line and its orphan row are dropped before the next append"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = EmbeddingStore(directory, dim=DIM)
+        store.append([key('fever')], embedding(0), 0.1)
+
+        # An append that wrote its row and half its key, then died
+        with open(store.data_path, 'ab') as f:
+            embedding(1).tofile(f)
+        with open(store.keys_path, 'a') as f:
+            f.write(key('cough')[:17])
+
+        store = EmbeddingStore(directory, dim=DIM)
+        assert len(store) == 1
+        store.append([key('headache')], embedding(2), 0.1)
+
+        reopened = EmbeddingStore(directory, dim=DIM)
+        assert len(reopened) == reopened.n_rows == 2
+        assert os.path.getsize(reopened.data_path) == 2 * DIM * 4
+        assert np.array_equal(reopened.get([key('fever'), key('headache')]), np.vstack([embedding(0), embedding(2)]))
+
+if __name__ == "__main__":
+    print("Testing embedding store...")
+    test_rows_round_trip()
+    print("OK - Rows round trip")
+    test_append_after_torn_write()
+    print("OK - Append after a torn write")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Parity test: compiled NumPy forest engine vs sklearn RandomForestClassifier
+Trains a forest on medical_training_dataset_clean.csv and checks that
+forest_engine.CompiledForest reproduces predict and predict_proba, also when
+loaded back from memory-mapped .npy sidecars
+"""
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from forest_engine import CompiledForest
+
+def load_clean_features():
+    """Label-encode the clean dataset the same way train_gender_models.py does"""
+    df = pd.read_csv('medical_training_dataset_clean.csv', encoding='utf-8-sig')
+
+    symptom_cols = ['symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6']
+    for col in symptom_cols + ['severity', 'gender_specific']:
+        df[col] = df[col].fillna('').astype(str).str.lower().str.strip()
+
+    X = df[['age'] + symptom_cols + ['severity', 'gender_specific']].copy()
+    for col in symptom_cols + ['severity', 'gender_specific']:
+        X[col] = LabelEncoder().fit_transform(X[col])
+    y = LabelEncoder().fit_transform(df['disease'])
+
+    return train_test_split(X.to_numpy(dtype=np.float64), y, test_size=0.2, random_state=42, stratify=y)
+
+def check_parity(model, X_test):
+    """Compare compiled and sklearn outputs for batches and single rows"""
+    engine = CompiledForest.from_sklearn(model)
+
+    predictions, probabilities = engine.predict_with_proba(X_test)
+    assert probabilities.shape == (len(X_test), len(model.classes_))
+    np.testing.assert_allclose(probabilities, model.predict_proba(X_test), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(predictions, model.predict(X_test))
+
+    for row in X_test[:25]:
+        prediction, row_probabilities = engine.predict_with_proba(row)
+        np.testing.assert_allclose(row_probabilities[0], model.predict_proba(row.reshape(1, -1))[0], rtol=0, atol=1e-12)
+        assert prediction[0] == model.predict(row.reshape(1, -1))[0]
+
+    return engine
+
+def test_parity_regularized_forest():
+    """Same regularization as train_embedding_models.train_model"""
+    X_train, X_test, y_train, _ = load_clean_features()
+    model = RandomForestClassifier(
+        n_estimators=100, max_depth=15, min_samples_split=10, min_samples_leaf=5,
+        max_features='sqrt', random_state=42, class_weight='balanced', n_jobs=-1
+    )
+    model.fit(X_train, y_train)
+    check_parity(model, X_test)
+
+def test_parity_deep_forest():
+    """Deep, unregularized trees as in train_gender_models.train_model"""
+    X_train, X_test, y_train, _ = load_clean_features()
+    model = RandomForestClassifier(n_estimators=30, random_state=42, class_weight='balanced', n_jobs=-1)
+    model.fit(X_train, y_train)
+    check_parity(model, X_test)
+
+def test_parity_float32_threshold_boundaries():
+    """Inputs sitting exactly on float32 neighbours of the split thresholds"""
+    X_train, _, y_train, _ = load_clean_features()
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X_train, y_train)
+    engine = CompiledForest.from_sklearn(model)
+
+    tree = model.estimators_[0].tree_
+    split_nodes = np.where(tree.feature >= 0)[0][:50]
+    X_edge = np.repeat(X_train[:1].astype(np.float32), 2 * len(split_nodes), axis=0)
+    for i, node in enumerate(split_nodes):
+        below = np.float32(tree.threshold[node])
+        X_edge[2 * i, tree.feature[node]] = below
+        X_edge[2 * i + 1, tree.feature[node]] = np.nextafter(below, np.float32(np.inf))
+
+    np.testing.assert_allclose(engine.predict_proba(X_edge), model.predict_proba(X_edge), rtol=0, atol=1e-12)
+
+def test_parity_mmap_sidecars():
+    """Engine saved to .npy sidecars and memory-mapped back still matches sklearn"""
+    X_train, X_test, y_train, _ = load_clean_features()
+    model = RandomForestClassifier(n_estimators=20, max_depth=15, random_state=42).fit(X_train, y_train)
+
+    with tempfile.TemporaryDirectory() as directory:
+        CompiledForest.from_sklearn(model).save(directory)
+        engine = CompiledForest.load(directory, mmap_mode='r')
+        assert isinstance(engine.threshold, np.memmap)
+
+        predictions, probabilities = engine.predict_with_proba(X_test)
+        np.testing.assert_allclose(probabilities, model.predict_proba(X_test), rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(predictions, model.predict(X_test))
+
+if __name__ == "__main__":
+    print("Testing compiled forest engine parity with sklearn...")
+    test_parity_regularized_forest()
+    print("OK - Regularized forest matches sklearn")
+    test_parity_deep_forest()
+    print("OK - Deep forest matches sklearn")
+    test_parity_float32_threshold_boundaries()
+    print("OK - Threshold boundary inputs match sklearn")
+    test_parity_mmap_sidecars()
+    print("OK - Memory-mapped sidecars match sklearn")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the forest hyperparameter search
+Checks the successive-halving schedule and the Pareto layering of candidates
+"""
+from forest_search import halving_schedule, pareto_layers, sample_candidates, select_configuration, BASELINES
+
+def candidate(macro_f1, single_row_ms, batch_ms_per_row=0.1, size_mb=1.0):
+    return {'macro_f1': macro_f1, 'single_row_ms': single_row_ms, 'batch_ms_per_row': batch_ms_per_row,
+            'size_mb': size_mb}
+
+def test_halving_schedule():
+    """Candidates halve down to the final count while training rows double up to all of them"""
+    assert halving_schedule(32, 2, 8, 10000) == [(32, 2500), (16, 5000), (8, 10000)]
+    assert halving_schedule(27, 3, 3, 900) == [(27, 100), (9, 300), (3, 900)]
+    assert halving_schedule(5, 2, 8, 1000) == [(5, 1000)]
+
+def test_pareto_layers():
+    rows = [
+        candidate(0.90, 10.0),   # best F1
+        candidate(0.80, 2.0),    # fastest
+        candidate(0.80, 5.0),    # dominated by the fastest
+        candidate(0.70, 6.0),    # dominated by both of the above
+        candidate(0.85, 4.0, size_mb=0.5)
+    ]
+    assert pareto_layers(rows) == [0, 0, 1, 2, 0]
+
+    front = [row for row, layer in zip(rows, pareto_layers(rows)) if layer == 0]
+    assert select_configuration(front, f1_tolerance=0.01) is rows[0]
+    assert select_configuration(front, f1_tolerance=0.06) is rows[4]
+
+def test_sample_candidates_starts_with_baseline():
+    baseline = BASELINES['train_embedding_models']
+    candidates = sample_candidates(16, baseline)
+    assert candidates[0] == baseline
+    assert len(candidates) == 16
+    assert len({tuple(sorted(c.items(), key=str)) for c in candidates}) == 16
+
+if __name__ == "__main__":
+    print("Testing forest hyperparameter search...")
+    test_halving_schedule()
+    print("OK - Successive-halving schedule")
+    test_pareto_layers()
+    print("OK - Pareto layers and selection")
+    test_sample_candidates_starts_with_baseline()
+    print("OK - Candidate sampling")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for canonical symptom text
+Checks that the vectorized column-wise form matches the row-wise one and
+gives each distinct text once
+"""
+import numpy as np
+
+from symptom_text import canonical_symptom_text, canonical_symptom_texts
+
+ROWS = [
+    ['Fever', 'cough', None],
+    ['cough', ' fever ', 'Fever'],
+    ['headache', 'headache', 'nausea'],
+    ['headache', 'nausea', 'nausea'],
+    [None, '', None],
+    ['nausea', None, 'Headache']
+]
+
+def test_matches_row_wise_text():
+    columns = [[row[j] for row in ROWS] for j in range(3)]
+    expected = [canonical_symptom_text(row) for row in ROWS]
+    assert list(canonical_symptom_texts(columns)) == expected
+
+def test_repeated_symptoms_share_one_distinct_text():
+    """[a, a, b] and [a, b, b] are the same text and are encoded once"""
+    columns = [['a', 'a', 'a', 'b'], ['a', 'a', 'b', 'b'], ['b', None, 'b', None]]
+    texts, inverse = canonical_symptom_texts(columns, return_inverse=True)
+    assert sorted(texts) == ['a', 'a, b', 'b']
+    assert list(texts[inverse]) == ['a, b', 'a', 'a, b', 'b']
+
+    columns = [[row[j] for row in ROWS] for j in range(3)]
+    texts, inverse = canonical_symptom_texts(columns, return_inverse=True)
+    assert len(texts) == len(set(texts)) == 3
+    assert inverse[0] == inverse[1]
+    assert inverse[2] == inverse[3] == inverse[5]
+
+if __name__ == "__main__":
+    print("Testing canonical symptom text...")
+    test_matches_row_wise_text()
+    print("OK - Vectorized text matches row-wise text")
+    test_repeated_symptoms_share_one_distinct_text()
+    print("OK - Repeated symptoms share one distinct text")
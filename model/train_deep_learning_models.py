@@ -12,6 +12,8 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 import joblib
 import json
+from dataset_cache import read_dataset
+from training_orchestrator import TRAINING_MODE, record_run, run_gender_jobs
 
 print("="*70)
 print("DEEP LEARNING MODEL TRAINING FOR MEDICONNECT")
@@ -275,26 +277,34 @@ def train_model(gender, df):
 
     return model, encoders, history
 
-# Main execution
-if __name__ == '__main__':
-    # Load datasets
-    print("\nLoading augmented datasets...")
-    df_male = pd.read_csv('medical_training_dataset_male_augmented.csv', delimiter=';', encoding='utf-8-sig')
-    df_female = pd.read_csv('medical_training_dataset_female_augmented.csv', delimiter=';', encoding='utf-8-sig')
+def train_gender(gender, n_jobs=None):
+    """Load one gender's augmented dataset and train its model; returns the saved model info
 
-    print(f"Male dataset: {len(df_male)} rows, {df_male['disease'].nunique()} diseases")
-    print(f"Female dataset: {len(df_female)} rows, {df_female['disease'].nunique()} diseases")
+    Run by training_orchestrator.run_gender_jobs in a spawned process, where
+    TensorFlow's runtime has not started yet, so its thread pools are capped
+    at this job's share of the cores.
+    """
+    df = read_dataset(f'medical_training_dataset_{gender.lower()}_augmented.csv')
+    print(f"{gender} dataset: {len(df)} rows, {df['disease'].nunique()} diseases")
 
-    # Train male model
-    male_model, male_encoders, male_history = train_model('Male', df_male)
+    train_model(gender, df)
+    with open(f'{gender.lower()}_model_info_dl.json', 'r') as f:
+        return json.load(f)
 
-    # Train female model
-    female_model, female_encoders, female_history = train_model('Female', df_female)
+# Main execution
+if __name__ == '__main__':
+    # Train both genders, in parallel processes unless TRAINING_MODE=sequential.
+    # Spawned rather than forked: TensorFlow does not survive a fork.
+    print("\nLoading augmented datasets...")
+    results, timing = run_gender_jobs(train_gender, TRAINING_MODE, start_method='spawn')
+    record_run('train_deep_learning_models', timing)
 
     print("\n" + "="*70)
     print("SUCCESS: DEEP LEARNING MODEL TRAINING COMPLETED!")
     print("="*70)
+    for gender, model_info in results.items():
+        print(f"{gender} test accuracy: {model_info['test_accuracy']:.4f}")
     print("\nModels saved:")
     print("- male_medical_model_dl.keras")
     print("- female_medical_model_dl.keras")
-    print("- Corresponding encoders and metadata files")
\ No newline at end of file
+    print("- Corresponding encoders and metadata files")
@@ -9,70 +9,95 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix, f1_score
-from sentence_transformers import SentenceTransformer
 import joblib
+import os
 import warnings
 import json
+from symptom_text import canonical_symptom_text, canonical_symptom_texts, CANONICALIZATION_VERSION
+from symptom_encoder import EMBEDDING_MODEL_NAME, load_symptom_encoder, encoder_info, encoder_version
+from forest_engine import CompiledForest, sidecar_dir
+from disease_metadata import DiseaseMetadata
+from student_model import distill, student_path
+from case_retrieval import CaseIndex, case_index_dir, compare_with_forest
+from embedding_store import EmbeddingStore
+from dataset_cache import read_dataset
+from training_orchestrator import TRAINING_MODE, record_run, run_gender_jobs
 warnings.filterwarnings('ignore')
 
+# Encoder backend: 'float32' or 'int8' (dynamic quantization). Serving reads the
+# backend back from the saved model info so both sides embed the same way.
+ENCODER_BACKEND = os.environ.get('ENCODER_BACKEND', 'float32')
+
 # Load the sentence transformer model
-print("Loading all-MiniLM-L6-v2 model...")
-embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+print(f"Loading all-MiniLM-L6-v2 model ({ENCODER_BACKEND} backend)...")
+embedding_model = load_symptom_encoder(ENCODER_BACKEND)
 print("OK - Embedding model loaded (384 dimensions)")
 
-def load_gender_datasets():
-    """Load both male and female datasets"""
-    print("\nLoading AUGMENTED gender-specific medical datasets...")
+# On-disk embedding cache shared by training runs; set to '' to always encode everything
+EMBEDDING_STORE_DIR = os.environ.get('EMBEDDING_STORE_DIR', 'training_embedding_store')
+
+# Rows of the feature matrix filled per step, bounding the gathered embedding copy
+FEATURE_CHUNK_ROWS = 65536
 
-    # Load male dataset
-    df_male = pd.read_csv('medical_training_dataset_male_augmented.csv', delimiter=';', encoding='utf-8-sig')
-    print(f"Male dataset: {len(df_male)} rows, {df_male['disease'].nunique()} diseases")
+# Distilled student size: hidden units of the MLP student, 0 for a linear student
+STUDENT_HIDDEN_UNITS = int(os.environ.get('STUDENT_HIDDEN_UNITS', '256'))
+DISTILLATION_REPORT_FILE = 'distillation_report.json'
+RETRIEVAL_REPORT_FILE = 'retrieval_report.json'
 
-    # Load female dataset
-    df_female = pd.read_csv('medical_training_dataset_female_augmented.csv', delimiter=';', encoding='utf-8-sig')
-    print(f"Female dataset: {len(df_female)} rows, {df_female['disease'].nunique()} diseases")
+def load_gender_dataset(gender_name):
+    """Load one gender's augmented dataset"""
+    df = read_dataset(f'medical_training_dataset_{gender_name.lower()}_augmented.csv')
+    print(f"{gender_name} dataset: {len(df)} rows, {df['disease'].nunique()} diseases")
+    return df
 
-    return df_male, df_female
+def load_gender_datasets():
+    """Load both male and female datasets"""
+    print("\nLoading AUGMENTED gender-specific medical datasets...")
+    return load_gender_dataset('Male'), load_gender_dataset('Female')
 
 def create_symptom_text(row):
-    """Convert symptom columns into a single text string for embedding"""
+    """Convert symptom columns into a single canonical text string for embedding"""
     symptom_cols = ['symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6']
-    symptoms = []
-    for col in symptom_cols:
-        symptom = str(row[col]).strip().lower()
-        if symptom and symptom != 'nan' and symptom != '':
-            symptoms.append(symptom)
-
-    # Create natural language text
-    if symptoms:
-        return ", ".join(symptoms)
-    else:
-        return "no symptoms"
 
-def prepare_embedding_features(df, gender_name):
-    """Prepare features using embeddings for symptoms"""
+    # Deduped, trimmed and sorted so symptom order does not change the embedding
+    return canonical_symptom_text(row[col] for col in symptom_cols)
+
+def prepare_embedding_features(df, gender_name, encoder=None, encoder_backend=ENCODER_BACKEND):
+    """Prepare features using embeddings for symptoms
+
+    Symptom texts are canonicalized column-wise and each distinct text is
+    embedded once. Features are one contiguous float32 matrix
+    [age, embeddings (384), severity, gender]; the forest trains on float32
+    anyway, so this is the array it would have converted to.
+    encoder_backend must describe the encoder, since it keys the embedding
+    store. Returns (X, y, encoders, embedding store stats or None).
+    """
     print(f"\nPreparing embedding features for {gender_name} model...")
+    encoder = encoder if encoder is not None else embedding_model
 
     # Normalize data
     symptom_cols = ['symptom1', 'symptom2', 'symptom3', 'symptom4', 'symptom5', 'symptom6']
-    for col in symptom_cols:
-        df[col] = df[col].fillna('').str.lower().str.strip()
-
     df['severity'] = df['severity'].str.lower().str.strip()
     df['gender_specific'] = df['gender_specific'].str.lower().str.strip()
 
     # Create symptom text for embeddings
     print(f"Creating symptom embeddings for {len(df)} samples...")
-    df['symptom_text'] = df.apply(create_symptom_text, axis=1)
-
-    # Get embeddings (batch processing for speed)
-    symptom_texts = df['symptom_text'].tolist()
-    symptom_embeddings = embedding_model.encode(symptom_texts, show_progress_bar=True, batch_size=32)
-    print(f"OK - Generated {len(symptom_embeddings)} embeddings of dimension {symptom_embeddings.shape[1]}")
-
-    # Create DataFrame with embeddings
-    embedding_cols = [f'emb_{i}' for i in range(symptom_embeddings.shape[1])]
-    df_embeddings = pd.DataFrame(symptom_embeddings, columns=embedding_cols, index=df.index)
+    distinct_texts, text_rows = canonical_symptom_texts([df[col] for col in symptom_cols], return_inverse=True)
+    df['symptom_text'] = distinct_texts[text_rows]
+    print(f"{gender_name} distinct canonical symptom texts: {len(distinct_texts)}")
+
+    # Get embeddings for the distinct texts only (batch processing for speed)
+    store_stats = None
+    if EMBEDDING_STORE_DIR:
+        distinct_embeddings, store_stats = EmbeddingStore(EMBEDDING_STORE_DIR).encode(
+            encoder, distinct_texts.tolist(), EMBEDDING_MODEL_NAME, encoder_version(encoder_backend),
+            show_progress_bar=True, batch_size=32)
+        print(f"Embedding store: {store_stats['cache_hits']} cached, {store_stats['cache_misses']} encoded "
+              f"of {store_stats['distinct_texts']} distinct texts ({store_stats['encode_seconds']:.1f}s encoding)")
+    else:
+        distinct_embeddings = encoder.encode(distinct_texts.tolist(), show_progress_bar=True, batch_size=32)
+    embedding_dim = distinct_embeddings.shape[1]
+    print(f"OK - Generated {len(distinct_embeddings)} embeddings of dimension {embedding_dim}")
 
     # Encode categorical features
     severity_encoder = LabelEncoder()
@@ -82,17 +107,18 @@ def prepare_embedding_features(df, gender_name):
     gender_encoded = gender_encoder.fit_transform(df['gender_specific'])
 
     # Combine all features: [age, embeddings (384), severity (1), gender (1)]
-    X = pd.DataFrame({
-        'age': df['age'].values,
-        **{col: df_embeddings[col].values for col in embedding_cols},
-        'severity': severity_encoded,
-        'gender': gender_encoded
-    })
+    X = np.empty((len(df), embedding_dim + 3), dtype=np.float32)
+    X[:, 0] = df['age'].to_numpy()
+    for start in range(0, len(df), FEATURE_CHUNK_ROWS):
+        rows = text_rows[start:start + FEATURE_CHUNK_ROWS]
+        X[start:start + len(rows), 1:embedding_dim + 1] = distinct_embeddings[rows]
+    X[:, embedding_dim + 1] = severity_encoded
+    X[:, embedding_dim + 2] = gender_encoded
 
     y = df['disease'].copy()
 
     print(f"{gender_name} feature shape: {X.shape}")
-    print(f"{gender_name} features: age (1) + embeddings ({symptom_embeddings.shape[1]}) + severity (1) + gender (1) = {X.shape[1]} total")
+    print(f"{gender_name} features: age (1) + embeddings ({embedding_dim}) + severity (1) + gender (1) = {X.shape[1]} total")
     print(f"{gender_name} target classes: {y.nunique()}")
 
     encoders = {
@@ -100,9 +126,9 @@ def prepare_embedding_features(df, gender_name):
         'gender': gender_encoder
     }
 
-    return X, y, encoders
+    return X, y, encoders, store_stats
 
-def train_model(X, y, gender_name):
+def train_model(X, y, gender_name, n_jobs=-1):
     """Train RandomForest with regularization to prevent overfitting"""
     print(f"\nTraining {gender_name} model with regularization...")
 
@@ -115,9 +141,12 @@ def train_model(X, y, gender_name):
     y_encoded = disease_encoder.fit_transform(y)
 
     # Split data with stratification
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+    # Split row positions (same split as splitting X directly) so callers can map back to df
+    train_rows, test_rows = train_test_split(
+        np.arange(len(X)), test_size=0.2, random_state=42, stratify=y_encoded
     )
+    X_train, X_test = X[train_rows], X[test_rows]
+    y_train, y_test = y_encoded[train_rows], y_encoded[test_rows]
 
     print(f"{gender_name} training set: {X_train.shape[0]} samples")
     print(f"{gender_name} test set: {X_test.shape[0]} samples")
@@ -131,7 +160,7 @@ def train_model(X, y, gender_name):
         max_features='sqrt',        # Use sqrt of features instead of all
         random_state=42,
         class_weight='balanced',
-        n_jobs=-1
+        n_jobs=n_jobs
     )
 
     print(f"Training {gender_name} RandomForest with regularization...")
@@ -168,9 +197,21 @@ def train_model(X, y, gender_name):
     for idx in top_indices:
         print(f"  {feature_names[idx]}: {importances[idx]:.4f}")
 
-    return model, disease_encoder, X_test, y_test, test_pred
+    return model, disease_encoder, X_train, y_train, X_test, y_test, train_rows
+
+def build_case_index(df, X_train, y_train, train_rows, encoders, disease_encoder):
+    """Nearest-neighbour index over the training split's symptom embeddings"""
+    return CaseIndex.build(
+        embeddings=X_train[:, 1:385],
+        labels=y_train,
+        ages=X_train[:, 0],
+        severities=encoders['severity'].inverse_transform(X_train[:, 385].astype(int)),
+        symptoms=df['symptom_text'].to_numpy()[train_rows],
+        classes=np.arange(len(disease_encoder.classes_))
+    )
 
-def save_embedding_model(model, disease_encoder, encoders, gender_name):
+def save_embedding_model(model, disease_encoder, encoders, gender_name, student=None, case_index=None,
+                         embedding_store_stats=None):
     """Save the embedding-based model"""
     print(f"\nSaving {gender_name} embedding-based model...")
 
@@ -181,6 +222,11 @@ def save_embedding_model(model, disease_encoder, encoders, gender_name):
     joblib.dump(model, model_filename)
     print(f"OK - Saved {model_filename}")
 
+    # Save memory-mappable forest arrays for the compiled inference backend
+    arrays_dir = sidecar_dir(model_filename)
+    CompiledForest.from_sklearn(model).save(arrays_dir)
+    print(f"OK - Saved {arrays_dir}/")
+
     # Save disease encoder
     disease_filename = f'{gender_lower}_disease_classes_embedding.pkl'
     joblib.dump(disease_encoder.classes_, disease_filename)
@@ -194,9 +240,10 @@ def save_embedding_model(model, disease_encoder, encoders, gender_name):
     # Save model info
     model_info = {
         'model_type': 'RandomForest + all-MiniLM-L6-v2 Embeddings',
-        'embedding_model': 'sentence-transformers/all-MiniLM-L6-v2',
+        **encoder_info(ENCODER_BACKEND),
         'embedding_dim': 384,
         'total_features': 387,  # 1 (age) + 384 (embeddings) + 1 (severity) + 1 (gender)
+        'symptom_text_format': CANONICALIZATION_VERSION,
         'total_diseases': len(disease_encoder.classes_),
         'disease_classes': list(disease_encoder.classes_),
         'gender': gender_name,
@@ -205,7 +252,8 @@ def save_embedding_model(model, disease_encoder, encoders, gender_name):
             'min_samples_split': 10,
             'min_samples_leaf': 5,
             'max_features': 'sqrt'
-        }
+        },
+        'embedding_store': embedding_store_stats
     }
 
     info_filename = f'{gender_lower}_model_info_embedding.json'
@@ -213,11 +261,34 @@ def save_embedding_model(model, disease_encoder, encoders, gender_name):
         json.dump(model_info, f, indent=2)
     print(f"OK - Saved {info_filename}")
 
+    # Save per-class severity/urgency/recommendation tables used at serving time
+    metadata_filename = f'{gender_lower}_disease_metadata_embedding.json'
+    DiseaseMetadata.build(disease_encoder.classes_).save(metadata_filename)
+    print(f"OK - Saved {metadata_filename}")
+
+    # Save the distilled student served by INFERENCE_BACKEND=student
+    student_filename = None
+    if student is not None:
+        student_filename = student_path(model_filename)
+        student.save(student_filename)
+        print(f"OK - Saved {student_filename}")
+
+    # Save the training-case index served by INFERENCE_BACKEND=retrieval
+    cases_dir = None
+    if case_index is not None:
+        cases_dir = case_index_dir(model_filename)
+        case_index.save(cases_dir)
+        print(f"OK - Saved {cases_dir}/ ({case_index.n_cases} cases)")
+
     return {
         'model_file': model_filename,
+        'arrays_dir': arrays_dir,
         'disease_file': disease_filename,
         'encoders_file': encoders_filename,
         'info_file': info_filename,
+        'metadata_file': metadata_filename,
+        'student_file': student_filename,
+        'cases_dir': cases_dir,
         'diseases': len(disease_encoder.classes_)
     }
 
@@ -237,8 +308,8 @@ def test_embedding_models(male_files, female_files):
         # Test case: Influenza with natural language variations
         symptom_text = "fever, cough, body aches, fatigue, chills, sore throat"
 
-        # Get embedding
-        symptom_embedding = embedding_model.encode([symptom_text])[0]
+        # Get embedding (canonical text, as in training)
+        symptom_embedding = embedding_model.encode([canonical_symptom_text(symptom_text)])[0]
 
         # Create feature vector
         sample_features = np.concatenate([
@@ -277,7 +348,7 @@ def test_embedding_models(male_files, female_files):
         female_encoders = joblib.load(female_files['encoders_file'])
 
         symptom_text = "abdominal cramps, bloating, lower back pain, breast tenderness"
-        symptom_embedding = embedding_model.encode([symptom_text])[0]
+        symptom_embedding = embedding_model.encode([canonical_symptom_text(symptom_text)])[0]
 
         sample_features = np.concatenate([
             [25],
@@ -303,6 +374,29 @@ def test_embedding_models(male_files, female_files):
     except Exception as e:
         print(f"ERROR - Female test failed: {e}")
 
+def train_gender(gender_name, n_jobs=-1):
+    """Train, distill, index and save one gender's models
+
+    Run once per gender by training_orchestrator.run_gender_jobs, possibly
+    in a forked process sharing the module-level encoder. n_jobs is this
+    job's share of the cores. Returns (saved files, distillation report,
+    retrieval report).
+    """
+    print("\n" + "="*50)
+    print(f"TRAINING {gender_name.upper()} MODEL")
+    print("="*50)
+
+    df = load_gender_dataset(gender_name)
+    X, y, encoders, store_stats = prepare_embedding_features(df, gender_name)
+    model, disease_encoder, X_train, y_train, X_test, y_test, train_rows = train_model(X, y, gender_name, n_jobs)
+    student, distillation = distill(model, X_train, X_test, y_test, gender_name, hidden_units=STUDENT_HIDDEN_UNITS)
+    case_index = build_case_index(df, X_train, y_train, train_rows, encoders, disease_encoder)
+    retrieval = compare_with_forest(case_index, model, X_test, y_test, gender_name)
+    # The core share is for training only; the saved forest keeps n_jobs=-1 as before
+    model.set_params(n_jobs=-1)
+    files = save_embedding_model(model, disease_encoder, encoders, gender_name, student, case_index, store_stats)
+    return files, distillation, retrieval
+
 def main():
     """Main training function"""
     print("="*70)
@@ -311,26 +405,21 @@ def main():
     print("="*70)
 
     try:
-        # Load datasets
-        df_male, df_female = load_gender_datasets()
-
-        # Train Male Model
-        print("\n" + "="*50)
-        print("TRAINING MALE MODEL")
-        print("="*50)
-
-        X_male, y_male, encoders_male = prepare_embedding_features(df_male, "Male")
-        model_male, disease_enc_male, _, _, _ = train_model(X_male, y_male, "Male")
-        male_files = save_embedding_model(model_male, disease_enc_male, encoders_male, "Male")
-
-        # Train Female Model
-        print("\n" + "="*50)
-        print("TRAINING FEMALE MODEL")
-        print("="*50)
-
-        X_female, y_female, encoders_female = prepare_embedding_features(df_female, "Female")
-        model_female, disease_enc_female, _, _, _ = train_model(X_female, y_female, "Female")
-        female_files = save_embedding_model(model_female, disease_enc_female, encoders_female, "Female")
+        # Train both genders, in parallel processes unless TRAINING_MODE=sequential
+        results, timing = run_gender_jobs(train_gender, TRAINING_MODE)
+        male_files, distillation_male, retrieval_male = results['Male']
+        female_files, distillation_female, retrieval_female = results['Female']
+        record_run('train_embedding_models', timing)
+
+        # Student vs teacher agreement, accuracy and latency
+        with open(DISTILLATION_REPORT_FILE, 'w') as f:
+            json.dump({'male': distillation_male, 'female': distillation_female}, f, indent=2)
+        print(f"OK - Saved {DISTILLATION_REPORT_FILE}")
+
+        # Nearest-neighbour retrieval vs forest accuracy and latency
+        with open(RETRIEVAL_REPORT_FILE, 'w') as f:
+            json.dump({'male': retrieval_male, 'female': retrieval_female}, f, indent=2)
+        print(f"OK - Saved {RETRIEVAL_REPORT_FILE}")
 
         # Test models
         test_embedding_models(male_files, female_files)
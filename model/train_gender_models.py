@@ -19,6 +19,9 @@ from sklearn.metrics import classification_report, accuracy_score, confusion_mat
 import joblib
 import warnings
 import json
+from forest_engine import CompiledForest, sidecar_dir
+from dataset_cache import read_dataset
+from training_orchestrator import TRAINING_MODE, record_run, run_gender_jobs
 warnings.filterwarnings('ignore')
 
 # Try to import BalancedRandomForestClassifier for handling class imbalance
@@ -31,29 +34,23 @@ except ImportError:
     print("WARNING: imblearn not available. Install with: pip install imbalanced-learn")
     print("WARNING: Falling back to standard RandomForest with class_weight='balanced'")
 
+def load_gender_dataset(gender_name):
+    """Load one gender's dataset - USING AUGMENTED DATA"""
+    df = read_dataset(f'medical_training_dataset_{gender_name.lower()}_augmented.csv')
+    print(f"{gender_name} dataset shape: {df.shape}")
+    print(f"{gender_name} rows: {len(df)}")
+    print(f"{gender_name} diseases: {df['disease'].nunique()}")
+
+    # Check for missing values
+    print(f"\n{gender_name} dataset missing values:")
+    print(df.isnull().sum())
+
+    return df
+
 def load_gender_datasets():
     """Load both male and female datasets - USING AUGMENTED DATA"""
     print("Loading AUGMENTED gender-specific medical datasets...")
-
-    # Load male dataset (AUGMENTED)
-    df_male = pd.read_csv('medical_training_dataset_male_augmented.csv', delimiter=';', encoding='utf-8-sig')
-    print(f"Male dataset shape: {df_male.shape}")
-    print(f"Male rows: {len(df_male)}")
-    print(f"Male diseases: {df_male['disease'].nunique()}")
-
-    # Load female dataset (AUGMENTED)
-    df_female = pd.read_csv('medical_training_dataset_female_augmented.csv', delimiter=';', encoding='utf-8-sig')
-    print(f"Female dataset shape: {df_female.shape}")
-    print(f"Female rows: {len(df_female)}")
-    print(f"Female diseases: {df_female['disease'].nunique()}")
-    
-    # Check for missing values
-    print(f"\nMale dataset missing values:")
-    print(df_male.isnull().sum())
-    print(f"\nFemale dataset missing values:")
-    print(df_female.isnull().sum())
-    
-    return df_male, df_female
+    return load_gender_dataset('Male'), load_gender_dataset('Female')
 
 def prepare_features(df, gender_name):
     """Prepare features for a specific gender dataset"""
@@ -136,7 +133,7 @@ def encode_features(X, y, all_symptoms, gender_name):
     
     return X, y_encoded, encoders, disease_classes
 
-def train_model(X, y, gender_name):
+def train_model(X, y, gender_name, n_jobs=None):
     """Train a gender-specific model with class imbalance handling"""
     print(f"\nTraining {gender_name} model with class imbalance handling...")
     
@@ -165,7 +162,8 @@ def train_model(X, y, gender_name):
             subsample=0.8,
             colsample_bytree=0.8,
             eval_metric='mlogloss',
-            use_label_encoder=False
+            use_label_encoder=False,
+            n_jobs=n_jobs
         )
         model_type = "XGBoost"
     else:
@@ -176,7 +174,8 @@ def train_model(X, y, gender_name):
             class_weight='balanced',
             max_depth=25,  # Increased from 20
             min_samples_split=3,  # Reduced from 5 for more splits
-            min_samples_leaf=1  # Reduced from 2 for more granularity
+            min_samples_leaf=1,  # Reduced from 2 for more granularity
+            n_jobs=n_jobs
         )
         model_type = "RandomForest"
     
@@ -221,6 +220,15 @@ def save_gender_model(model, encoders, disease_classes, all_symptoms, gender_nam
     joblib.dump(model, model_filename)
     print(f"SUCCESS: Saved {model_filename}")
     
+    # Save memory-mappable forest arrays for the compiled inference backend
+    arrays_dir = sidecar_dir(model_filename)
+    try:
+        CompiledForest.from_sklearn(model).save(arrays_dir)
+        print(f"SUCCESS: Saved {arrays_dir}/")
+    except TypeError as e:
+        arrays_dir = None
+        print(f"WARNING: No memory-mapped arrays for {model_type}: {e}")
+    
     # Save encoders
     encoders_filename = f'{gender_lower}_medical_encoders.pkl'
     joblib.dump(encoders, encoders_filename)
@@ -257,6 +265,7 @@ def save_gender_model(model, encoders, disease_classes, all_symptoms, gender_nam
     
     return {
         'model_file': model_filename,
+        'arrays_dir': arrays_dir,
         'encoders_file': encoders_filename,
         'classes_file': classes_filename,
         'info_file': info_filename,
@@ -363,6 +372,20 @@ def test_gender_models(male_files, female_files):
     except Exception as e:
         print(f"ERROR: Female model test failed: {e}")
 
+def train_gender(gender_name, n_jobs=None):
+    """Train and save one gender's model; n_jobs is this job's share of the cores"""
+    print("\n" + "="*50)
+    print(f"TRAINING {gender_name.upper()} MODEL")
+    print("="*50)
+    
+    df = load_gender_dataset(gender_name)
+    X, y, all_symptoms = prepare_features(df, gender_name)
+    X_enc, y_enc, encoders, disease_classes = encode_features(X, y, all_symptoms, gender_name)
+    model, _, _, _, model_type = train_model(X_enc, y_enc, gender_name, n_jobs)
+    # The core share is for training only; the saved model keeps its default n_jobs
+    model.set_params(n_jobs=None)
+    return save_gender_model(model, encoders, disease_classes, all_symptoms, gender_name, model_type)
+
 def main():
     """Main training function"""
     print("="*70)
@@ -370,28 +393,10 @@ def main():
     print("="*70)
     
     try:
-        # Load datasets
-        df_male, df_female = load_gender_datasets()
-        
-        # Train Male Model
-        print("\n" + "="*50)
-        print("TRAINING MALE MODEL")
-        print("="*50)
-        
-        X_male, y_male, symptoms_male = prepare_features(df_male, "Male")
-        X_male_enc, y_male_enc, encoders_male, classes_male = encode_features(X_male, y_male, symptoms_male, "Male")
-        model_male, _, _, _, model_type_male = train_model(X_male_enc, y_male_enc, "Male")
-        male_files = save_gender_model(model_male, encoders_male, classes_male, symptoms_male, "Male", model_type_male)
-        
-        # Train Female Model
-        print("\n" + "="*50)
-        print("TRAINING FEMALE MODEL")
-        print("="*50)
-        
-        X_female, y_female, symptoms_female = prepare_features(df_female, "Female")
-        X_female_enc, y_female_enc, encoders_female, classes_female = encode_features(X_female, y_female, symptoms_female, "Female")
-        model_female, _, _, _, model_type_female = train_model(X_female_enc, y_female_enc, "Female")
-        female_files = save_gender_model(model_female, encoders_female, classes_female, symptoms_female, "Female", model_type_female)
+        # Train both genders, in parallel processes unless TRAINING_MODE=sequential
+        results, timing = run_gender_jobs(train_gender, TRAINING_MODE)
+        male_files, female_files = results['Male'], results['Female']
+        record_run('train_gender_models', timing)
         
         # Test both models
         test_gender_models(male_files, female_files)
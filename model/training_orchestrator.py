@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Concurrent Gender Training Orchestrator for MediConnect
+Runs the male and female pipelines of a training script side by side in
+separate processes instead of one after the other. The cores are split
+explicitly between the two jobs: each job caps its torch (encoder), BLAS/
+OpenMP and TensorFlow thread pools at its share and gets the same share as
+the forest's n_jobs. Jobs are forked after the parent has loaded the symptom
+encoder, so both use its weights copy-on-write instead of loading their own,
+and embeddings are shared through the file-locked embedding store.
+
+Run directly to compare end-to-end retrain wall time of both modes:
+    python training_orchestrator.py train_embedding_models
+Writes training_orchestration_report.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+GENDERS = ['Male', 'Female']
+TRAINING_MODES = ['concurrent', 'sequential']
+
+# 'concurrent' (one process per gender) or 'sequential'
+TRAINING_MODE = os.environ.get('TRAINING_MODE', 'concurrent')
+# Cores shared out between the jobs; defaults to every core this process may use
+TRAINING_CORES = int(os.environ.get('TRAINING_CORES', '0'))
+
+ORCHESTRATION_REPORT_FILE = 'training_orchestration_report.json'
+
+_THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS']
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def split_cores(total: int, n_jobs: int) -> List[int]:
+    """Cores per job, total divided as evenly as possible with at least one each"""
+    return [max(1, total // n_jobs + (1 if i < total % n_jobs else 0)) for i in range(n_jobs)]
+
+def limit_threads(cores: int):
+    """Cap this process's encoder, BLAS/OpenMP and TensorFlow thread pools at cores
+
+    Environment variables cover libraries that start their pools later;
+    already-imported torch and NumPy's BLAS are capped in place.
+    TensorFlow only accepts a limit before its runtime starts, so jobs that
+    train Keras models should be spawned rather than forked.
+    """
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = str(cores)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(cores)
+    except ImportError:
+        pass
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(cores)
+    if 'tensorflow' in sys.modules:
+        threading = sys.modules['tensorflow'].config.threading
+        try:
+            threading.set_intra_op_parallelism_threads(cores)
+            threading.set_inter_op_parallelism_threads(min(cores, 2))
+        except RuntimeError as e:
+            print(f"WARNING - TensorFlow thread limit not applied: {e}")
+
+def _run_job(job: Callable[[str, int], Any], gender_name: str, cores: int) -> Tuple[Any, float]:
+    limit_threads(cores)
+    start = time.perf_counter()
+    result = job(gender_name, cores)
+    return result, time.perf_counter() - start
+
+def run_gender_jobs(job: Callable[[str, int], Any], mode: str = TRAINING_MODE, start_method: str = 'fork',
+                    cores: int = TRAINING_CORES) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Run job(gender_name, n_jobs) for each gender; returns (results by gender, timing)
+
+    In concurrent mode each gender runs in its own process with its share of
+    the cores, so job must be a module-level function and its result
+    picklable. In sequential mode the jobs run here, one after the other,
+    each with every core.
+    """
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode '{mode}', expected one of {TRAINING_MODES}")
+    total = cores or available_cores()
+    shares = split_cores(total, len(GENDERS)) if mode == 'concurrent' else [total] * len(GENDERS)
+    print(f"\nTraining {' and '.join(GENDERS)} models {mode}ly on {total} cores "
+          f"({', '.join(f'{g}: {c}' for g, c in zip(GENDERS, shares))})")
+
+    start = time.perf_counter()
+    if mode == 'concurrent':
+        context = multiprocessing.get_context(start_method)
+        with ProcessPoolExecutor(max_workers=len(GENDERS), mp_context=context) as pool:
+            futures = [pool.submit(_run_job, job, gender_name, share) for gender_name, share in zip(GENDERS, shares)]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [_run_job(job, gender_name, share) for gender_name, share in zip(GENDERS, shares)]
+    wall_seconds = time.perf_counter() - start
+
+    timing = {
+        'mode': mode,
+        'cores': total,
+        'cores_per_job': dict(zip(GENDERS, shares)),
+        'job_seconds': {gender_name: round(seconds, 2) for gender_name, (_, seconds) in zip(GENDERS, outcomes)},
+        'training_seconds': round(wall_seconds, 2)
+    }
+    print(f"OK - {mode.capitalize()} training took {wall_seconds:.1f}s "
+          f"({', '.join(f'{g} {s}s' for g, s in timing['job_seconds'].items())})")
+    return {gender_name: result for gender_name, (result, _) in zip(GENDERS, outcomes)}, timing
+
+def _update_report(script: str, update: Callable[[Dict[str, Any]], None]):
+    try:
+        with open(ORCHESTRATION_REPORT_FILE, 'r') as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        report = {}
+    entry = report.setdefault(script, {})
+    update(entry)
+
+    runs = [entry.get(mode, {}) for mode in ['sequential', 'concurrent']]
+    entry['speedup'] = {
+        measure: round(runs[0][measure] / runs[1][measure], 2)
+        for measure in ['training_seconds', 'end_to_end_seconds']
+        if runs[0].get(measure) and runs[1].get(measure)
+    }
+    with open(ORCHESTRATION_REPORT_FILE + '.tmp', 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(ORCHESTRATION_REPORT_FILE + '.tmp', ORCHESTRATION_REPORT_FILE)
+
+def record_run(script: str, timing: Dict[str, Any]):
+    """Store a training script's gender-job timing under its mode in the report"""
+    _update_report(script, lambda entry: entry.setdefault(timing['mode'], {}).update(timing))
+    print(f"OK - Saved {ORCHESTRATION_REPORT_FILE}")
+
+def compare_modes(script: str, modes: List[str]) -> Dict[str, Any]:
+    """Retrain end to end once per mode and record each run's wall time
+
+    Every run starts from its own copy of the embedding store as it is now,
+    so a later run is not sped up by embeddings an earlier one cached.
+    """
+    store_dir = os.environ.get('EMBEDDING_STORE_DIR', 'training_embedding_store')
+    for mode in modes:
+        print(f"\n{'='*70}\n{script}: {mode} retrain\n{'='*70}", flush=True)
+        with tempfile.TemporaryDirectory() as scratch:
+            run_store_dir = os.path.join(scratch, 'store') if store_dir else ''
+            if store_dir and os.path.isdir(store_dir):
+                shutil.copytree(store_dir, run_store_dir)
+            env = {**os.environ, 'TRAINING_MODE': mode, 'EMBEDDING_STORE_DIR': run_store_dir}
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{script}.py')],
+                           env=env, check=True)
+            seconds = round(time.perf_counter() - start, 2)
+        _update_report(script, lambda entry: entry.setdefault(mode, {}).update(end_to_end_seconds=seconds))
+        print(f"OK - {script} {mode} retrain: {seconds}s end to end")
+
+    with open(ORCHESTRATION_REPORT_FILE, 'r') as f:
+        return json.load(f)[script]
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end retrain wall time, concurrent vs sequential genders')
+    parser.add_argument('script', nargs='?', default='train_embedding_models',
+                        choices=['train_embedding_models', 'train_gender_models', 'train_deep_learning_models'])
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'concurrent'], choices=TRAINING_MODES)
+    options = parser.parse_args()
+
+    print("="*70)
+    print("TRAINING ORCHESTRATION: CONCURRENT VS SEQUENTIAL")
+    print("="*70)
+
+    entry = compare_modes(options.script, options.modes)
+    print(f"\n{'mode':<12} {'training':>10} {'end to end':>12}")
+    for mode in TRAINING_MODES:
+        if mode in entry:
+            print(f"{mode:<12} {entry[mode].get('training_seconds', '-'):>10} {entry[mode].get('end_to_end_seconds', '-'):>12}")
+    for measure, speedup in entry['speedup'].items():
+        print(f"Concurrent speedup ({measure.replace('_seconds', '')}): {speedup}x")
+    print(f"\nOK - Saved {ORCHESTRATION_REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()